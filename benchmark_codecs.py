@@ -0,0 +1,80 @@
+import json
+import os
+import random
+import tempfile
+import time
+
+from cogs.utils.dataIO import CODECS, DataIO, _decode
+
+# Compares the DataIO codecs on a synthetic starboard settings file
+# with 50k starred messages spread over a few guilds.
+ENTRIES = 50000
+GUILDS = 20
+ROUNDS = 5
+
+
+def starboard_data(entries=ENTRIES, guilds=GUILDS):
+    rnd = random.Random(0)
+    data = {}
+    for g in range(guilds):
+        data[str(rnd.getrandbits(60))] = {"emoji": "⭐",
+                                          "channel": str(rnd.getrandbits(60)),
+                                          "role": [str(rnd.getrandbits(60))],
+                                          "threshold": rnd.randint(0, 10),
+                                          "messages": [],
+                                          "ignore": [str(rnd.getrandbits(60))]}
+    guild_ids = list(data)
+    for _ in range(entries):
+        posted = rnd.random() < 0.5
+        data[rnd.choice(guild_ids)]["messages"].append(
+            {"original_message": rnd.getrandbits(60),
+             "new_message": rnd.getrandbits(60) if posted else None,
+             "count": rnd.randint(1, 40)})
+    return data
+
+
+def best_of(func, rounds=ROUNDS):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+if __name__ == '__main__':
+    data = starboard_data()
+    with tempfile.TemporaryDirectory() as folder:
+        print("{:<10}{:>12}{:>12}{:>14}{:>12}".format("codec", "size (KB)", "encode ms",
+                                                       "save_json ms", "load ms"))
+        for name in sorted(CODECS):
+            dataIO = DataIO()
+            dataIO.set_codec(name)
+            filename = os.path.join(folder, name + ".json")
+            payload = CODECS[name].encode(data)
+            encode = best_of(lambda: CODECS[name].encode(data))
+            # The first save of a round writes, the following ones would be
+            # skipped as unchanged, so start every round from a fresh cache
+            save = best_of(lambda: (dataIO._cache.clear(), dataIO.save_json(filename, data)))
+            load = best_of(lambda: _decode(payload))
+            print("{:<10}{:>12.0f}{:>12.1f}{:>14.1f}{:>12.1f}".format(name, len(payload) / 1024,
+                                                                     encode, save, load))
+
+        # What every save used to cost: pretty printing plus parsing the
+        # tmp file back as integrity check
+        def legacy_save():
+            with open(filename, encoding='utf-8', mode="w") as f:
+                f.write(json.dumps(data, indent=4, sort_keys=True, separators=(',', ' : ')))
+                f.flush()
+                os.fsync(f.fileno())
+            with open(filename, encoding='utf-8', mode="r") as f:
+                json.load(f)
+        print("legacy save_json (pretty + re-read): {:.1f} ms".format(best_of(legacy_save)))
+
+        # Saving data that didn't change only encodes and hashes it
+        dataIO = DataIO()
+        filename = os.path.join(folder, "default.json")
+        dataIO.save_json(filename, data)
+        unchanged = best_of(lambda: dataIO.save_json(filename, data))
+        print("unchanged save_json ({}): {:.1f} ms".format(dataIO.codec, unchanged))
@@ -1,9 +1,10 @@
 import random
 
-import aiohttp
 from discord.ext import commands
 
 from .utils.easyembed import embed
+from .utils.outbox import FUN, get_outbox
+from .utils.webclient import get_client
 
 
 class Animal(commands.Cog):
@@ -11,14 +12,14 @@ class Animal(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.session = aiohttp.ClientSession()
+        self.web = get_client(bot)
 
     @commands.command()
     async def cats(self, ctx):
         """Shows a cat"""
         search = "https://nekos.life/api/v2/img/meow"
         try:
-            async with self.session.get(search) as r:
+            async with self.web.session.get(search) as r:
                 result = await r.json()
             await ctx.send(embed=embed(image=result['url'], color=random.randint(0, 0xffffff)))
         except:
@@ -34,11 +35,13 @@ class Animal(commands.Cog):
             amount = 5
         try:
             for x in range(0,amount):
-                async with self.session.get(search) as r:
+                async with self.web.session.get(search) as r:
                     api_result = await r.json()
                     results.append(api_result['url'])
+            outbox = get_outbox(self.bot)
             for result in results:
-                await ctx.send(embed=embed(image=result, color=random.randint(0, 0xffffff)))
+                outbox.post(ctx.channel, embed=embed(image=result, color=random.randint(0, 0xffffff)),
+                            priority=FUN)
         except:
             await ctx.send("Couldn't Get An Image")
 
@@ -47,7 +50,7 @@ class Animal(commands.Cog):
         """Shows a pug"""
         search = "http://pugme.herokuapp.com/random"
         try:
-            async with self.session.get(search) as r:
+            async with self.web.session.get(search) as r:
                 result = await r.json()
             await ctx.send(embed=embed(image=result['pug'], color=random.randint(0, 0xffffff)))
         except:
@@ -63,11 +66,13 @@ class Animal(commands.Cog):
             amount = 5
         try:
             for x in range(0,amount):
-                async with self.session.get(search) as r:
+                async with self.web.session.get(search) as r:
                     api_result = await r.json()
                     results.append(api_result['pug'])
+            outbox = get_outbox(self.bot)
             for result in results:
-                await ctx.send(embed=embed(image=result, color=random.randint(0, 0xffffff)))
+                outbox.post(ctx.channel, embed=embed(image=result, color=random.randint(0, 0xffffff)),
+                            priority=FUN)
         except:
             await ctx.send("Couldnt Get An Image")
 
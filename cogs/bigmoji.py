@@ -1,6 +1,5 @@
 import unicodedata
 
-import aiohttp
 import discord
 from discord.ext import commands
 from loguru import logger
@@ -18,7 +17,6 @@ class Bigmoji(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.session = aiohttp.ClientSession()
 
     @commands.command(name="bigmoji")
     async def bigmoji(self, ctx, emoji):
@@ -49,9 +47,6 @@ class Bigmoji(commands.Cog):
         e = discord.Embed().set_image(url=url)
         await ctx.send(embed=e)
 
-    def __unload(self):
-        self.session.close()
-
 
 def setup(bot):
     n = Bigmoji(bot)
@@ -1,4 +1,3 @@
-import os
 from datetime import datetime
 
 import discord
@@ -7,29 +6,23 @@ from loguru import logger
 from pytz import timezone
 
 
-from .utils.dataIO import dataIO, fileIO
+from .utils.dataIO import GuildStore
+from .utils.members import get_resolver
 
 
 class Birthdays(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.birthdays = GuildStore("data/birthday/guilds", legacy_file="data/birthday/birthdays.json")
 
-    async def cog_before_invoke(self, ctx):
-        if not os.path.exists("data/birthday"):
-            logger.info("Creating data/birthday folder...")
-            os.makedirs("data/birthday")
-            os.makedirs("data/birthday")
+    def set_complete(self, guild_id, user_id, complete):
+        for user in self.birthdays[guild_id]['users']:
+            if user['user_id'] == user_id:
+                user['COMPLETE'] = complete
+        self.birthdays.save(guild_id, defer=True)
 
-        f = "data/birthday/birthdays.json"
-        if not dataIO.is_valid_json(f):
-            logger.info("Creating empty birthdays.json...")
-            fileIO(f, "save", {})
-
-    async def get_config(self):
-        return dataIO.load_json('data/birthday/birthdays.json')
-
-    async def save_config(self, data):
-        return dataIO.save_json('data/birthday/birthdays.json', data)
+    def cog_unload(self):
+        self.birthdays.flush()
 
     @commands.group()
     async def birthday(self, ctx):
@@ -39,72 +32,65 @@ class Birthdays(commands.Cog):
     @birthday.command(name="add")
     async def add(self, ctx, user: discord.User, birthday):
         birthday = birthday.split('/')
-        birthdays = await self.get_config()
         if int(birthday[2]) >= datetime.now().year:
             await ctx.channel.send("That's not a valid year silly")
             return
-        if str(ctx.guild.id) in birthdays.keys():
-            birthday = datetime(year=int(birthday[2]), month=int(birthday[0]), day=int(birthday[1]))
-            for birthday_user in birthdays[str(ctx.guild.id)]['users']:
-                if birthday_user['user_id'] == user.id:
-                    await ctx.channel.send("That User's birthday is already registered!")
-                    return
-            birthdays[str(ctx.guild.id)]['users'].append({'user_id': user.id, 'birthday': str(birthday), 'COMPLETE': False})
-            await self.save_config(birthdays)
-            await ctx.send("Done!")
-        else:
-            await ctx.send("Birthdays not setup!")
+        if ctx.guild.id not in self.birthdays:
+            return await ctx.send("Birthdays not setup!")
+        day = datetime(year=int(birthday[2]), month=int(birthday[0]), day=int(birthday[1]))
+        for birthday_user in self.birthdays[ctx.guild.id]['users']:
+            if birthday_user['user_id'] == user.id:
+                return await ctx.send("That User's birthday is already registered!")
+        self.birthdays[ctx.guild.id]['users'].append({'user_id': user.id, 'birthday': str(day), 'COMPLETE': False})
+        self.birthdays.save(ctx.guild.id)
+        await ctx.send("Done!")
 
     @birthday.command(name="list")
     async def list(self, ctx):
-        birthdays = await self.get_config()
-        users = birthdays[str(ctx.guild.id)]['users']
+        users = self.birthdays[ctx.guild.id]['users']
         embed = discord.Embed(title=f"{ctx.guild.name}'s Birthday list for this month :birthday:")
         for user in users:
             birthday = datetime.strptime(user['birthday'], "%Y-%m-%d 00:00:00")
             now = datetime.now()
             if birthday.month == now.month:
-                user_name = discord.utils.get(ctx.guild.members, id=user['user_id'])
-                embed.add_field(name=user_name.name, value=birthday.strftime('%m/%d/%Y'))
+                member = await get_resolver(self.bot).get(ctx.guild, user['user_id'])
+                if member is None:
+                    continue
+                embed.add_field(name=member.name, value=birthday.strftime('%m/%d/%Y'))
         await ctx.channel.send(embed=embed)
 
     @birthday.command(name="channel")
     @commands.has_permissions(administrator=True)
     async def channel(self, ctx, channel):
-        birthdays = await self.get_config()
         channel_id = channel.replace("#", "").replace("<", "").replace(">", "")
-        if str(ctx.guild.id) not in birthdays.keys():
-            birthdays[str(ctx.guild.id)] = {'channel': channel_id, 'users': []}
+        if ctx.guild.id not in self.birthdays:
+            self.birthdays.save(ctx.guild.id, {'channel': channel_id, 'users': []})
         else:
-            birthdays[str(ctx.guild.id)]['channel'] = channel_id
-
-        await self.save_config(birthdays)
+            self.birthdays[ctx.guild.id]['channel'] = channel_id
+            self.birthdays.save(ctx.guild.id)
         return await ctx.send("Birthday Channel Set! :birthday:")
 
     @birthday.command(name="disable")
     @commands.has_permissions(administrator=True)
     async def disable(self, ctx):
-        birthdays = await self.get_config()
-        if str(ctx.guild.id) in birthdays.keys():
-            birthdays[str(ctx.guild.id)]['channel'] = ""
-            await self.save_config(birthdays)
-            return await ctx.channel.send(":x: Birthday Messages Disabled!")
-        else:
+        if ctx.guild.id not in self.birthdays:
             return await ctx.channel.send(":interrobang: Birthday Message Channel Not Set For This Server!")
+        self.birthdays[ctx.guild.id]['channel'] = ""
+        self.birthdays.save(ctx.guild.id)
+        return await ctx.channel.send(":x: Birthday Messages Disabled!")
 
     @birthday.command(name="role")
     @commands.has_permissions(administrator=True)
     async def role(self, ctx, role: discord.Role):
-        birthdays = await self.get_config()
-        birthdays[str(ctx.guild.id)]['role_id'] = role.id
-        await self.save_config(birthdays)
+        self.birthdays[ctx.guild.id]['role_id'] = role.id
+        self.birthdays.save(ctx.guild.id)
         await ctx.channel.send("Birthday Role Set!")
 
     @tasks.loop(seconds=5.0)
     async def check_birthdays(self):
         await self.bot.wait_until_ready()
-        birthdays = await self.get_config()
-        for key, value in birthdays.items():
+        for key in self.birthdays:
+            value = self.birthdays[key]
             if len(value['users']) == 0 or value['channel'] == '':
                 continue
             for user in value['users']:
@@ -118,21 +104,22 @@ class Birthdays(commands.Cog):
                 if 'role_id' in value:
                     birthday_role = discord.utils.find(lambda r: r.id == value['role_id'],
                                                        channel.guild.roles)
-                member = discord.utils.find(lambda m: m.id == int(user['user_id']), channel.guild.members)
-                if member is None:
-                    logger.error('Could not find user')
-                    continue
-                if birthday.month != now.month or birthday.day != now.day and user['COMPLETE']:
+                is_birthday = birthday.month == now.month and birthday.day == now.day
+                if not is_birthday and user['COMPLETE']:
                     user['COMPLETE'] = False
-                    if birthday_role:
+                    member = await self.get_member(channel.guild, user['user_id']) if birthday_role else None
+                    if member is not None:
                         try:
                             await self.bot.remove_roles(member, birthday_role)
                         except discord.Forbidden:
                             logger.error("Does Not have permissions to add roles to users!")
                         except Exception:
                             logger.error("Error removing role from user" + member.name)
-                    await self.save_config(birthdays)
-                if birthday.month == now.month and birthday.day == now.day and not user['COMPLETE']:
+                    self.set_complete(key, user['user_id'], False)
+                if is_birthday and not user['COMPLETE']:
+                    member = await self.get_member(channel.guild, user['user_id'])
+                    if member is None:
+                        continue
                     if birthday_role:
                         try:
                             await member.add_role( birthday_role)
@@ -146,7 +133,13 @@ class Birthdays(commands.Cog):
 
                     await channel.send(f"Hey <@{user['user_id']}>! I just wanted to wish you the happiest of birthdays on your {years}{suffix} birthday! :birthday: :heart:")
                     user['COMPLETE'] = True
-                    await self.save_config(birthdays)
+                    self.set_complete(key, user['user_id'], True)
+
+    async def get_member(self, guild, user_id):
+        member = await get_resolver(self.bot).get(guild, user_id)
+        if member is None:
+            logger.error('Could not find user')
+        return member
 
 
 def setup(bot):
@@ -1,17 +1,17 @@
 import random
 
 import discord
-import giphypop
 from discord.ext import commands
 
-from .utils.dataIO import fileIO
+from .utils import giphy
+from .utils.corpus import Corpus
 
 
 class CursedPearl(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.quotes = fileIO("data/cp/quotes/quotes.json", "load")
-        self.author = fileIO("data/cp/quotes/author.json", "load")
+        self.quotes = Corpus("data/cp/quotes/quotes.json")
+        self.author = Corpus("data/cp/quotes/author.json")
 
 
     def guildCheck(self, ctx):
@@ -32,16 +32,14 @@ class CursedPearl(commands.Cog):
     @commands.command(no_pm=True)
     async def peridot(self, ctx):
         if self.guildCheck(ctx):
-            g = giphypop.Giphy("KZciiXBwyJ9RabyZyUHjQ8e4ZutZQ1Go")
-            results = [x for x in g.search('Peridot')]
             embed = discord.Embed(color=0xe6e200)
-            embed.set_image(url=random.choice(results).raw_data['images']['fixed_height_downsampled']['url'])
+            embed.set_image(url=random.choice(await giphy.search(self.bot, 'Peridot')))
             embed.set_footer(text="This is a random gif from Giphy using the search term 'Peridot'")
             await ctx.send(embed=embed)
 
     @commands.command()
     async def quote(self,ctx):
-        index = random.randint(0,len(self.quotes) - 1)
+        index = random.randrange(len(self.quotes))
         quote = self.quotes[index]
         author = self.author[index]
         if 'Pearl' in author:
@@ -1,13 +1,11 @@
-import configparser
-import os
 import re
 
 import discord
 from discord.ext import commands
-from loguru import logger
 
 from .utils.chat_formatting import pagify, box
-from .utils.dataIO import dataIO
+from .utils.dataIO import GuildStore
+from .utils.router import get_router
 
 
 class CustomCommands(commands.Cog):
@@ -17,20 +15,12 @@ class CustomCommands(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.file_path = "data/customcom/commands.json"
-        self.c_commands = dataIO.load_json(self.file_path)
-        self.config = configparser.ConfigParser()
-        self.config.read('../auth.ini')
+        self.c_commands = GuildStore("data/customcom/guilds", legacy_file="data/customcom/commands.json")
+        get_router(bot).prefixed("CustomCommands", self.custom_command)
 
-    async def cog_before_invoke(self, ctx):
-        if not os.path.exists("data/customcom"):
-            print("Creating data/customcom folder...")
-            os.makedirs("data/customcom")
-
-        f = "data/customcom/commands.json"
-        if not dataIO.is_valid_json(f):
-            print("Creating empty commands.json...")
-            dataIO.save_json(f, {})
+    def cog_unload(self):
+        get_router(self.bot).remove("CustomCommands")
+        self.c_commands.flush()
 
     @commands.group(aliases=["cc"], no_pm=True)
     async def customcom(self, ctx):
@@ -64,13 +54,10 @@ class CustomCommands(commands.Cog):
         if command in self.bot.commands:
             await ctx.send("That command is already a standard command.")
             return
-        if guild_id not in self.c_commands:
-            self.c_commands[guild_id] = {}
-        cmdlist = self.c_commands[guild_id]
+        cmdlist = self.c_commands.get(guild_id, {})
         if command not in cmdlist:
             cmdlist[command] = text
-            self.c_commands[guild_id] = cmdlist
-            dataIO.save_json(self.file_path, self.c_commands)
+            self.c_commands.save(guild_id, cmdlist)
             await ctx.send("Custom command successfully added.")
         else:
             await ctx.send("This command already exists. Use "
@@ -95,8 +82,7 @@ class CustomCommands(commands.Cog):
             cmdlist = self.c_commands[guild_id]
             if command in cmdlist:
                 cmdlist[command] = text
-                self.c_commands[guild_id] = cmdlist
-                dataIO.save_json(self.file_path, self.c_commands)
+                self.c_commands.save(guild_id)
                 await ctx.send("Custom command successfully edited.")
             else:
                 await ctx.send("That command doesn't exist. Use "
@@ -121,8 +107,7 @@ class CustomCommands(commands.Cog):
             cmdlist = self.c_commands[guild_id]
             if command in cmdlist:
                 cmdlist.pop(command, None)
-                self.c_commands[guild_id] = cmdlist
-                dataIO.save_json(self.file_path, self.c_commands)
+                self.c_commands.save(guild_id)
                 await ctx.send("Custom command successfully deleted.")
             else:
                 await ctx.send("That command doesn't exist.")
@@ -154,23 +139,14 @@ class CustomCommands(commands.Cog):
             for page in pagify(commands, delims=[" ", "\n"]):
                 await self.bot.whisper(box(page))
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot is True:
-            return
-        if len(message.content) < 2 or isinstance(message.channel, discord.DMChannel):
-            return
-
-        guild = message.guild
-        guild_id = str(guild.id)
-        prefix = self.get_prefix(message)
-
-        if not prefix:
+    async def custom_command(self, message, routed):
+        # The router only hands over guild messages with a prefix, not from bots
+        if len(message.content) < 2:
             return
 
-        if guild_id in self.c_commands:
-            cmdlist = self.c_commands[guild_id]
-            cmd = message.content[len(prefix):]
+        cmdlist = self.c_commands.get(str(message.guild.id))
+        if cmdlist is not None:
+            cmd = routed.command
             if cmd in cmdlist:
                 cmd = cmdlist[cmd]
                 cmd = self.format_cc(cmd, message)
@@ -180,15 +156,6 @@ class CustomCommands(commands.Cog):
                 cmd = self.format_cc(cmd, message)
                 await message.channel.send(cmd)
 
-    def get_prefix(self, message):
-        try:
-            p = self.config.get('discord', 'PREFIX')
-            if message.content.startswith(p):
-                return p
-        except Exception as error:
-            logger.exception(error)
-        return False
-
     def format_cc(self, command, message):
         results = re.findall("\{([^}]+)\}", command)
         for result in results:
@@ -1,14 +1,12 @@
-import random
-
 from discord.ext import commands
 
-from .utils.dataIO import dataIO
+from .utils.corpus import Corpus
 
 
 class EightBall(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.choices = dataIO.load_json("data/8ball/8ball.json")['choices']
+        self.choices = Corpus("data/8ball/8ball.json", key='choices')
 
 
     @commands.command(name='8b')
@@ -17,7 +15,7 @@ class EightBall(commands.Cog):
         Check the fates on your question
         :return:
         """
-        await ctx.send(f'```{random.choice(self.choices)}```')
+        await ctx.send(f'```{self.choices.choice()}```')
 
 def setup(bot):
     n = EightBall(bot)
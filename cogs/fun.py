@@ -2,14 +2,22 @@ import random
 from random import choice
 
 import discord
-import requests
 from bs4 import BeautifulSoup
 from discord.ext import commands
 
+from .utils.router import get_router
+from .utils.webclient import get_client
+
 
 class Fun(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        router = get_router(bot)
+        router.exact("Fun", "f", self.pay_respects, bots=True)
+        router.exact("Fun", "press x to doubt", self.doubt, bots=True)
+
+    def cog_unload(self):
+        get_router(self.bot).remove("Fun")
 
 
     @commands.command()
@@ -24,7 +32,10 @@ class Fun(commands.Cog):
         """
         Gets a random chat topic to keep the chat going.
         """
-        website = requests.get('https://www.conversationstarters.com/generator.php').content
+        status, website = await get_client(self.bot).get_text('https://www.conversationstarters.com/generator.php')
+        if status != 200:
+            await ctx.send("Couldn't get a topic right now, try again later.")
+            return
         soup = BeautifulSoup(website, 'html.parser')
         topic = soup.find(id="random").text
         await ctx.send(topic)
@@ -97,12 +108,11 @@ class Fun(commands.Cog):
         await ctx.send(res + ' ' + random.choice(uwus))
 
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.content.lower() == "f":
-            await message.add_reaction(u"\U0001F1EB")
-        if message.content.lower() == "press x to doubt":
-            await message.add_reaction(u"\U0001F1FD")
+    async def pay_respects(self, message, routed):
+        await message.add_reaction(u"\U0001F1EB")
+
+    async def doubt(self, message, routed):
+        await message.add_reaction(u"\U0001F1FD")
 
 
 def setup(bot):
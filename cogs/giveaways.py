@@ -1,12 +1,14 @@
-import asyncio
 import os
 import random
+import time
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
-from cogs.utils.dataIO import dataIO
+from cogs.utils.dataIO import GuildStore
 from .utils import checks
+from .utils.members import get_resolver
+from .utils.reactions import get_reactions
 
 
 class Giveaways(commands.Cog):
@@ -14,8 +16,13 @@ class Giveaways(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.settings = dataIO.load_json("data/giveaways/settings.json")
-        self.started = False
+        self.settings = GuildStore("data/giveaways/guilds", legacy_file="data/giveaways/settings.json",
+                                   journal=True)
+        reactions = get_reactions(bot)
+        for guild_id in self.settings:
+            for message_id in self.settings[guild_id]:
+                reactions.watch("Giveaways", message_id, self.on_entry)
+        self.countdown.start()
 
     @commands.group()
     async def giveaway(self, ctx):
@@ -41,7 +48,7 @@ class Giveaways(commands.Cog):
         setdict = False
         guild = ctx.message.guild
         if str(guild.id) not in self.settings:
-            self.settings[str(guild.id)] = {}
+            self.settings.save(guild.id, {})
         # Setting all of the settings.
         for setting in settings:
             if not setdict:
@@ -84,8 +91,10 @@ class Giveaways(commands.Cog):
         embed.add_field(name=f"Length:", value=f"{int(settings['length']) / 3600} Hours")
         embed.add_field(name=f"Sponsored by:", value=f"{ctx.message.author}")
         message = await ctx.send(embed=embed)
-        self.settings[str(guild.id)][str(message.id)] = settings
-        self.save_settings()
+        # When it ends, so nothing has to be written while it runs
+        settings['ends_at'] = time.time() + settings['length']
+        self.settings.journal(str(guild.id)).set([str(message.id)], settings)
+        get_reactions(self.bot).watch("Giveaways", message.id, self.on_entry)
         await message.add_reaction("✅")
         await ctx.message.delete()
 
@@ -104,8 +113,7 @@ class Giveaways(commands.Cog):
         elif not self.settings[str(guild.id)][message_id]['started']:
             await ctx.send("That giveaway's already stopped.")
         else:
-            self.settings[str(guild.id)][message_id]['started'] = False
-            self.save_settings()
+            self.settings.journal(str(guild.id)).set([message_id, 'started'], False)
             await ctx.send(
                 "You can now pick a winner with {}giveaway pick <amount> <message_id>".format(ctx.prefix))
 
@@ -127,22 +135,28 @@ class Giveaways(commands.Cog):
             return await ctx.send(
                 "This giveaway has not ended yet! Please end it with `!giveaway stop <message_id>`")
         if len(giveaways[giveaway_id]['users']) == 0:
-            del self.settings[str(guild.id)][giveaway_id]
-            self.save_settings()
+            self.remove_giveaway(guild, giveaway_id)
             return await ctx.send("This giveaway has no entries! I guess that means no one wins :(")
         status = await ctx.send("Picking winners.")
         winnersIDs = []
         winners = []
         for i in range(amount):
             winnersIDs.append(random.choice(giveaway['users']))
-        for winner in winnersIDs:
-            winner = discord.utils.get(guild.members, id=winner)
-            while winner == None:
-                winner = discord.utils.get(guild.members,
-                                           id=random.choice(giveaway['users']))
-            winners.append(winner.mention)
-        del self.settings[str(guild.id)][giveaway_id]
-        self.save_settings()
+        resolver = get_resolver(self.bot)
+        # Entrants who left the server, never drawn again
+        gone = set()
+        for winner_id in winnersIDs:
+            winner = None if winner_id in gone else await resolver.get(guild, winner_id)
+            while winner is None:
+                gone.add(winner_id)
+                remaining = [user for user in giveaway['users'] if user not in gone]
+                if not remaining:
+                    break
+                winner_id = random.choice(remaining)
+                winner = await resolver.get(guild, winner_id)
+            if winner is not None:
+                winners.append(winner.mention)
+        self.remove_giveaway(guild, giveaway_id)
         if amount == 1:
             await self.bot.edit_message(status,
                                         "And thats a wrap! The winner is: {}! Congratulations, you won {}!".format(
@@ -154,27 +168,24 @@ class Giveaways(commands.Cog):
                                             " ".join(winners),
                                             giveaway['name']))
 
-    @commands.Cog.listener()
-    async def on_reaction_add(self, reaction, user):
-        """Enter a giveaway.
-        Example:
-        [p]giveaway enter Minecraft account."""
-        if reaction.emoji != "✅":
+    async def on_entry(self, event):
+        """Enter a giveaway by reacting to its message, see ReactionPipeline"""
+        if not event.added or str(event.emoji) != "✅" or event.guild_id is None:
             return
-        guild = reaction.message.guild
-        author_id = user.id
-        message_id = reaction.message.id
+        guild_id = str(event.guild_id)
+        author_id = event.user_id
+        message_id = str(event.message_id)
         if author_id == 608824312689983488 or author_id == 484461035315527700:
             return
-        if message_id in self.settings[str(guild.id)]:
-            giveaway = self.settings[str(guild.id)][message_id]
-            if author_id not in self.settings[str(guild.id)][message_id]['users']:
-                self.settings[str(guild.id)][message_id]['users'].append(author_id)
-                self.settings[str(guild.id)][message_id]['entries'] =+ 1
-                self.save_settings()
-                return await self.bot.send_message(user,
-                                                   "You have successfully entered the {} giveaway, good luck!".format(
-                                                       giveaway['name']))
+        if message_id in self.settings.get(guild_id, {}):
+            giveaway = self.settings[guild_id][message_id]
+            if author_id not in giveaway['users']:
+                self.settings.journal(guild_id).add([message_id, 'users'], author_id)
+                self.settings.journal(guild_id).set([message_id, 'entries'], giveaway['entries'] + 1)
+                user = await event.fetch_member()
+                if user is not None:
+                    await user.send("You have successfully entered the {} giveaway, good luck!".format(
+                        giveaway['name']))
 
     @giveaway.command()
     async def list(self, ctx):
@@ -200,31 +211,42 @@ class Giveaways(commands.Cog):
             settings = self.settings[str(guild.id)][giveaway]
             await ctx.send("Name: **{}**\nTime left: **{}**\nEntries: **{}**".format(settings['name'],
                                                                                          self.secondsToText(
-                                                                                             settings['length']),
+                                                                                             self.time_left(settings)),
                                                                                          len(settings['users'])))
 
-    def save_settings(self):
-        return dataIO.save_json("data/giveaways/settings.json", self.settings)
+    def remove_giveaway(self, guild, giveaway_id):
+        get_reactions(self.bot).unwatch("Giveaways", giveaway_id)
+        self.settings.journal(guild.id).delete([giveaway_id])
+        if not self.settings[str(guild.id)]:
+            # Only guilds with giveaways keep a file, the loop below loads them all
+            self.settings.delete(guild.id)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if not self.started:
-            self.started = True
-            print("Giveaways loop started.")
-            while True:
-                if self.bot.get_cog("Giveaways") != None:
-                    await asyncio.sleep(1)
-                    self.settings = dataIO.load_json("data/giveaways/settings.json")
-                    for guild in self.settings:
-                        for giveaway in self.settings[guild]:
-                            if self.settings[guild][giveaway]['started']:
-                                self.settings[guild][giveaway]['length'] -= 1
-                                if self.settings[guild][giveaway]['length'] == 0:
-                                    self.settings[guild][giveaway]['started'] = False
-                    self.save_settings()
-                else:
-                    print("Giveaways loop stopped, cog not loaded anymore.")
-                    break
+    def cog_unload(self):
+        get_reactions(self.bot).remove("Giveaways")
+        self.countdown.cancel()
+        self.settings.flush()
+
+    @tasks.loop(seconds=1)
+    async def countdown(self):
+        for guild in self.settings:
+            for giveaway, settings in self.settings[guild].items():
+                if not settings['started']:
+                    continue
+                if 'ends_at' not in settings:
+                    # Started before giveaways had an end time, length is what was left
+                    self.settings.journal(guild).set([giveaway, 'ends_at'], time.time() + settings['length'])
+                elif self.time_left(settings) == 0:
+                    self.settings.journal(guild).set([giveaway, 'started'], False)
+
+    def time_left(self, giveaway):
+        """Seconds until the giveaway ends"""
+        if 'ends_at' not in giveaway:
+            return giveaway['length']
+        return max(0, int(giveaway['ends_at'] - time.time()))
+
+    @countdown.before_loop
+    async def before_countdown(self):
+        await self.bot.wait_until_ready()
 
     def secondsToText(self, secs):
         days = secs // 86400
@@ -244,13 +266,6 @@ def check_folders():
         os.makedirs("data/giveaways")
 
 
-def check_files():
-    if not os.path.exists("data/giveaways/settings.json"):
-        print("Creating data/giveaways/settings.json file...")
-        dataIO.save_json("data/giveaways/settings.json", {})
-
-
 def setup(bot):
     check_folders()
-    check_files()
     bot.add_cog(Giveaways(bot))
@@ -5,6 +5,8 @@ import discord
 from discord.ext import commands
 from tmdbv3api import TMDb, Season
 
+from .utils.webclient import get_client
+
 
 class Hiatus(commands.Cog):
     def __init__(self, bot):
@@ -15,6 +17,22 @@ class Hiatus(commands.Cog):
         self.tmdb = TMDb()
         self.tmdb.api_key = config.get('TMDB', 'api_key')
 
+    @staticmethod
+    def latest_episode(show_id):
+        """Last episode of the latest season of a show. tmdbv3api blocks,
+        run it through WebClient.run_sync."""
+        season = Season()
+        latest_season = False
+        season_number = 1
+        while latest_season is False:
+            show_season = season.details(show_id, season_number)
+            if "status_code" in show_season.entries and show_season.entries["status_code"] == 34:
+                show_season = season.details(show_id, season_number-1)
+                latest_season = True
+            else:
+                season_number += 1
+        return show_season.entries['episodes'][-1]
+
     @commands.command(name='hiatus',
                     description="How long has this Hiatus been going on for?",
                     breif="The hiatus is cold and long",
@@ -30,17 +48,7 @@ class Hiatus(commands.Cog):
         # msg = "Days since last episode:\n\n" + "[" + days + "Days]"
 
         if ctx.guild.id == 593887030216228973:
-            season = Season()
-            latest_season = False
-            season_number = 1
-            while latest_season is False:
-                show_season = season.details(61175, season_number)
-                if "status_code" in show_season.entries and show_season.entries["status_code"] == 34:
-                    show_season = season.details(61175, season_number-1)
-                    latest_season = True
-                else:
-                    season_number += 1
-            episode =show_season.entries['episodes'][-1]
+            episode = await get_client(self.bot).run_sync(self.latest_episode, 61175)
             air_date = episode['air_date']
             diffrence = datetime.now() - datetime.strptime(air_date, "%Y-%m-%d")
             a = datetime(2019, 9, 2)
@@ -52,17 +60,7 @@ class Hiatus(commands.Cog):
             return await ctx.channel.send(embed=embed)
 
         if ctx.guild.id == 448695150135345152:
-            season = Season()
-            latest_season = False
-            season_number = 1
-            while latest_season is False:
-                show_season = season.details(61923, season_number)
-                if "status_code" in show_season.entries and show_season.entries["status_code"] == 34:
-                    show_season = season.details(61923, season_number-1)
-                    latest_season = True
-                else:
-                    season_number += 1
-            episode =show_season.entries['episodes'][-1]
+            episode = await get_client(self.bot).run_sync(self.latest_episode, 61923)
             air_date = episode['air_date']
             diffrence = datetime.now() - datetime.strptime(air_date, "%Y-%m-%d")
             embed = discord.Embed(title="Star Vs The Forces Of Evil Hiatus Calculator")
@@ -1,15 +1,18 @@
 import random
 
 import discord
-import giphypop
 from discord.ext import commands
 
-from .utils.dataIO import dataIO
+from .utils import giphy
+from .utils.corpus import Corpus
 
 
 class Kindness(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.kisses = Corpus("data/lewd/kiss.json", key='kiss')
+        self.cuddles = Corpus('data/lewd/cuddles.json')
+        self.compliments = Corpus("data/compliment/compliments.json", key='compliments')
 
     @commands.command()
     async def kiss(self, ctx, victim:discord.Member = None):
@@ -19,17 +22,15 @@ class Kindness(commands.Cog):
         :param victim: Who are you kissing? (optional)
         :return: The kiss you sent off :)
         """
-        g = giphypop.Giphy("KZciiXBwyJ9RabyZyUHjQ8e4ZutZQ1Go")
-        results = [x for x in g.search('kiss')]
         kisser = ctx.author.name
         if victim == None:
             await ctx.send(str(ctx.author.name) + " puckers their lips, but no one is there... sad.")
         elif victim.name ==kisser:
             await ctx.send(f"{kisser} starts making out with their image in a mirror... strange one this {kisser} is...")
         else:
-            msg = random.choice(dataIO.load_json("data/lewd/kiss.json")['kiss']).format(kisser=str(kisser),victim=str(victim.name))
+            msg = self.kisses.choice().format(kisser=str(kisser),victim=str(victim.name))
             embed = discord.Embed(title=msg, color=0xFF69B4)
-            embed.set_image(url=random.choice(results).raw_data['images']['fixed_height_downsampled']['url'])
+            embed.set_image(url=random.choice(await giphy.search(self.bot, 'kiss')))
             await ctx.send(embed=embed)
 
         # await ctx.send(msg)
@@ -69,8 +70,7 @@ class Kindness(commands.Cog):
                    'https://proxy.duckduckgo.com/iu/?u=https%3A%2F%2Fi.pinimg.com%2Foriginals%2Faf%2F6a%2Ff9%2Faf6af9f078d34217d49287514b2d24d5.gif',
                    'https://proxy.duckduckgo.com/iu/?u=http%3A%2F%2Fmedia.giphy.com%2Fmedia%2Flrr9rHuoJOE0w%2Fgiphy.gif'
                    ]
-        messages = dataIO.load_json('data/lewd/cuddles.json')
-        message = random.choice(messages).format(cuddler=ctx.author.name,victim=target.name)
+        message = self.cuddles.choice().format(cuddler=ctx.author.name,victim=target.name)
         embed = discord.Embed(title=message, color=discord.Color.purple())
         embed.set_image(url=random.choice(cuddles))
         await ctx.channel.send(embed=embed)
@@ -82,7 +82,7 @@ class Kindness(commands.Cog):
         :param target: Who you are coplimenting
         :return:
         """
-        msg = random.choice(dataIO.load_json("data/compliment/compliments.json")['compliments'])
+        msg = self.compliments.choice()
         await ctx.send(str(target) + ' ' + msg)
 
 
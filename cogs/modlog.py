@@ -5,8 +5,12 @@ import discord
 from discord.ext import commands
 from loguru import logger
 
-from cogs.utils.dataIO import dataIO
+from cogs.utils.dataIO import GuildStore
 from .utils import checks
+from .utils.members import get_resolver
+from .utils.outbox import MODERATION, get_outbox
+from .utils.router import get_router
+from .utils.snapshots import get_snapshots
 
 
 class Modlog(commands.Cog):
@@ -14,7 +18,8 @@ class Modlog(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.settings = dataIO.load_json("data/modlog/settings.json")
+        self.settings = GuildStore("data/modlog/guilds", legacy_file="data/modlog/settings.json")
+        get_router(bot).every("Modlog", self.snapshot, bots=True)
 
     @commands.group(no_pm=True)
     @checks.mod_or_permissions()
@@ -24,18 +29,17 @@ class Modlog(commands.Cog):
             embed = discord.Embed(title="Command Error!", description="That's not how you use this command!")
             await ctx.send(embed=embed)
         if str(ctx.message.guild.id) not in self.settings:
-            self.settings[str(ctx.message.guild.id)] = {'channel': None, 'disabled': False, 'join': True, 'leave': True,
-                                                        'voicechat': True, 'msgedit': True, 'msgdelete': True,
-                                                        'roleedit': True, 'ban': True, 'reactions': True,
-                                                        'channels': True,
-                                                        'nicknames': True}
-            self.save_settings()
+            self.settings.save(ctx.message.guild.id, {'channel': None, 'disabled': False, 'join': True, 'leave': True,
+                                                      'voicechat': True, 'msgedit': True, 'msgdelete': True,
+                                                      'roleedit': True, 'ban': True, 'reactions': True,
+                                                      'channels': True,
+                                                      'nicknames': True}, defer=True)
 
     @modlogset.command(no_pm=True)
     async def channel(self, ctx, channel: discord.TextChannel):
         """Sets the channel the bot should log to."""
         self.settings[str(ctx.message.guild.id)]['channel'] = channel.id
-        self.save_settings()
+        self.save_settings(ctx.message.guild)
         await ctx.send("Channel set, I will now log to {}.".format(channel.mention))
 
     @modlogset.command(no_pm=True)
@@ -43,11 +47,11 @@ class Modlog(commands.Cog):
         """Disable the logging system completely."""
         if not self.settings[str(ctx.message.guild.id)]['disabled']:
             self.settings[str(ctx.message.guild.id)]['disabled'] = True
-            self.save_settings()
+            self.save_settings(ctx.message.guild)
             await ctx.send("Logging system has been disabled.")
         else:
             self.settings[str(ctx.message.guild.id)]['disabled'] = False
-            self.save_settings()
+            self.save_settings(ctx.message.guild)
             await ctx.send("Logging system has been enabled.")
 
     @modlogset.command(no_pm=True)
@@ -78,99 +82,99 @@ class Modlog(commands.Cog):
         elif module.lower() == 'join':
             if self.settings[str(server.id)]['join']:
                 self.settings[str(server.id)]['join'] = False
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Join logging has been disabled.")
             else:
                 self.settings[str(server.id)]['join'] = True
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Join logging has been enabled.")
 
         elif module.lower() == 'leave':
             if self.settings[str(server.id)]['leave']:
                 self.settings[str(server.id)]['leave'] = False
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Leave (and kick) logging has been disabled.")
             else:
                 self.settings[str(server.id)]['leave'] = True
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Leave (and kick) logging has been enabled.")
 
         elif module.lower() == 'ban':
             if self.settings[str(server.id)]['ban']:
                 self.settings[str(server.id)]['ban'] = False
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Ban logging has been disabled.")
             else:
                 self.settings[str(server.id)]['ban'] = True
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Ban logging has been enabled.")
 
         elif module.lower() == 'voicechat':
             if self.settings[str(server.id)]['voicechat']:
                 self.settings[str(server.id)]['voicechat'] = False
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Voicechat logging has been disabled.")
             else:
                 self.settings[str(server.id)]['voicechat'] = True
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Voicechat logging has been enabled.")
 
         elif module.lower() == 'msgedit':
             if self.settings[str(server.id)]['msgedit']:
                 self.settings[str(server.id)]['msgedit'] = False
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Message edit has been disabled.")
             else:
                 self.settings[str(server.id)]['msgedit'] = True
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Message edit has been enabled.")
 
         elif module.lower() == 'msgdelete':
             if self.settings[str(server.id)]['msgdelete']:
                 self.settings[str(server.id)]['msgdelete'] = False
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Message delete has been disabled.")
             else:
                 self.settings[str(server.id)]['msgdelete'] = True
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Message delete has been enabled.")
 
         elif module.lower() == 'roleedit':
             if self.settings[str(server.id)]['roleedit']:
                 self.settings[str(server.id)]['roleedit'] = False
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Role edit has been disabled.")
             else:
                 self.settings[str(server.id)]['roleedit'] = True
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Role edit has been enabled.")
 
         elif module.lower() == 'channels':
             if 'channels' not in self.settings[str(server.id)]:
                 self.settings[str(server.id)]['channels'] = True
-                self.save_settings()
+                self.save_settings(server)
                 return
             elif self.settings[str(server.id)]['channels']:
                 self.settings[str(server.id)]['channels'] = False
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Channels have been disabled.")
             else:
                 self.settings[str(server.id)]['channels'] = True
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Channels have been enabled.")
 
         elif module.lower() == 'nicknames':
             if 'nicknames' not in self.settings[str(server.id)]:
                 self.settings[str(server.id)]['nicknames'] = True
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Nicknames have been enabled.")
             elif self.settings[str(server.id)]['nicknames']:
                 self.settings[str(server.id)]['nicknames'] = False
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Nicknames have been disabled.")
             else:
                 self.settings[str(server.id)]['nicknames'] = True
-                self.save_settings()
+                self.save_settings(server)
                 await ctx.send("Nicknames have been enabled.")
 
         else:
@@ -215,29 +219,46 @@ class Modlog(commands.Cog):
                            f"\n\tServer Muted: {after.mute}" +
                            f"\n\tServer Deafened: {after.deaf}```")
 
+    async def snapshot(self, message, routed):
+        # Snapshots instead of discord.py's message cache, see MessageCache
+        if message.author == message.guild.me:
+            return
+        if self.is_module(message.guild, 'msgedit') or self.is_module(message.guild, 'msgdelete'):
+            get_snapshots(self.bot).add(message)
+
     @commands.Cog.listener()
-    async def on_message_edit(self, before, after):
-        if (before.guild != None) and (before.author == before.guild.me):
+    async def on_raw_message_edit(self, payload):
+        before, content = get_snapshots(self.bot).edited(payload.message_id, payload.data)
+        if content is None:
             return
-        if self.is_module(before.guild, 'msgedit'):
-            if before.content != after.content:
-                await self.log(before.guild, "`[{}]` :pencil2: **Message Edit Log**\n"
-                                             "```User: {}"
-                                             "\nChannel: {}"
-                                             "\nBefore: {}".format(self.get_time(), before.author.name,
-                                                                   before.channel.name, before.content) +
-                               "\nAfter: {}```".format(after.content))
+        guild = self.bot.get_guild(before.guild_id) if before.guild_id else None
+        if self.is_module(guild, 'msgedit'):
+            await self.log(guild, "`[{}]` :pencil2: **Message Edit Log**\n"
+                                  "```User: {}"
+                                  "\nChannel: {}"
+                                  "\nBefore: {}".format(self.get_time(), await self.author_name(guild, before),
+                                                        self.channel_name(before), before.content) +
+                           "\nAfter: {}```".format(content))
 
     @commands.Cog.listener()
-    async def on_message_delete(self, message):
-        if message.author == message.guild.me:
+    async def on_raw_message_delete(self, payload):
+        message = get_snapshots(self.bot).pop(payload.message_id)
+        if message is None:
             return
-        if self.is_module(message.guild, 'msgdelete'):
-            await self.log(message.guild, "`[{}]` :wastebasket: **Message Delete Log**\n"
-                                          "```User: {}\n"
-                                          "Channel: {}\n"
-                                          "Message: {}\n```".format(self.get_time(), str(message.author),
-                                                                    str(message.channel), message.content))
+        guild = self.bot.get_guild(message.guild_id) if message.guild_id else None
+        if self.is_module(guild, 'msgdelete'):
+            await self.log(guild, "`[{}]` :wastebasket: **Message Delete Log**\n"
+                                  "```User: {}\n"
+                                  "Channel: {}\n"
+                                  "Message: {}\n".format(self.get_time(), await self.author_name(guild, message),
+                                                         self.channel_name(message), message.content) +
+                           "".join(f"Attachment: {url}\n" for url in message.attachments) + "```")
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        snapshots = get_snapshots(self.bot)
+        for message_id in payload.message_ids:
+            snapshots.pop(message_id)
 
     @commands.Cog.listener()
     async def on_guild_role_create(self, role):
@@ -448,10 +469,22 @@ class Modlog(commands.Cog):
 
     async def log(self, server, message):
         channel = discord.utils.get(server.channels, id=self.settings[str(server.id)]['channel'])
-        try:
-            await channel.send(message)
-        except:
-            pass
+        if channel is None:
+            return
+        # Bursts of events (a ban wave, a purge) are merged into fewer messages
+        get_outbox(self.bot).post(channel, message, priority=MODERATION, merge=True)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        get_snapshots(self.bot).forget(guild.id)
+
+    async def author_name(self, guild, snapshot):
+        member = await get_resolver(self.bot).get(guild, snapshot.author_id)
+        return str(member) if member is not None else str(snapshot.author_id)
+
+    def channel_name(self, snapshot):
+        channel = self.bot.get_channel(snapshot.channel_id)
+        return str(channel) if channel is not None else str(snapshot.channel_id)
 
     def get_time(self):
         return datetime.datetime.now().strftime("%X")
@@ -470,8 +503,12 @@ class Modlog(commands.Cog):
         else:
             return False
 
-    def save_settings(self):
-        dataIO.save_json("data/modlog/settings.json", self.settings)
+    def save_settings(self, server):
+        self.settings.save(server.id, defer=True)
+
+    def cog_unload(self):
+        get_router(self.bot).remove("Modlog")
+        self.settings.flush()
 
 
 def check_folders():
@@ -480,13 +517,6 @@ def check_folders():
         os.makedirs("data/modlog")
 
 
-def check_files():
-    if not os.path.exists("data/modlog/settings.json"):
-        logger.debug("Creating data/modlog/settings.json file...")
-        dataIO.save_json("data/modlog/settings.json", {})
-
-
 def setup(bot):
     check_folders()
-    check_files()
     bot.add_cog(Modlog(bot))
@@ -5,7 +5,12 @@ import discord
 from discord.ext import tasks, commands
 from loguru import logger
 
-from .utils.dataIO import fileIO
+from .utils import cluster
+from .utils.dataIO import fileIO, Journal
+
+# Reminders are sent by the cluster they were made in
+REMINDERS_FILE = cluster.current.path("data/remindme/reminders.json")
+REMINDEVERYONE_FILE = cluster.current.path("data/remindme/remindeveryone.json")
 
 
 class RemindMe(commands.Cog):
@@ -15,8 +20,10 @@ class RemindMe(commands.Cog):
         self.bot = bot
         self.check_reminders.start()
         self.check_remindeveryone.start()
-        self.reminders = fileIO("data/remindme/reminders.json", "load")
-        self.remindeveryone = fileIO("data/remindme/remindeveryone.json", "load")
+        self.reminders_journal = Journal(REMINDERS_FILE, default=[])
+        self.remindeveryone_journal = Journal(REMINDEVERYONE_FILE, default=[])
+        self.reminders = self.reminders_journal.data
+        self.remindeveryone = self.remindeveryone_journal.data
         self.units = {"minute" : 60, "hour" : 3600, "day" : 86400, "week": 604800, "month": 2592000}
 
     def cog_unload(self):
@@ -28,13 +35,13 @@ class RemindMe(commands.Cog):
             logger.info("Creating data/remindme folder...")
             os.makedirs("data/remindme")
 
-        f = "data/remindme/reminders.json"
+        f = REMINDERS_FILE
         if not fileIO(f, "check"):
-            logger.info("Creating empty reminders.json...")
+            logger.info("Creating empty {}...".format(f))
             fileIO(f, "save", [])
-        f = "data/remindme/remindeveryone.json"
+        f = REMINDEVERYONE_FILE
         if not fileIO(f, "check"):
-            logger.info("Creating empty remindeveryone.json...")
+            logger.info("Creating empty {}...".format(f))
             fileIO(f, "save", [])
 
     @commands.command()
@@ -60,10 +67,9 @@ class RemindMe(commands.Cog):
             return
         seconds = self.units[time_unit] * quantity
         future = int(time.time()+seconds)
-        self.reminders.append({"ID" : author.id, "FUTURE" : future, "TEXT" : text})
+        self.reminders_journal.add([], {"ID" : author.id, "FUTURE" : future, "TEXT" : text})
         logger.info("{} ({}) set a reminder.".format(author.name, author.id))
         await ctx.send("I will remind you that in {} {}.".format(str(quantity), time_unit + s))
-        fileIO("data/remindme/reminders.json", "save", self.reminders)
 
     @commands.has_role("RemindHere")
     @commands.command(aliases=["re"])
@@ -89,9 +95,8 @@ class RemindMe(commands.Cog):
             return
         seconds = self.units[time_unit] * quantity
         future = int(time.time() + seconds)
-        self.remindeveryone.append({"ID": channel.id, "FUTURE": future, "TEXT": text, 'AUTHOR': ctx.author.id})
+        self.remindeveryone_journal.add([], {"ID": channel.id, "FUTURE": future, "TEXT": text, 'AUTHOR': ctx.author.id})
         await ctx.send("I will remind everyone here of that in {} {}.".format(str(quantity), time_unit + s))
-        fileIO("data/remindme/remindeveryone.json", "save", self.remindeveryone)
 
     @commands.command()
     async def forgetme(self, ctx):
@@ -104,8 +109,7 @@ class RemindMe(commands.Cog):
 
         if not to_remove == []:
             for reminder in to_remove:
-                self.reminders.remove(reminder)
-            fileIO("data/remindme/reminders.json", "save", self.reminders)
+                self.reminders_journal.discard([], reminder)
             await ctx.send("All your notifications have been removed.")
         else:
             await ctx.send("You don't have any upcoming notification.")
@@ -132,9 +136,7 @@ class RemindMe(commands.Cog):
                 else:
                     to_remove.append(reminder)
         for reminder in to_remove:
-            self.reminders.remove(reminder)
-        if to_remove:
-            fileIO("data/remindme/reminders.json", "save", self.reminders)
+            self.reminders_journal.discard([], reminder)
 
     @check_reminders.before_loop
     async def before_check_reminders(self):
@@ -158,9 +160,7 @@ class RemindMe(commands.Cog):
                 else:
                     to_remove.append(reminder)
         for reminder in to_remove:
-            self.remindeveryone.remove(reminder)
-        if to_remove:
-            fileIO("data/remindme/remindeveryone.json", "save", self.remindeveryone)
+            self.remindeveryone_journal.discard([], reminder)
 
     @check_remindeveryone.before_loop
     async def before_check_remindeveryone(self):
@@ -1,9 +1,14 @@
-import os
-
 import discord
 from discord.ext import commands
 
-from .utils.dataIO import dataIO
+from .utils import cluster
+from .utils.dataIO import GuildStore, dataIO
+from .utils.reactions import emoji_key, get_reactions
+
+# emoji key -> ids of the guilds starring with it, so the emojis can be
+# watched without opening every guild's settings. Kept with the cluster
+# it was built for, a cluster running other shards builds it again.
+EMOJI_INDEX = cluster.current.path("data/star/emojis.json")
 
 
 class Star(commands.Cog):
@@ -11,18 +16,42 @@ class Star(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.settings = dataIO.load_json("data/star/settings.json")
+        self.settings = GuildStore("data/star/guilds", legacy_file="data/star/settings.json",
+                                   journal=True)
+        index = dataIO.load_json(EMOJI_INDEX) if dataIO.is_valid_json(EMOJI_INDEX) else {}
+        if index.get("cluster") == str(cluster.current):
+            self.emoji_guilds = index["emojis"]
+        else:
+            # Built once from the guild files
+            self.emoji_guilds = {}
+            for guild_id in self.settings:
+                self.emoji_guilds.setdefault(emoji_key(self.settings[guild_id]["emoji"]), []).append(guild_id)
+            self.save_emoji_index()
+        for key in self.emoji_guilds:
+            get_reactions(self.bot).watch_emoji("Star", key, self.on_star)
+
+    def cog_unload(self):
+        get_reactions(self.bot).remove("Star")
+        self.settings.flush()
+        dataIO.flush(EMOJI_INDEX)
 
-    async def save_settings(self):
-        return dataIO.save_json("data/star/settings.json", self.settings)
+    def save_emoji_index(self, defer=False):
+        dataIO.save_json(EMOJI_INDEX, {"cluster": str(cluster.current), "emojis": self.emoji_guilds},
+                         defer=defer)
 
-    async def cog_before_invoke(self, ctx):
-        if not os.path.exists('data/star'):
-            os.mkdir('data/star')
-        data = {}
-        f = 'data/star/settings.json'
-        if not os.path.exists(f):
-            dataIO.save_json(f, data)
+    def watch_emoji(self, guild_id, emoji):
+        """Moves guild_id to emoji in the index and watches it"""
+        key = emoji_key(emoji)
+        for other, guild_ids in list(self.emoji_guilds.items()):
+            if guild_id in guild_ids and other != key:
+                guild_ids.remove(guild_id)
+                if not guild_ids:
+                    del self.emoji_guilds[other]
+        if guild_id not in self.emoji_guilds.get(key, []):
+            self.emoji_guilds.setdefault(key, []).append(guild_id)
+        self.save_emoji_index(defer=True)
+        # Keyed by emoji only, on_star checks it is the one of the guild
+        get_reactions(self.bot).watch_emoji("Star", key, self.on_star)
 
     @commands.group()
     @commands.has_permissions(manage_channels=True)
@@ -67,20 +96,19 @@ class Star(commands.Cog):
 
         if role is None:
             role = await self.get_everyone_role(guild)
-        self.settings[guild_id] = {"emoji": emoji,
-                                    "channel": str(channel.id),
-                                    "role": [str(role.id)],
-                                    "threshold": 0,
-                                    "messages": [],
-                                    "ignore": []}
-        await self.save_settings()
+        self.watch_emoji(guild_id, emoji)
+        self.settings.save(guild_id, {"emoji": emoji,
+                                      "channel": str(channel.id),
+                                      "role": [str(role.id)],
+                                      "threshold": 0,
+                                      "messages": [],
+                                      "ignore": []})
         await ctx.send("Starboard set to {}".format(channel.mention))
 
     @starboard.command(name="clear")
     async def clear_post_history(self, ctx):
         """Clears the database of previous starred messages"""
-        self.settings[str(ctx.guild.id)]["messages"] = []
-        await self.save_settings()
+        self.settings.journal(str(ctx.guild.id)).set(["messages"], [])
         await ctx.send("Done! I will no longer track starred messages older than right now.")
 
     @starboard.command(name="ignore")
@@ -88,14 +116,13 @@ class Star(commands.Cog):
         if channel is None:
             channel = ctx.channel
         if str(channel.id) in self.settings[str(ctx.guild.id)]["ignore"]:
-            self.settings[str(ctx.guild.id)]["ignore"].remove(channel.id)
+            self.settings.journal(str(ctx.guild.id)).discard(["ignore"], str(channel.id))
             await ctx.send("{} removed from the ignored channel list!".format(
                                             channel.mention))
         else:
-            self.settings[str(ctx.guild.id)]["ignore"].append(str(channel.id))
+            self.settings.journal(str(ctx.guild.id)).add(["ignore"], str(channel.id))
             await ctx.send("{} added to the ignored channel list!".format(
                                             channel.mention))
-        await self.save_settings()
 
     @starboard.command(name="emoji")
     async def set_emoji(self, ctx, emoji="⭐"):
@@ -114,8 +141,8 @@ class Star(commands.Cog):
             else:
                 is_guild_emoji = True
                 emoji = ":" + emoji.name + ":" + emoji.id
-        self.settings[str(guild.id)]["emoji"] = emoji
-        await self.save_settings()
+        self.watch_emoji(str(guild.id), emoji)
+        self.settings.journal(str(guild.id)).set(["emoji"], emoji)
         if is_guild_emoji:
             await ctx.send("Starboard emoji set to <{}>.".format(emoji))
         else:
@@ -131,8 +158,7 @@ class Star(commands.Cog):
             return
         if channel is None:
             channel = ctx.channel
-        self.settings[str(guild.id)]["channel"] = channel.id
-        await self.save_settings()
+        self.settings.journal(str(guild.id)).set(["channel"], channel.id)
         await ctx.send(f"Starboard channel set to {channel.mention}.")
 
     @starboard.command(name="threshold")
@@ -144,8 +170,7 @@ class Star(commands.Cog):
                                         "I am not setup for the starboard on this server!\
                                          \nuse starboard set to set it up.")
             return
-        self.settings[str(guild.id)]["threshold"] = threshold
-        await self.save_settings()
+        self.settings.journal(str(guild.id)).set(["threshold"], threshold)
         await ctx.send(f"Starboard threshold set to {threshold}.")
 
     @_roles.command(name="add")
@@ -165,9 +190,8 @@ class Star(commands.Cog):
                                         "{} can already add to the starboard!".format(role.name))
             return
         if everyone_role.id in self.settings[str(guild.id)]["role"] and role != everyone_role:
-            self.settings[str(guild.id)]["role"].remove(everyone_role.id)
-        self.settings[str(guild.id)]["role"].append(role.id)
-        await self.save_settings()
+            self.settings.journal(str(guild.id)).discard(["role"], everyone_role.id)
+        self.settings.journal(str(guild.id)).add(["role"], role.id)
         await ctx.send(
                                     "Starboard role set to {}.".format(role.name))
 
@@ -177,14 +201,13 @@ class Star(commands.Cog):
         guild = ctx.guild
         everyone_role = await self.get_everyone_role(guild)
         if str(role.id) in self.settings[str(guild.id)]["role"]:
-            self.settings[str(guild.id)]["role"].remove(role.id)
+            self.settings.journal(str(guild.id)).discard(["role"], str(role.id))
         if self.settings[str(guild.id)]["role"] == []:
-            self.settings[str(guild.id)]["role"].append(everyone_role.id)
-        await self.save_settings()
+            self.settings.journal(str(guild.id)).add(["role"], everyone_role.id)
         await ctx.send(
                                     "{} removed from starboard.".format(role.name))
 
-    async def check_roles(self, user, author, guild):
+    async def check_roles(self, user, author_id, guild):
         """Checks if the user is allowed to add to the starboard
            Allows bot owner to always add messages for testing
            disallows users from adding their own messages"""
@@ -192,22 +215,22 @@ class Star(commands.Cog):
         for role in user.roles:
             if str(role.id) in self.settings[str(guild.id)]["role"]:
                 has_role = True
-        if user is author:
+        if user.id == author_id:
             has_role = False
         if user.id == 204792579881959424:
             has_role = True
         return has_role
 
-    async def check_is_posted(self, guild, message):
+    async def check_is_posted(self, guild, message_id):
         """
         Check if message is in the starboard
         :param guild: Discord server
-        :param message: message that was stared
+        :param message_id: id of the message that was stared
         :return:
         """
         is_posted = False
         for past_message in self.settings[str(guild.id)]["messages"]:
-            if int(message.id) == past_message["original_message"] and past_message["new_message"] is not None:
+            if int(message_id) == past_message["original_message"] and past_message["new_message"] is not None:
                 is_posted = True
         return is_posted
 
@@ -224,148 +247,152 @@ class Star(commands.Cog):
                 is_posted = True
         return is_posted
 
-    async def get_count(self, guild, message):
+    async def get_count(self, guild, message_id):
         """
         get the number of stars on this message as stored in file
         :param guild:
-        :param message:
+        :param message_id:
         :return:
         """
         count = 0
         for past_message in list(self.settings[str(guild.id)]["messages"]):
-            if int(message.id) == past_message["original_message"]:
+            if int(message_id) == past_message["original_message"]:
                 count = past_message["count"]
         return count
 
-    async def get_posted_message(self, guild, message):
+    def get_author(self, guild, message_id):
+        """Id of the author of a tracked message, None if unknown"""
+        for past_message in self.settings[str(guild.id)]["messages"]:
+            if int(message_id) == past_message["original_message"]:
+                return past_message.get("author")
+        return None
+
+    async def get_posted_message(self, guild, message_id):
         """
         Get the message ID and count of the starboard embed or return None
         Also increment the count and save the count
         :param guild: Discord Server
-        :param message: Message that was reacted to
+        :param message_id: id of the message that was reacted to
         :return:
         """
-        msg_list = self.settings[str(guild.id)]["messages"]
-        for past_message in msg_list:
-            if int(message.id) == past_message["original_message"]:
-                msg = past_message
-                msg_list.remove(msg)
-                msg["count"] += 1
-                msg_list.append(msg)
-                self.settings[str(guild.id)]["messages"] = msg_list
-                await self.save_settings()
+        for past_message in self.settings[str(guild.id)]["messages"]:
+            if int(message_id) == past_message["original_message"]:
+                self.settings.journal(str(guild.id)).set(["messages", {"original_message": past_message["original_message"]},
+                                                          "count"], past_message["count"] + 1)
                 return past_message["new_message"], past_message["count"]
         return None, None
 
-    @commands.Cog.listener()
-    async def on_reaction_add(self, reaction, user):
-        guild = reaction.message.guild
-        msg = reaction.message
-        guid_id = str(guild.id)
-        if guid_id not in self.settings:
+    async def on_star(self, event):
+        """Reaction with the emoji of some starboard, see ReactionPipeline"""
+        guild = event.guild
+        if not event.added or guild is None:
             return
-        if str(msg.channel.id) in self.settings[guid_id]["ignore"]:
+        guid_id = str(guild.id)
+        if guid_id not in self.emoji_guilds.get(event.emoji_key, ()) or guid_id not in self.settings:
             return
-        if not await self.check_roles(user, msg.author, guild):
+        if str(event.channel_id) in self.settings[guid_id]["ignore"]:
             return
         react = self.settings[guid_id]["emoji"]
-        if react in str(reaction.emoji):
-            threshold = self.settings[guid_id]["threshold"]
-            count = await self.get_count(guild, msg) + 1 # add one here in case its not posted to starboard
-            if await self.check_is_posted(guild, msg): # check if stared message is in starboard
-                channel = reaction.message.guild.get_channel(int(self.settings[guid_id]["channel"]))
-                msg_id, count = await self.get_posted_message(guild, msg) # Count has been incremented
-                if msg_id is not None:
-                    msg_edit = await channel.fetch_message(id=int(msg_id))
-                    await msg_edit.edit(content=f"{reaction.emoji} **#{count}**")
-                    return
-            if count < threshold and threshold != 0:
-                store = {"original_message": msg.id, "new_message": None, "count": count}
-                has_message = None
-                for message in self.settings[guid_id]["messages"]:
-                    if msg.id == message["original_message"]:
-                        has_message = message
-                if has_message is not None:
-                    self.settings[guid_id]["messages"].remove(has_message)
-                    self.settings[guid_id]["messages"].append(store)
-                    await self.save_settings()
-                else:
-                    self.settings[guid_id]["messages"].append(store)
-                    await self.save_settings()
+        if emoji_key(react) != event.emoji_key:
+            return
+        user = await event.fetch_member()
+        if user is None:
+            return
+        # Tracked messages know their author, others have to be fetched
+        msg = None
+        author_id = self.get_author(guild, event.message_id)
+        if author_id is None:
+            msg = await event.fetch_message()
+            author_id = msg.author.id
+        if not await self.check_roles(user, author_id, guild):
+            return
+        threshold = self.settings[guid_id]["threshold"]
+        count = await self.get_count(guild, event.message_id) + 1 # add one here in case its not posted to starboard
+        if await self.check_is_posted(guild, event.message_id): # check if stared message is in starboard
+            msg_id, count = await self.get_posted_message(guild, event.message_id) # Count has been incremented
+            if msg_id is not None:
+                # Edited in place, neither message has to be fetched
+                await self.bot.http.edit_message(int(self.settings[guid_id]["channel"]), int(msg_id),
+                                                 content=f"{event.emoji} **#{count}**")
                 return
-            author = reaction.message.author
-            channel = reaction.message.channel
-            starboard_channel = self.bot.get_channel(int(self.settings[guid_id]["channel"]))
-            if reaction.message.embeds != []:
-                embed = reaction.message.embeds[0]  # .to_dict()
-                # print(embed)
-                em = discord.Embed(timestamp=reaction.message.timestamp)
-                if "title" in embed:
-                    em.title = embed["title"]
-                if "thumbnail" in embed:
-                    em.set_thumbnail(url=embed["thumbnail"]["url"])
-                if "description" in embed:
-                    em.description = msg.clean_content + "\n\n" + embed["description"]
-                if "description" not in embed:
-                    em.description = msg.clean_content
-                if "url" in embed:
-                    em.url = embed["url"]
-                if "footer" in embed:
-                    em.set_footer(text=embed["footer"]["text"])
-                if "author" in embed:
-                    postauthor = embed["author"]
-                    if "icon_url" in postauthor:
-                        if author.nick != None:
-                            em.set_author(name=author.nick, icon_url=author.avatar_url)
-                        else:
-                            em.set_author(name=author.name, icon_url=author.avatar_url)
-                    else:
-                        if author.nick != None:
-                            em.set_author(name=author.nick)
-                        else:
-                            em.set_author(name=author.name)
-                if "author" not in embed:
+        if count < threshold and threshold != 0:
+            store = {"original_message": event.message_id, "new_message": None, "count": count,
+                     "author": author_id}
+            self.settings.journal(guid_id).set(["messages", {"original_message": event.message_id}], store)
+            return
+        if msg is None:
+            msg = await event.fetch_message()
+        author = msg.author
+        channel = msg.channel
+        starboard_channel = self.bot.get_channel(int(self.settings[guid_id]["channel"]))
+        if msg.embeds != []:
+            embed = msg.embeds[0]  # .to_dict()
+            # print(embed)
+            em = discord.Embed(timestamp=msg.timestamp)
+            if "title" in embed:
+                em.title = embed["title"]
+            if "thumbnail" in embed:
+                em.set_thumbnail(url=embed["thumbnail"]["url"])
+            if "description" in embed:
+                em.description = msg.clean_content + "\n\n" + embed["description"]
+            if "description" not in embed:
+                em.description = msg.clean_content
+            if "url" in embed:
+                em.url = embed["url"]
+            if "footer" in embed:
+                em.set_footer(text=embed["footer"]["text"])
+            if "author" in embed:
+                postauthor = embed["author"]
+                if "icon_url" in postauthor:
                     if author.nick != None:
                         em.set_author(name=author.nick, icon_url=author.avatar_url)
                     else:
                         em.set_author(name=author.name, icon_url=author.avatar_url)
-                if "color" in embed:
-                    em.color = embed["color"]
-                if "color" not in embed:
-                    em.color = author.top_role.color
-                if "image" in embed:
-                    em.set_image(url=embed["image"]["url"])
-                if embed["type"] == "image":
-                    em.type = "image"
-                    if ".png" in embed["url"] or ".jpg" in embed["url"]:
-                        em.set_thumbnail(url="")
-                        em.set_image(url=embed["url"])
+                else:
+                    if author.nick != None:
+                        em.set_author(name=author.nick)
                     else:
-                        em.set_thumbnail(url=embed["url"])
-                        em.set_image(
-                            url=embed["url"] + "." + embed["thumbnail"]["url"].rsplit(".")[-1])
-                if embed["type"] == "gifv":
-                    em.type = "gifv"
-                    em.set_thumbnail(url=embed["url"])
-                    em.set_image(url=embed["url"] + ".gif")
-            else:
-                em = discord.Embed(timestamp=reaction.message.created_at)
-                em.color = author.top_role.color
-                em.description = msg.content
+                        em.set_author(name=author.name)
+            if "author" not in embed:
                 if author.nick != None:
                     em.set_author(name=author.nick, icon_url=author.avatar_url)
                 else:
                     em.set_author(name=author.name, icon_url=author.avatar_url)
-                if reaction.message.attachments != []:
-                    em.set_image(url=reaction.message.attachments[0].url)
-            em.set_footer(text='{} | {}'.format(channel.guild.name, channel.name))
-            post_msg = await starboard_channel.send("{} **#{}**".format(reaction.emoji, count),
-                                                   embed=em)
-            past_message_list = self.settings[guid_id]["messages"]
-            past_message_list.append({"original_message": msg.id, "new_message": post_msg.id, "count": count})
-            await self.save_settings()
+            if "color" in embed:
+                em.color = embed["color"]
+            if "color" not in embed:
+                em.color = author.top_role.color
+            if "image" in embed:
+                em.set_image(url=embed["image"]["url"])
+            if embed["type"] == "image":
+                em.type = "image"
+                if ".png" in embed["url"] or ".jpg" in embed["url"]:
+                    em.set_thumbnail(url="")
+                    em.set_image(url=embed["url"])
+                else:
+                    em.set_thumbnail(url=embed["url"])
+                    em.set_image(
+                        url=embed["url"] + "." + embed["thumbnail"]["url"].rsplit(".")[-1])
+            if embed["type"] == "gifv":
+                em.type = "gifv"
+                em.set_thumbnail(url=embed["url"])
+                em.set_image(url=embed["url"] + ".gif")
         else:
-            return
+            em = discord.Embed(timestamp=msg.created_at)
+            em.color = author.top_role.color
+            em.description = msg.content
+            if author.nick != None:
+                em.set_author(name=author.nick, icon_url=author.avatar_url)
+            else:
+                em.set_author(name=author.name, icon_url=author.avatar_url)
+            if msg.attachments != []:
+                em.set_image(url=msg.attachments[0].url)
+        em.set_footer(text='{} | {}'.format(channel.guild.name, channel.name))
+        post_msg = await starboard_channel.send("{} **#{}**".format(event.emoji, count),
+                                               embed=em)
+        self.settings.journal(guid_id).set(["messages", {"original_message": msg.id}],
+                                           {"original_message": msg.id, "new_message": post_msg.id, "count": count,
+                                            "author": author_id})
 
     # @commands.Cog.listener()
     # async def on_reaction_remove(self, reaction, user):
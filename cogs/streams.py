@@ -1,17 +1,38 @@
 import asyncio
 import os
 import re
+import time
 from collections import defaultdict
 from random import choice
 from string import ascii_letters
 
-import aiohttp
 import discord
 from discord.ext import commands, tasks
 from loguru import logger
 
+from .utils import cluster, migrations
 from .utils.chat_formatting import escape_mass_mentions
 from .utils.dataIO import dataIO
+from .utils.outbox import ALERT, get_outbox
+from .utils.webclient import get_client
+
+STREAMS_FOLDER = "data/streams"
+
+
+def _copy_file(name, suffix):
+    return os.path.join(STREAMS_FOLDER, name + suffix + ".json")
+
+
+# Under launcher.py every cluster, the primary too, alerts the channels of
+# its own guilds from its own copy of the files. The unsuffixed ones are
+# those of a bot running as one process. Each copy has a layout file
+# saying which guilds it is for, see Streams.take_share.
+_SUFFIX = ".cluster{}".format(cluster.current.index) if cluster.current.clustered else ""
+TWITCH_FILE = _copy_file("twitch", _SUFFIX)
+MIXER_FILE = _copy_file("beam", _SUFFIX)
+SETTINGS_FILE = _copy_file("settings", _SUFFIX)
+LAYOUT_FILE = _copy_file("layout", _SUFFIX)
+_COPY = re.compile(r"^(?:twitch|beam|settings|layout)((?:\.cluster\d+)?)\.json$")
 
 
 class StreamsError(Exception):
@@ -39,30 +60,21 @@ class Streams(commands.Cog):
     Alerts for a variety of streaming services"""
 
     async def cog_before_invoke(self, ctx):
-        if not os.path.exists("data/streams"):
-            print("Creating data/streams folder...")
-            os.makedirs("data/streams")
-        stream_files = (
-            "twitch.json",
-            "beam.json"
-        )
-        for filename in stream_files:
-            if not dataIO.is_valid_json("data/streams/" + filename):
-                logger.debug("Creating empty {}...".format(filename))
-                dataIO.save_json("data/streams/" + filename, [])
-        f = "data/streams/settings.json"
-        if not dataIO.is_valid_json(f):
-            logger.debug("Creating empty settings.json...")
-            dataIO.save_json(f, {})
+        check_files()
 
     def __init__(self, bot):
         self.bot = bot
+        self.web = get_client(bot)
         self.stream_checker.start()
-        self.twitch_streams = dataIO.load_json("data/streams/twitch.json")
-        self.mixer_streams = dataIO.load_json("data/streams/beam.json")
-        settings = dataIO.load_json("data/streams/settings.json")
+        self.twitch_streams = dataIO.load_json(TWITCH_FILE)
+        self.mixer_streams = dataIO.load_json(MIXER_FILE)
+        settings = dataIO.load_json(SETTINGS_FILE)
         self.settings = defaultdict(dict, settings)
         self.messages_cache = defaultdict(list)
+        migrations.register(TWITCH_FILE, 1, self._migration_twitch_v5)
+        self.twitch_migrated = migrations.is_current(TWITCH_FILE)
+        # Why the last migration attempt failed, logged once
+        self._migration_error = None
 
     @commands.command()
     async def twitch(self, ctx, stream: str):
@@ -141,7 +153,7 @@ class Streams(commands.Cog):
         else:
             await ctx.send("Alert has been removed from this channel.")
 
-        dataIO.save_json("data/streams/twitch.json", self.twitch_streams)
+        dataIO.save_json(TWITCH_FILE, self.twitch_streams)
 
     @streamalert.command(name="mixer")
     async def mixer_alert(self, ctx, stream: str):
@@ -171,7 +183,7 @@ class Streams(commands.Cog):
         else:
             await ctx.send("Alert has been removed from this channel.")
 
-        dataIO.save_json("data/streams/beam.json", self.mixer_streams)
+        dataIO.save_json(MIXER_FILE, self.mixer_streams)
 
     @streamalert.command(name="stop", )
     async def stop_alert(self, ctx):
@@ -195,8 +207,8 @@ class Streams(commands.Cog):
             for s in to_delete:
                 stream_type.remove(s)
 
-        dataIO.save_json("data/streams/twitch.json", self.twitch_streams)
-        dataIO.save_json("data/streams/beam.json", self.mixer_streams)
+        dataIO.save_json(TWITCH_FILE, self.twitch_streams)
+        dataIO.save_json(MIXER_FILE, self.mixer_streams)
 
         await ctx.send("There will be no more stream alerts in this "
                        "channel.")
@@ -220,7 +232,7 @@ class Streams(commands.Cog):
           5. Paste the Client ID into this command. Done!
         """
         self.settings["TWITCH_TOKEN"] = token
-        dataIO.save_json("data/streams/settings.json", self.settings)
+        dataIO.save_json(SETTINGS_FILE, self.settings)
         await ctx.send('Twitch Client-ID set.')
 
     @streamset.command(no_pm=True)
@@ -240,7 +252,7 @@ class Streams(commands.Cog):
         else:
             await self.bot.send_cmd_help(ctx)
 
-        dataIO.save_json("data/streams/settings.json", self.settings)
+        dataIO.save_json(SETTINGS_FILE, self.settings)
 
     @streamset.command(no_pm=True)
     async def autodelete(self, ctx):
@@ -256,19 +268,17 @@ class Streams(commands.Cog):
         else:
             await ctx.send("Notifications won't be deleted anymore.")
 
-        dataIO.save_json("data/streams/settings.json", self.settings)
+        dataIO.save_json(SETTINGS_FILE, self.settings)
 
     async def twitch_online(self, stream):
-        session = aiohttp.ClientSession()
         url = "https://api.twitch.tv/kraken/streams/" + stream
         header = {
             'Client-ID': self.settings.get("TWITCH_TOKEN", ""),
             'Accept': 'application/vnd.twitchtv.v5+json'
         }
 
-        async with session.get(url, headers=header) as r:
+        async with self.web.session.get(url, headers=header) as r:
             data = await r.json(encoding='utf-8')
-        await session.close()
         if r.status == 200:
             if data["stream"] is None:
                 raise OfflineStream()
@@ -283,7 +293,7 @@ class Streams(commands.Cog):
     async def mixer_online(self, stream):
         url = "https://mixer.com/api/v1/channels/" + stream
 
-        async with aiohttp.get(url) as r:
+        async with self.web.session.get(url) as r:
             data = await r.json(encoding='utf-8')
         if r.status == 200:
             if data["online"] is True:
@@ -308,9 +318,8 @@ class Streams(commands.Cog):
         results = []
 
         for streams_list in chunks(streams):
-            session = aiohttp.ClientSession()
             url = base_url + ",".join(streams_list)
-            async with session.get(url, headers=header) as r:
+            async with self.web.session.get(url, headers=header) as r:
                 data = await r.json(encoding='utf-8')
             if r.status == 200:
                 results.extend(data["users"])
@@ -318,7 +327,6 @@ class Streams(commands.Cog):
                 raise InvalidCredentials()
             else:
                 raise APIError()
-            await session.close()
 
         if not results and raise_if_none:
             raise StreamNotFound()
@@ -398,18 +406,13 @@ class Streams(commands.Cog):
     async def stream_checker(self):
         await self.bot.wait_until_ready()
         CHECK_DELAY = 60
-        try:
-            await self._migration_twitch_v5()
-        except InvalidCredentials:
-            print("Error during conversion of twitch usernames to IDs: "
-                  "invalid token")
-        except Exception as e:
-            print("Error during conversion of twitch usernames to IDs: "
-                  "{}".format(e))
         save = False
         streams = ((self.twitch_streams, self.twitch_online),
                    (self.mixer_streams, self.mixer_online))
 
+        if not self.twitch_migrated:
+            await self.migrate_twitch()
+
         for streams_list, parser in streams:
             if parser == self.twitch_online:
                 _type = "ID"
@@ -433,7 +436,8 @@ class Streams(commands.Cog):
                         continue
                     save = True
                     stream["ALREADY_ONLINE"] = True
-                    messages_sent = []
+                    outbox = get_outbox(self.bot)
+                    pending = []
                     for channel_id in stream["CHANNELS"]:
                         channel = self.bot.get_channel(channel_id)
                         if channel is None:
@@ -442,16 +446,93 @@ class Streams(commands.Cog):
                         can_speak = channel.permissions_for(channel.guild.me).send_messages
                         message = mention + " {} is live!".format(stream["NAME"])
                         if channel and can_speak:
-                            m = await channel.send(message, embed=embed)
-                            messages_sent.append(m)
-                    self.messages_cache[key] = messages_sent
+                            pending.append(outbox.send(channel, message, embed=embed, priority=ALERT))
+                    # Channels are sent to concurrently
+                    sent = await asyncio.gather(*pending, return_exceptions=True)
+                    self.messages_cache[key] = [m for m in sent if isinstance(m, discord.Message)]
 
             if save:
-                dataIO.save_json("data/streams/twitch.json", self.twitch_streams)
-                dataIO.save_json("data/streams/beam.json", self.mixer_streams)
+                dataIO.save_json(TWITCH_FILE, self.twitch_streams)
+                dataIO.save_json(MIXER_FILE, self.mixer_streams)
 
             await asyncio.sleep(CHECK_DELAY)
 
+    @stream_checker.before_loop
+    async def migrate_streams(self):
+        await self.bot.wait_until_ready()
+        try:
+            await self.take_share()
+        except Exception:
+            logger.exception("Could not take this cluster's stream alerts, will try again next start")
+
+    async def migrate_twitch(self):
+        """Runs the pending migrations of the twitch streams, again on every
+        check until they went through. The IDs found are merged into the
+        streams in use, which may have changed while the API was asked."""
+        try:
+            migrated = await migrations.aload(TWITCH_FILE)
+        except Exception as e:
+            error = "invalid or missing Client-ID" if isinstance(e, InvalidCredentials) else repr(e)
+            if error != self._migration_error:
+                logger.warning("Could not convert twitch usernames to IDs, retrying every check: "
+                               "{}".format(error))
+                self._migration_error = error
+            return
+        ids = {stream["NAME"].lower(): stream["ID"] for stream in migrated if "ID" in stream}
+        for stream in self.twitch_streams:
+            if "ID" not in stream and stream["NAME"].lower() in ids:
+                stream["ID"] = ids[stream["NAME"].lower()]
+        # The ones twitch doesn't know (anymore) can't be checked
+        self.twitch_streams[:] = [stream for stream in self.twitch_streams if "ID" in stream]
+        dataIO.save_json(TWITCH_FILE, self.twitch_streams)
+        self.twitch_migrated = migrations.is_current(TWITCH_FILE)
+        self._migration_error = None
+
+    async def take_share(self):
+        """Takes the alerts and settings of this cluster's guilds from
+        every copy of the files when the cluster layout changed
+
+        A copy knows the guilds of the cluster that last kept it, and of
+        those the newest copy is the one that's up to date. Channels are
+        mapped to their guild through the cache, which has every guild
+        this cluster runs, so only channels of unavailable guilds have to
+        be fetched."""
+        current = _layout(cluster.current)
+        if _read(LAYOUT_FILE, {}).get("layout") == current:
+            return
+        copies = _load_copies()
+        channels = {channel_id for copy in copies for streams in (copy.twitch, copy.mixer)
+                    for stream in streams for channel_id in stream["CHANNELS"]}
+        guilds = {}
+        for channel_id in channels:
+            guild_id = await self.guild_of(channel_id)
+            if guild_id is not None and cluster.current.owns(guild_id):
+                guilds[channel_id] = guild_id
+        twitch, mixer, settings = _share(copies, guilds, cluster.current.owns)
+        # In place, the stream checker holds on to the lists
+        self.twitch_streams[:], self.mixer_streams[:] = twitch, mixer
+        self.settings.clear()
+        self.settings.update(settings)
+        dataIO.save_json(TWITCH_FILE, twitch)
+        dataIO.save_json(MIXER_FILE, mixer)
+        dataIO.save_json(SETTINGS_FILE, settings)
+        dataIO.save_json(LAYOUT_FILE, {"layout": current, "time": time.time()})
+        logger.info("Took {} twitch and {} mixer stream alerts for {}".format(
+            len(twitch), len(mixer), cluster.current))
+
+    async def guild_of(self, channel_id):
+        """The guild id of a channel, None if it isn't one of this cluster's"""
+        channel = self.bot.get_channel(channel_id)
+        if channel is not None:
+            return channel.guild.id
+        if not any(guild.unavailable for guild in self.bot.guilds):
+            return None
+        try:
+            channel = await self.bot.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden):
+            return None
+        return getattr(channel, "guild", None) and channel.guild.id
+
     @commands.has_permissions(manage_messages=True)
     async def delete_old_notifications(self, key):
         for message in self.messages_cache[key]:
@@ -470,30 +551,108 @@ class Streams(commands.Cog):
         """Avoids Discord's caching"""
         return "?rnd=" + "".join([choice(ascii_letters) for i in range(6)])
 
-    async def _migration_twitch_v5(self):
-        #  Migration of old twitch streams to API v5
+    async def _migration_twitch_v5(self, twitch_streams):
+        #  Migration of old twitch streams to API v5, runs once through
+        #  the migrations registry before the stream checker starts
         to_convert = []
-        for stream in self.twitch_streams:
+        for stream in twitch_streams:
             if "ID" not in stream:
                 to_convert.append(stream["NAME"])
 
         if not to_convert:
-            return
+            return twitch_streams
 
         results = await self.fetch_twitch_ids(*to_convert)
 
-        for stream in self.twitch_streams:
+        for stream in twitch_streams:
             for result in results:
                 if stream["NAME"].lower() == result["name"].lower():
                     stream["ID"] = result["_id"]
 
         # We might as well delete the invalid / renamed ones
-        self.twitch_streams = [s for s in self.twitch_streams if "ID" in s]
+        return [s for s in twitch_streams if "ID" in s]
+
+
+class _Copy():
+    """One cluster's (or the single process') copy of the files"""
+
+    def __init__(self, suffix):
+        layout = _read(_copy_file("layout", suffix), {})
+        # Copies from before layouts were recorded may have any guild
+        self.owner = cluster.Cluster(**layout["layout"]) if "layout" in layout else cluster.Cluster()
+        self.time = layout.get("time", 0)
+        self.twitch = _read(_copy_file("twitch", suffix), [])
+        self.mixer = _read(_copy_file("beam", suffix), [])
+        self.settings = _read(_copy_file("settings", suffix), {})
+
+
+def _read(filename, default):
+    return dataIO.load_json(filename) if dataIO.is_valid_json(filename) else default
 
-        dataIO.save_json("data/streams/twitch.json", self.twitch_streams)
+
+def _layout(current):
+    return {"index": current.index, "count": current.count,
+            "shard_ids": None if current.shard_ids is None else list(current.shard_ids),
+            "shard_count": current.shard_count}
+
+
+def _load_copies():
+    suffixes = {match.group(1) for match in map(_COPY.match, os.listdir(STREAMS_FOLDER)) if match}
+    return [_Copy(suffix) for suffix in sorted(suffixes)]
+
+
+def _share(copies, guilds, owns):
+    """The twitch streams, mixer streams and settings of the guilds owns,
+    each taken from the newest copies of a cluster that had the guild.
+    guilds maps the channel ids to keep to their guild id."""
+    newest = {}
+
+    def up_to_date(copy, guild_id):
+        if guild_id not in newest:
+            times = [other.time for other in copies if other.owner.owns(guild_id)]
+            newest[guild_id] = max(times) if times else None
+        return copy.owner.owns(guild_id) and copy.time == newest[guild_id]
+
+    def share(lists):
+        kept = {}
+        for copy, streams in lists:
+            for stream in streams:
+                for channel_id in stream["CHANNELS"]:
+                    guild_id = guilds.get(channel_id)
+                    if guild_id is None or not up_to_date(copy, guild_id):
+                        continue
+                    entry = kept.setdefault(stream.get("ID", stream["NAME"]), dict(stream, CHANNELS=[]))
+                    if channel_id not in entry["CHANNELS"]:
+                        entry["CHANNELS"].append(channel_id)
+        return list(kept.values())
+
+    settings = {}
+    for copy in sorted(copies, key=lambda copy: copy.time):
+        for key, value in copy.settings.items():
+            if not key.isdigit():
+                # Bot wide, e.g. the twitch token, the newest one wins
+                settings[key] = value
+            elif owns(int(key)) and up_to_date(copy, int(key)):
+                settings[key] = value
+    return (share((copy, copy.twitch) for copy in copies),
+            share((copy, copy.mixer) for copy in copies), settings)
+
+
+def check_files():
+    if not os.path.exists("data/streams"):
+        print("Creating data/streams folder...")
+        os.makedirs("data/streams")
+    for filename in (TWITCH_FILE, MIXER_FILE):
+        if not dataIO.is_valid_json(filename):
+            logger.debug("Creating empty {}...".format(filename))
+            dataIO.save_json(filename, [])
+    if not dataIO.is_valid_json(SETTINGS_FILE):
+        logger.debug("Creating empty {}...".format(SETTINGS_FILE))
+        dataIO.save_json(SETTINGS_FILE, {})
 
 
 def setup(bot):
+    check_files()
     n = Streams(bot)
     loop = asyncio.get_event_loop()
     loop.create_task(n.stream_checker())
@@ -1,8 +1,9 @@
 from urllib.parse import quote_plus
 
-import requests
 from discord.ext import commands
 
+from .utils.webclient import get_client
+
 
 class Urban(commands.Cog):
     def __init__(self, bot):
@@ -35,9 +36,10 @@ class Urban(commands.Cog):
         search_terms = "+".join([encode(s) for s in search_terms])
         url = "http://api.urbandictionary.com/v0/define?term=" + search_terms
         try:
-            with requests.get(url) as r:
-                result = r.json()
-            if result["list"]:
+            status, result = await get_client(self.bot).get_json(url)
+            if status != 200:
+                await ctx.send("Urban Dictionary isn't answering right now, try again later.")
+            elif result["list"]:
                 definition = result['list'][pos]['definition']
                 example = result['list'][pos]['example']
                 defs = len(result['list'])
@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+
+# How launcher.py tells a worker which part of the bot it runs
+ENV_CLUSTER = "PERIBOT_CLUSTER"
+ENV_CLUSTERS = "PERIBOT_CLUSTERS"
+ENV_SHARDS = "PERIBOT_SHARDS"
+ENV_SHARD_COUNT = "PERIBOT_SHARD_COUNT"
+ENV_STATUS = "PERIBOT_STATUS"
+
+
+def parse_shards(text):
+    """"0-3,6" -> (0, 1, 2, 3, 6)"""
+    shard_ids = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        shard_ids.extend(range(int(first), int(last or first) + 1))
+    return tuple(sorted(set(shard_ids)))
+
+
+def format_shards(shard_ids):
+    """(0, 1, 2, 3, 6) -> "0-3,6" """
+    ranges = []
+    for shard_id in sorted(shard_ids):
+        if ranges and ranges[-1][1] == shard_id - 1:
+            ranges[-1][1] = shard_id
+        else:
+            ranges.append([shard_id, shard_id])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def split_shards(shard_count, clusters):
+    """Contiguous shard ranges of about the same size, one per cluster"""
+    if not 0 < clusters <= shard_count:
+        raise ValueError(f"Can't split {shard_count} shards into {clusters} clusters")
+    size, extra = divmod(shard_count, clusters)
+    ranges, first = [], 0
+    for index in range(clusters):
+        last = first + size + (index < extra)
+        ranges.append(tuple(range(first, last)))
+        first = last
+    return ranges
+
+
+def shard_of(guild_id, shard_count):
+    """The shard Discord sends the events of a guild to"""
+    return (int(guild_id) >> 22) % shard_count
+
+
+class Cluster():
+    """The part of the bot this process runs
+
+    A single process (the default, main.py started by hand) runs every
+    shard and owns every guild. Under launcher.py every worker process
+    runs a range of shards and only owns the guilds of those shards, so
+    per guild state (see GuildStore) is only ever read and written by
+    the one process that gets the guild's events. State that isn't per
+    guild gets a file per cluster through path(). Cluster 0 is the
+    primary: it keeps the original file names and splits legacy files.
+
+        cluster.current.owns(guild_id)
+        Journal(cluster.current.path("data/remindme/reminders.json"))
+    """
+
+    def __init__(self, index=0, count=1, shard_ids=None, shard_count=None):
+        self.index = index
+        self.count = count
+        self.shard_ids = None if shard_ids is None else tuple(shard_ids)
+        self.shard_count = shard_count
+        self._owned = None if shard_ids is None else frozenset(shard_ids)
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        shards = environ.get(ENV_SHARDS)
+        return cls(index=int(environ.get(ENV_CLUSTER, 0)),
+                   count=int(environ.get(ENV_CLUSTERS, 1)),
+                   shard_ids=parse_shards(shards) if shards else None,
+                   shard_count=int(environ[ENV_SHARD_COUNT]) if shards else None)
+
+    @property
+    def primary(self):
+        return self.index == 0
+
+    @property
+    def clustered(self):
+        return self.count > 1
+
+    def owns(self, guild_id):
+        """Whether the events of guild_id come to this process"""
+        if self._owned is None:
+            return True
+        return shard_of(guild_id, self.shard_count) in self._owned
+
+    def path(self, filename):
+        """This cluster's own copy of a file that isn't per guild"""
+        if self.primary:
+            return filename
+        root, ext = os.path.splitext(filename)
+        return f"{root}.cluster{self.index}{ext}"
+
+    def __str__(self):
+        shards = "all shards" if self.shard_ids is None else \
+            f"shards {format_shards(self.shard_ids)} of {self.shard_count}"
+        return f"cluster {self.index}/{self.count} ({shards})"
+
+
+current = Cluster.from_env()
+
+
+def write_status(filename, status):
+    """Replaces a status file at once, so its reader never sees half of it"""
+    folder = os.path.dirname(filename) or "."
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(filename) + "-", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(status, f)
+        os.replace(tmp_file, filename)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def read_status(filename):
+    """The status in filename, None if there is none (yet)"""
+    try:
+        with open(filename, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -1,8 +1,11 @@
 import re
 
+import discord
 from discord.ext.commands.converter import IDConverter
 from discord.ext.commands.errors import BadArgument
 
+from .members import get_resolver
+
 
 # This could've been imported but since it's an internal it's safer
 # to get it here
@@ -21,27 +24,33 @@ class GlobalUser(IDConverter):
     The key difference is that if the command is issued in a server it will
     first attempt to get the user from that server and upon failing it will
     attempt to fish it from the global pool
+    Members missing from the cache (low memory mode) are found through the
+    MemberResolver, users in no common server through the API
     """
-    def convert(self):
-        message = self.ctx.message
-        bot = self.ctx.bot
-        match = self._get_id_match() or re.match(r'<@!?([0-9]+)>$', self.argument)
-        server = message.guild
+    async def convert(self, ctx, argument):
+        bot = ctx.bot
+        match = self._get_id_match(argument) or re.match(r'<@!?([0-9]+)>$', argument)
+        server = ctx.guild
         result = None
         if match is None:
             # not a mention...
             if server:
-                result = server.get_member_named(self.argument)
+                result = get_resolver(bot).get_named(server, argument)
             if result is None:
-                result = _get_from_servers(bot, 'get_member_named', self.argument)
+                result = _get_from_servers(bot, 'get_member_named', argument)
         else:
-            user_id = match.group(1)
+            user_id = int(match.group(1))
             if server:
-                result = server.get_member(user_id)
+                result = await get_resolver(bot).get(server, user_id)
+            if result is None:
+                result = _get_from_servers(bot, 'get_member', user_id) or bot.get_user(user_id)
             if result is None:
-                result = _get_from_servers(bot, 'get_member', user_id)
+                try:
+                    result = await bot.fetch_user(user_id)
+                except discord.HTTPException:
+                    pass
 
         if result is None:
-            raise BadArgument('User "{}" not found'.format(self.argument))
+            raise BadArgument('User "{}" not found'.format(argument))
 
         return result
@@ -0,0 +1,191 @@
+import json
+import logging
+import mmap
+import os
+import random
+import re
+import struct
+from array import array
+
+# Header of the .idx file: mtime_ns and size of the corpus it was built
+# from, followed by the number of entries
+_HEADER = struct.Struct("<qQQ")
+_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"', re.S)
+_SPACE = re.compile(rb'[ \t\r\n]*')
+
+
+class InvalidCorpus(Exception):
+    pass
+
+
+class Corpus():
+    """Read-only list of strings backed by a json file
+
+    Only the byte offsets of the strings are kept in memory, entries are
+    read from the file when asked for. The offsets are built once and
+    cached in <filename>.idx, and rebuilt when the file's mtime or size
+    changes. The file is a json array of strings, or an object holding
+    one under key.
+
+        quotes = Corpus("data/cp/quotes/quotes.json")
+        compliments = Corpus("data/compliment/compliments.json", key="compliments")
+        compliments.choice()
+    """
+
+    def __init__(self, filename, key=None):
+        self.filename = filename
+        self.key = key
+        self.index_file = filename + ".idx"
+        self.logger = logging.getLogger("red")
+        self._stamp = None
+        # start, end, start, end... of every string in the file
+        self._offsets = array("Q")
+
+    def __len__(self):
+        self._refresh()
+        return len(self._offsets) // 2
+
+    def __getitem__(self, index):
+        self._refresh()
+        count = len(self._offsets) // 2
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("corpus index out of range")
+        start, end = self._offsets[2 * index], self._offsets[2 * index + 1]
+        with open(self.filename, mode="rb") as f:
+            f.seek(start)
+            raw = f.read(end - start)
+        return json.loads(raw.decode('utf-8'))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def choice(self):
+        """A random entry"""
+        count = len(self)
+        if not count:
+            raise IndexError("Cannot choose from an empty corpus")
+        return self[random.randrange(count)]
+
+    def _refresh(self):
+        st = os.stat(self.filename)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+        if not self._read_index(stamp):
+            self._build_index()
+            self._write_index(stamp)
+        self._stamp = stamp
+
+    def _read_index(self, stamp):
+        try:
+            with open(self.index_file, mode="rb") as f:
+                header = f.read(_HEADER.size)
+                if len(header) != _HEADER.size:
+                    return False
+                mtime, size, count = _HEADER.unpack(header)
+                if (mtime, size) != stamp:
+                    return False
+                offsets = array("Q")
+                offsets.frombytes(f.read())
+        except (FileNotFoundError, ValueError):
+            return False
+        if len(offsets) != 2 * count:
+            return False
+        self._offsets = offsets
+        return True
+
+    def _write_index(self, stamp):
+        tmp_file = "{}-{}.tmp".format(self.index_file, os.getpid())
+        try:
+            with open(tmp_file, mode="wb") as f:
+                f.write(_HEADER.pack(stamp[0], stamp[1], len(self._offsets) // 2))
+                f.write(self._offsets.tobytes())
+            os.replace(tmp_file, self.index_file)
+        except OSError:
+            # Read-only data folder, the index just lives in memory
+            self.logger.warning("Could not cache the index of {}".format(self.filename))
+
+    def _build_index(self):
+        offsets = array("Q")
+        with open(self.filename, mode="rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # mmap can't map an empty file, and there is nothing in it
+                self.logger.warning("{} is empty".format(self.filename))
+                self._offsets = offsets
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                self._index(buf, offsets)
+        self._offsets = offsets
+
+    def _index(self, buf, offsets):
+        """Appends the offsets of the strings in buf to offsets"""
+        i = self._find_array(buf)
+        i = _SPACE.match(buf, i).end()
+        if buf[i:i + 1] == b"]":
+            return
+        while True:
+            match = _STRING.match(buf, i)
+            if match is None:
+                raise InvalidCorpus("{} holds something other than strings at "
+                                    "byte {}".format(self.filename, i))
+            offsets.append(match.start())
+            offsets.append(match.end())
+            i = _SPACE.match(buf, match.end()).end()
+            if buf[i:i + 1] == b"]":
+                break
+            if buf[i:i + 1] != b",":
+                raise InvalidCorpus("Expected , or ] in {} at byte {}".format(self.filename, i))
+            i = _SPACE.match(buf, i + 1).end()
+
+    def _find_array(self, buf):
+        """Returns the position right after the [ of the list of strings"""
+        i = _SPACE.match(buf, 3 if buf[:3] == b"\xef\xbb\xbf" else 0).end()
+        if self.key is None:
+            if buf[i:i + 1] != b"[":
+                raise InvalidCorpus("{} is not a json array".format(self.filename))
+            return i + 1
+        if buf[i:i + 1] != b"{":
+            raise InvalidCorpus("{} is not a json object".format(self.filename))
+        i += 1
+        while True:
+            i = _SPACE.match(buf, i).end()
+            match = _STRING.match(buf, i)
+            if match is None:
+                raise InvalidCorpus("{} has no key {}".format(self.filename, self.key))
+            i = _SPACE.match(buf, match.end()).end()
+            if buf[i:i + 1] != b":":
+                raise InvalidCorpus("Expected : in {} at byte {}".format(self.filename, i))
+            i = _SPACE.match(buf, i + 1).end()
+            if json.loads(match.group().decode('utf-8')) == self.key:
+                if buf[i:i + 1] != b"[":
+                    raise InvalidCorpus("{} in {} is not an array".format(self.key, self.filename))
+                return i + 1
+            i = _SPACE.match(buf, _skip_value(buf, i)).end()
+            if buf[i:i + 1] != b",":
+                raise InvalidCorpus("{} has no key {}".format(self.filename, self.key))
+            i += 1
+
+
+def _skip_value(buf, i):
+    """Returns the position right after the json value starting at i"""
+    depth = 0
+    while i < len(buf):
+        c = buf[i:i + 1]
+        if c == b'"':
+            i = _STRING.match(buf, i).end()
+            if depth == 0:
+                return i
+            continue
+        if c in (b"[", b"{"):
+            depth += 1
+        elif c in (b"]", b"}"):
+            depth -= 1
+            if depth <= 0:
+                return i + 1 if depth == 0 else i
+        elif depth == 0 and c == b",":
+            return i
+        i += 1
+    return i
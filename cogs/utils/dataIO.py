@@ -1,56 +1,424 @@
+import asyncio
+import hashlib
 import json
 import os
 import logging
-from random import randint
+import stat
+import tempfile
+import threading
+import weakref
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+from . import cluster
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
 
 class InvalidFileIO(Exception):
     pass
 
+# encode turns data into the bytes written to disk. Codecs marked atomic
+# encode in C without releasing the GIL, so asave_json can run them in the
+# thread pool: no code on the event loop can change data halfway through.
+Codec = namedtuple("Codec", "encode atomic")
+
+CODECS = {
+    "pretty": Codec(lambda data: json.dumps(data, indent=4, sort_keys=True,
+                                            separators=(',', ' : ')).encode('utf-8'),
+                    False),
+    "compact": Codec(lambda data: json.dumps(data, separators=(',', ':')).encode('utf-8'),
+                     True),
+}
+if orjson is not None:
+    CODECS["orjson"] = Codec(lambda data: orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS),
+                             True)
+if ujson is not None:
+    CODECS["ujson"] = Codec(lambda data: ujson.dumps(data, ensure_ascii=False).encode('utf-8'),
+                            True)
+
+# Every codec writes plain json, so one decoder reads files from all of them
+_decode = orjson.loads if orjson is not None else json.loads
+
 class DataIO():
     def __init__(self):
         self.logger = logging.getLogger("red")
+        # Seconds a deferred save may sit in memory before it is written
+        self.flush_interval = 5.0
+        self._dirty = {}
+        self._flush_handles = {}
+        # filename -> [(st_mtime_ns, st_size), json bytes, frozen view or None,
+        #              digest of the bytes]
+        self._cache = {}
+        # Codec used for saving, and per file overrides (e.g. "pretty" for
+        # files people edit by hand)
+        self.codec = "orjson" if orjson is not None else "compact"
+        self.file_codecs = {}
+        # Threads used by the awaitable aload_json / asave_json
+        self.max_workers = 4
+        self._executor = None
+        # filename -> asyncio.Lock held by whoever is writing the file
+        self._locks = weakref.WeakValueDictionary()
+        # Every save gets a generation number when it is made; a write
+        # that finishes after a newer one has landed is dropped
+        self._generations = {}
+        self._written = {}
+        self._replace_lock = threading.Lock()
+        # Optional storage engine replacing the json files, see sqlstore.py
+        self.backend = None
+
+    def use_backend(self, backend):
+        """Stores files through backend instead of on disk"""
+        self.flush()
+        self._cache.clear()
+        self.backend = backend
+
+    def set_codec(self, codec, filename=None):
+        """Sets the codec used to save filename (or every file directly in
+        it if it's a folder), or the default codec if no filename is given"""
+        if codec not in CODECS:
+            raise InvalidFileIO("Unknown or unavailable codec: {}".format(codec))
+        if filename is None:
+            self.codec = codec
+        else:
+            self.file_codecs[filename] = codec
+
+    def save_json(self, filename, data, defer=False):
+        """Atomically saves json file
+
+        With defer=True the file is only marked dirty and written out at
+        most once per flush_interval seconds, the latest data wins.
+
+        A save made while an awaitable writer holds the file's lock is
+        written once the lock is released, so it can't be overwritten by
+        the older data of that writer; update() applies its change on top
+        of it."""
+        if defer:
+            return self._defer_save(filename, data)
+        if self._locked(filename):
+            return self._save_after_lock(filename, data)
+        self._cancel_flush(filename)
+        self._dirty.pop(filename, None)
+        return self._atomic_save(filename, data, self._next_generation(filename))
+
+    def flush(self, filename=None):
+        """Writes out pending deferred saves, all of them if no filename is given
 
-    def save_json(self, filename, data):
-        """Atomically saves json file"""
-        rnd = randint(1000, 9999)
-        path, ext = os.path.splitext(filename)
-        tmp_file = "{}-{}.tmp".format(path, rnd)
-        self._save_json(tmp_file, data)
+        Files whose lock is held are left to be written after it's released."""
+        filenames = list(self._dirty) if filename is None else [filename]
+        result = True
+        for f in filenames:
+            if f not in self._dirty:
+                self._cancel_flush(f)
+                continue
+            if self._locked(f):
+                self._save_after_lock(f, self._dirty[f])
+                continue
+            self._cancel_flush(f)
+            data = self._dirty.pop(f)
+            try:
+                result = self._atomic_save(f, data, self._next_generation(f)) and result
+            except Exception:
+                self.logger.exception("Deferred save of {} failed".format(f))
+                result = False
+        return result
+
+    async def asave_json(self, filename, data):
+        """Awaitable save_json
+
+        Encoding, writing and fsync happen in the thread pool. An atomic
+        codec encodes data there in one go, so the file holds data as it
+        was at some point after the call; other codecs need a compact json
+        snapshot taken on the event loop, which gets formatted in the pool.
+        Saves of the same file complete in the order they were made."""
+        self._cancel_flush(filename)
+        self._dirty.pop(filename, None)
+        job = self._save_job(filename, data)
+        async with self.lock(filename):
+            return await self._in_pool(*job)
+
+    async def aload_json(self, filename, frozen=False):
+        """Awaitable load_json, the file is read in the thread pool"""
+        if filename in self._dirty:
+            await self.asave_json(filename, self._dirty[filename])
+        async with self.lock(filename):
+            return await self._in_pool(self._load, filename, frozen)
+
+    async def update(self, filename, fn, default=None):
+        """Read-modify-write of a json file under its lock
+
+        fn gets a private copy of the data (or of default if the file
+        doesn't exist yet) to change in place, the result is saved before
+        the lock is released and whatever fn returned is returned. No other
+        save of the file can land in between, so there is no need to
+        reload the file before changing it."""
+        async with self.lock(filename):
+            data = None
+            if filename not in self._dirty:
+                try:
+                    data = await self._in_pool(self._load, filename, False)
+                except FileNotFoundError:
+                    if default is None and filename not in self._dirty:
+                        raise
+                    data = json.loads(json.dumps(default))
+            if filename in self._dirty:
+                # Saved before we got the lock or while the file was being
+                # read, which makes it newer than the file
+                self._cancel_flush(filename)
+                data = json.loads(json.dumps(self._dirty.pop(filename)))
+            result = fn(data)
+            await self._in_pool(*self._save_job(filename, data))
+            return result
+
+    def lock(self, filename):
+        """The asyncio lock that serializes awaitable writers of filename"""
+        lock = self._locks.get(filename)
+        if lock is None:
+            lock = self._locks[filename] = asyncio.Lock()
+        return lock
+
+    def _locked(self, filename):
+        lock = self._locks.get(filename)
+        return lock is not None and lock.locked()
+
+    def load_json(self, filename, frozen=False):
+        """Loads json file
+
+        Parsed files are cached and revalidated with a single stat call.
+        With frozen=True a shared read-only view is returned (dicts become
+        mappingproxies and lists tuples), otherwise a private copy that the
+        caller is free to modify."""
+        if filename in self._dirty:
+            self.flush(filename)
+        return self._load(filename, frozen)
+
+    def _load(self, filename, frozen):
+        if self.backend is not None:
+            return self.backend.load(filename, frozen)
+        entry, data = self._cached(filename)
+        if data is None and (not frozen or entry[2] is None):
+            data = _decode(entry[1])
+        if frozen:
+            if entry[2] is None:
+                entry[2] = _freeze(data)
+            return entry[2]
+        return data
+
+    def remove_json(self, filename):
+        """Deletes a json file, pending deferred saves included"""
+        self._cancel_flush(filename)
+        self._dirty.pop(filename, None)
+        self._cache.pop(filename, None)
+        if self.backend is not None:
+            return self.backend.remove(filename)
         try:
-            self._read_json(tmp_file)
-        except json.decoder.JSONDecodeError:
-            self.logger.exception("Attempted to write file {} but JSON "
-                                  "integrity check on tmp file has failed. "
-                                  "The original file is unaltered."
-                                  "".format(filename))
-            return False
-        os.replace(tmp_file, filename)
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
         return True
 
-    def load_json(self, filename):
-        """Loads json file"""
-        return self._read_json(filename)
+    def list_json(self, folder):
+        """Names of the json files directly inside folder"""
+        if self.backend is not None:
+            names = set(self.backend.list(folder))
+        else:
+            names = {f for f in os.listdir(folder) if f.endswith(".json")}
+        names.update(os.path.basename(f) for f in self._dirty
+                     if os.path.dirname(f) == folder)
+        return sorted(names)
 
     def is_valid_json(self, filename):
         """Verifies if json file exists / is readable"""
+        if filename in self._dirty:
+            self.flush(filename)
+        if self.backend is not None:
+            return self.backend.exists(filename)
         try:
-            self._read_json(filename)
+            self._cached(filename)
             return True
         except FileNotFoundError:
             return False
-        except json.decoder.JSONDecodeError:
+        except ValueError:
+            return False
+
+    def _save_job(self, filename, data):
+        """Returns the function and arguments that store data from the
+        thread pool, snapshotting data first unless the codec is atomic"""
+        generation = self._next_generation(filename)
+        codec = self._codec(filename)
+        if codec.atomic and self.backend is None:
+            return self._encode_atomic, filename, codec.encode, data, generation
+        return self._save_snapshot, filename, json.dumps(data), generation
+
+    def _atomic_save(self, filename, data, generation):
+        if self.backend is not None:
+            return self._backend_save(filename, data, generation)
+        return self._write_atomic(filename, self._codec(filename).encode(data), generation)
+
+    def _encode_atomic(self, filename, encode, data, generation):
+        return self._write_atomic(filename, encode(data), generation)
+
+    def _save_snapshot(self, filename, snapshot, generation):
+        if self.backend is not None:
+            return self._backend_save(filename, _decode(snapshot), generation)
+        return self._write_atomic(filename,
+                                  self._codec(filename).encode(_decode(snapshot)),
+                                  generation)
+
+    def _backend_save(self, filename, data, generation):
+        with self._replace_lock:
+            if generation < self._written.get(filename, 0):
+                return True
+            self._written[filename] = generation
+            return self.backend.save(filename, data)
+
+    def _write_atomic(self, filename, payload, generation):
+        digest = hashlib.blake2b(payload, digest_size=16).digest()
+        with self._replace_lock:
+            if generation < self._written.get(filename, 0):
+                return True
+            if self._unchanged(filename, digest):
+                # Same bytes as the file on disk, nothing to write
+                self._written[filename] = generation
+                return True
+        fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(filename) + "-",
+                                        suffix=".tmp",
+                                        dir=os.path.dirname(filename) or ".")
+        try:
+            with os.fdopen(fd, mode="wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+                written = os.fstat(f.fileno()).st_size
+            if written != len(payload):
+                self.logger.error("Attempted to write file {} but only {} of {} "
+                                  "bytes reached the tmp file. The original file "
+                                  "is unaltered.".format(filename, written, len(payload)))
+                return False
+            try:
+                # mkstemp creates the file readable by its owner only
+                os.chmod(tmp_file, stat.S_IMODE(os.stat(filename).st_mode))
+            except FileNotFoundError:
+                os.chmod(tmp_file, 0o644)
+            with self._replace_lock:
+                if generation < self._written.get(filename, 0):
+                    # A newer save of this file already landed
+                    return True
+                os.replace(tmp_file, filename)
+                self._written[filename] = generation
+                self._cache[filename] = [_stamp(filename), payload, None, digest]
+            return True
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def _unchanged(self, filename, digest):
+        entry = self._cache.get(filename)
+        if entry is None or entry[3] != digest:
+            return False
+        try:
+            return _stamp(filename) == entry[0]
+        except FileNotFoundError:
             return False
 
+    def _cached(self, filename):
+        """Returns the cache entry for filename and, if the file had to be
+        read again, the freshly parsed data"""
+        stamp = _stamp(filename)
+        entry = self._cache.get(filename)
+        if entry is not None and entry[0] == stamp:
+            return entry, None
+        with open(filename, mode="rb") as f:
+            raw = f.read()
+        data = _decode(raw)
+        entry = [stamp, raw, None, hashlib.blake2b(raw, digest_size=16).digest()]
+        self._cache[filename] = entry
+        return entry, data
+
+    def _defer_save(self, filename, data):
+        self._dirty[filename] = data
+        if filename in self._flush_handles:
+            return True
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or loop.is_closed():
+            # Nothing will ever run the timer, write it out right away
+            return self.flush(filename)
+        self._flush_handles[filename] = loop.call_later(self.flush_interval,
+                                                        self._flush_later, filename)
+        return True
+
+    def _save_after_lock(self, filename, data):
+        """Queues data to be written as soon as the file's lock is free"""
+        self._dirty[filename] = data
+        self._cancel_flush(filename)
+        self._flush_handles[filename] = asyncio.get_event_loop().call_soon(
+            self._flush_later, filename)
+        return True
+
+    def _flush_later(self, filename):
+        self._flush_handles.pop(filename, None)
+        asyncio.ensure_future(self._flush_async(filename))
+
+    async def _flush_async(self, filename):
+        # The data is only taken once the lock is held, so an update()
+        # running until then writes it out itself
+        async with self.lock(filename):
+            if filename not in self._dirty:
+                return
+            data = self._dirty.pop(filename)
+            try:
+                await self._in_pool(*self._save_job(filename, data))
+            except Exception:
+                self.logger.exception("Deferred save of {} failed".format(filename))
+
+    async def _in_pool(self, func, *args):
+        """Runs func in the thread pool. Meant to be called with the file's
+        lock held, which stays held until func is done even if the caller
+        gets cancelled in the meantime."""
+        job = asyncio.get_event_loop().run_in_executor(self._get_executor(), func, *args)
+        try:
+            return await asyncio.shield(job)
+        finally:
+            if not job.done():
+                await asyncio.wait([job])
+
+    def _next_generation(self, filename):
+        generation = self._generations.get(filename, 0) + 1
+        self._generations[filename] = generation
+        return generation
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="dataio")
+        return self._executor
+
+    def _cancel_flush(self, filename):
+        handle = self._flush_handles.pop(filename, None)
+        if handle is not None:
+            handle.cancel()
+
     def _read_json(self, filename):
         with open(filename, encoding='utf-8', mode="r") as f:
             data = json.load(f)
         return data
 
-    def _save_json(self, filename, data):
-        with open(filename, encoding='utf-8', mode="w") as f:
-            json.dump(data, f, indent=4,sort_keys=True,
-                separators=(',',' : '))
-        return data
+    def _codec(self, filename):
+        # A folder can be given instead of a file, e.g. for a GuildStore
+        codec = self.file_codecs.get(filename) \
+            or self.file_codecs.get(os.path.dirname(filename), self.codec)
+        return CODECS[codec]
 
     def _legacy_fileio(self, filename, IO, data=None):
         """Old fileIO provided for backwards compatibility"""
@@ -64,10 +432,361 @@ class DataIO():
             raise InvalidFileIO("FileIO was called with invalid"
                 " parameters")
 
+class Journal():
+    """A json file that is changed through small records appended to a
+    .log beside it instead of being rewritten on every change.
+
+    The log is replayed on load and folded into a new snapshot in the
+    background once it grows past max_log_size bytes. The log is opened
+    for each record rather than held open, so a GuildStore with a Journal
+    per active guild doesn't keep a file descriptor per guild. Paths are lists of
+    keys; a dict in a path selects the first list item containing those
+    fields. All operations are idempotent (which is why delete doesn't
+    take list indexes), so a log that outlived a crash during compaction
+    can safely be replayed on top of the new snapshot.
+
+        journal.set([guild_id, "channel"], channel_id)
+        journal.add([guild_id, message_id, "users"], user_id)
+        journal.set([guild_id, "messages", {"original_message": 42}, "count"], 3)
+    """
+
+    def __init__(self, filename, default=None, max_log_size=65536):
+        self.filename = filename
+        self.log_file = filename + ".log"
+        self.old_log_file = filename + ".log.old"
+        self.max_log_size = max_log_size
+        self._compacting = False
+        self._torn = False
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        # Through dataIO, with a backend the snapshot isn't on disk
+        exists = dataIO.is_valid_json(filename)
+        if exists:
+            self.data = dataIO.load_json(filename)
+        else:
+            self.data = {} if default is None else default
+        replayed = self._replay(self.old_log_file) + self._replay(self.log_file)
+        self._log_size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        # A torn record must not stay in the log: the records appended
+        # after it would be glued to it and lost on the next replay
+        if replayed or self._torn or not exists:
+            self.compact()
+
+    def set(self, path, value):
+        """Sets the value at path, creating missing dicts on the way"""
+        self._record({"op": "set", "path": path, "value": value})
+
+    def delete(self, path):
+        """Removes the value at path if it exists. A list item is selected
+        with a dict of its fields: an index would remove another item each
+        time the record is replayed."""
+        if path and isinstance(path[-1], int):
+            raise ValueError("Can't delete list item {} by index, select it by its fields".format(path[-1]))
+        self._record({"op": "delete", "path": path})
+
+    def add(self, path, value):
+        """Appends value to the list at path unless it's already in it"""
+        self._record({"op": "add", "path": path, "value": value})
+
+    def discard(self, path, value):
+        """Removes value from the list at path if it's in it"""
+        self._record({"op": "discard", "path": path, "value": value})
+
+    def compact(self):
+        """Folds the log into a new snapshot right away"""
+        self._rotate()
+        if dataIO.save_json(self.filename, self.data):
+            self._drop_old_log()
+
+    def _record(self, record):
+        _apply(self.data, record)
+        with open(self.log_file, encoding='utf-8', mode="a") as f:
+            f.write(json.dumps(record) + "\n")
+            self._log_size = f.tell()
+        if self._log_size >= self.max_log_size and not self._compacting:
+            loop = asyncio.get_event_loop()
+            if loop.is_running():
+                self._compacting = True
+                asyncio.ensure_future(self._compact_async())
+            else:
+                self.compact()
+
+    async def _compact_async(self):
+        try:
+            # Every record made from now on lands in the fresh log. The
+            # snapshot may contain some of them too, replaying those is safe.
+            self._rotate()
+            if await dataIO.asave_json(self.filename, self.data):
+                self._drop_old_log()
+        except Exception:
+            dataIO.logger.exception("Compaction of {} failed".format(self.filename))
+        finally:
+            self._compacting = False
+
+    def _rotate(self):
+        """Moves the current log out of the way so it can be dropped once
+        the snapshot is written"""
+        if not os.path.exists(self.log_file):
+            # Nothing was recorded since the last snapshot
+            pass
+        elif os.path.exists(self.old_log_file):
+            # A previous compaction didn't finish, keep its records first
+            with open(self.log_file, encoding='utf-8', mode="r") as src, \
+                    open(self.old_log_file, encoding='utf-8', mode="a") as dst:
+                dst.write(src.read())
+            os.remove(self.log_file)
+        else:
+            os.replace(self.log_file, self.old_log_file)
+        self._log_size = 0
+
+    def _drop_old_log(self):
+        if os.path.exists(self.old_log_file):
+            os.remove(self.old_log_file)
+
+    def _replay(self, log_file):
+        count = 0
+        try:
+            f = open(log_file, encoding='utf-8', mode="r")
+        except FileNotFoundError:
+            return count
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    # Torn write from a crash. It has no newline, so a record
+                    # appended after it may have ended up on the same line.
+                    self._torn = True
+                    record = _salvage(line)
+                    if record is None:
+                        dataIO.logger.warning("Ignoring a torn record in {}".format(log_file))
+                        continue
+                _apply(self.data, record)
+                count += 1
+        return count
+
+class GuildStore():
+    """Per guild json documents kept as folder/<guild_id>.json
+
+    A guild's document is only read the first time it is asked for, so
+    memory and write cost follow the guilds that are actually active.
+    With journal=True every guild gets its own Journal, reachable through
+    journal(guild_id). A legacy_file holding one document keyed by guild
+    id is split into the folder once and kept as legacy_file.sharded.
+    Under launcher.py the store only knows the guilds of this process'
+    shards (see Cluster), so two workers never write the same file.
+
+        settings = GuildStore("data/modlog/guilds", "data/modlog/settings.json")
+        if guild_id in settings:
+            settings[guild_id]["channel"] = channel.id
+            settings.save(guild_id, defer=True)
+    """
+
+    def __init__(self, folder, legacy_file=None, journal=False):
+        self.folder = folder
+        self.journal_mode = journal
+        # guild id -> document, or Journal in journal mode
+        self._loaded = {}
+        os.makedirs(folder, exist_ok=True)
+        present = {os.path.splitext(f)[0] for f in dataIO.list_json(folder)}
+        self._known = {guild_id for guild_id in present if cluster.current.owns(guild_id)}
+        if legacy_file is not None and dataIO.is_valid_json(legacy_file):
+            self._split(legacy_file, present)
+
+    def path(self, guild_id):
+        return os.path.join(self.folder, "{}.json".format(guild_id))
+
+    def __contains__(self, guild_id):
+        return str(guild_id) in self._known
+
+    def __iter__(self):
+        return iter(list(self._known))
+
+    def __len__(self):
+        return len(self._known)
+
+    def __getitem__(self, guild_id):
+        guild_id = str(guild_id)
+        if guild_id not in self._known:
+            raise KeyError(guild_id)
+        return self._open(guild_id)
+
+    def get(self, guild_id, default=None):
+        guild_id = str(guild_id)
+        if guild_id not in self._known:
+            return default
+        return self._open(guild_id)
+
+    def journal(self, guild_id):
+        """Returns the Journal of a guild, starting an empty document for
+        guilds that don't have one yet"""
+        guild_id = str(guild_id)
+        if guild_id not in self._loaded:
+            self._loaded[guild_id] = Journal(self.path(guild_id))
+            self._known.add(guild_id)
+        return self._loaded[guild_id]
+
+    def save(self, guild_id, data=None, defer=False):
+        """Saves the loaded document of a guild, or replaces it with data"""
+        guild_id = str(guild_id)
+        if self.journal_mode:
+            if data is not None:
+                self._drop(guild_id)
+                dataIO.save_json(self.path(guild_id), data)
+                self._known.add(guild_id)
+            elif guild_id in self._loaded:
+                self._loaded[guild_id].compact()
+            return True
+        if data is not None:
+            self._loaded[guild_id] = data
+            self._known.add(guild_id)
+        return dataIO.save_json(self.path(guild_id), self._loaded[guild_id], defer=defer)
+
+    def delete(self, guild_id):
+        """Forgets a guild and removes its files"""
+        guild_id = str(guild_id)
+        self._drop(guild_id)
+        self._known.discard(guild_id)
+        dataIO.remove_json(self.path(guild_id))
+
+    def flush(self):
+        """Writes out deferred saves, journals are written record by record"""
+        if self.journal_mode:
+            return
+        for guild_id in list(self._loaded):
+            dataIO.flush(self.path(guild_id))
+
+    def _open(self, guild_id):
+        if guild_id not in self._loaded:
+            if self.journal_mode:
+                return self.journal(guild_id).data
+            self._loaded[guild_id] = dataIO.load_json(self.path(guild_id))
+        loaded = self._loaded[guild_id]
+        return loaded.data if self.journal_mode else loaded
+
+    def _drop(self, guild_id):
+        loaded = self._loaded.pop(guild_id, None)
+        if self.journal_mode and loaded is not None:
+            for log_file in (loaded.log_file, loaded.old_log_file):
+                if os.path.exists(log_file):
+                    os.remove(log_file)
+
+    def _split(self, legacy_file, present):
+        if os.path.exists(legacy_file + ".log") or os.path.exists(legacy_file + ".log.old"):
+            if not cluster.current.primary:
+                # Only the primary may replay and remove the journal
+                return
+            # Replay what a Journal over the legacy file still had pending
+            legacy = Journal(legacy_file)
+            data = legacy.data
+            for log_file in (legacy.log_file, legacy.old_log_file):
+                if os.path.exists(log_file):
+                    os.remove(log_file)
+        else:
+            data = dataIO.load_json(legacy_file)
+        # Every worker splits out its own guilds, the primary all of them
+        # and then retires the legacy file. Files already split (by
+        # another worker, or before a crash) are newer and left alone.
+        for guild_id, guild_data in data.items():
+            guild_id = str(guild_id)
+            if not cluster.current.owns(guild_id) and not cluster.current.primary:
+                continue
+            if guild_id not in present:
+                dataIO.save_json(self.path(guild_id), guild_data)
+            if cluster.current.owns(guild_id):
+                self._known.add(guild_id)
+        if not cluster.current.primary:
+            return
+        if dataIO.backend is None:
+            os.replace(legacy_file, legacy_file + ".sharded")
+        else:
+            dataIO.remove_json(legacy_file)
+        dataIO.logger.info("Split {} into {} guild files in {}".format(
+            legacy_file, len(data), self.folder))
+
+def _salvage(line):
+    """The whole record at the end of a line that starts with a torn one"""
+    start = line.rfind('{"op": ', 1)
+    if start == -1:
+        return None
+    try:
+        return json.loads(line[start:])
+    except json.decoder.JSONDecodeError:
+        return None
+
+def _apply(data, record):
+    op, path = record["op"], record["path"]
+    create = op in ("set", "add")
+    parent = data
+    for key in path[:-1]:
+        parent = _child(parent, key, create)
+        if parent is None:
+            return
+    if op in ("add", "discard"):
+        if not path:
+            target = parent
+        elif op == "add" and isinstance(parent, dict):
+            target = parent.setdefault(path[-1], [])
+        else:
+            target = _child(parent, path[-1], False)
+        if target is None:
+            return
+        if op == "add" and record["value"] not in target:
+            target.append(record["value"])
+        elif op == "discard" and record["value"] in target:
+            target.remove(record["value"])
+        return
+    key = path[-1]
+    if isinstance(key, dict):
+        matches = [i for i, item in enumerate(parent) if _matches(item, key)]
+        if op == "set":
+            if matches:
+                parent[matches[0]] = record["value"]
+            else:
+                parent.append(record["value"])
+        else:
+            for i in reversed(matches):
+                del parent[i]
+    elif op == "set":
+        parent[key] = record["value"]
+    elif isinstance(parent, list):
+        if -len(parent) <= key < len(parent):
+            del parent[key]
+    else:
+        parent.pop(key, None)
+
+def _child(container, key, create):
+    if isinstance(key, dict):
+        for item in container:
+            if _matches(item, key):
+                return item
+        if not create:
+            return None
+        container.append(dict(key))
+        return container[-1]
+    if isinstance(container, list):
+        return container[key] if -len(container) <= key < len(container) else None
+    if key not in container:
+        if not create:
+            return None
+        container[key] = {}
+    return container[key]
+
+def _matches(item, selector):
+    return isinstance(item, dict) and all(item.get(k) == v for k, v in selector.items())
+
+def _stamp(filename):
+    st = os.stat(filename)
+    return (st.st_mtime_ns, st.st_size)
+
+def _freeze(data):
+    if isinstance(data, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in data.items()})
+    if isinstance(data, list):
+        return tuple(_freeze(v) for v in data)
+    return data
+
 def get_value(filename, key):
-    with open(filename, encoding='utf-8', mode="r") as f:
-        data = json.load(f)
-    return data[key]
+    return dataIO.load_json(filename)[key]
 
 def set_value(filename, key, value):
     data = fileIO(filename, "load")
@@ -0,0 +1,24 @@
+from .webclient import get_client
+
+API_KEY = "KZciiXBwyJ9RabyZyUHjQ8e4ZutZQ1Go"
+SEARCH_URL = "https://api.giphy.com/v1/gifs/search"
+
+
+class GiphyError(Exception):
+    pass
+
+
+async def search(bot, term, limit=25, size="fixed_height_downsampled"):
+    """Urls of the gifs Giphy finds for term, in the given rendition
+
+    Same request giphypop's search makes, through the bot's WebClient
+    instead of a blocking requests call.
+
+        urls = await giphy.search(self.bot, 'kiss')
+    """
+    params = {"api_key": API_KEY, "q": term, "limit": limit, "offset": 0}
+    status, data = await get_client(bot).get_json(SEARCH_URL, params=params)
+    data = data or {}
+    if status != 200 or data.get("meta", {}).get("status") != 200:
+        raise GiphyError(data.get("meta", {}).get("msg", status))
+    return [gif["images"][size]["url"] for gif in data["data"] if size in gif.get("images", {})]
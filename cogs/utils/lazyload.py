@@ -0,0 +1,193 @@
+import ast
+import asyncio
+import json
+import os
+
+import discord
+from discord.ext import commands
+from loguru import logger
+
+MANIFEST_VERSION = 2
+
+
+def build_manifest(folder, names, manifest_file):
+    """Describes the top level commands and listened events of every cog
+    module in folder, without importing them. Entries of files that didn't
+    change since the last run are reused. Cogs running background tasks,
+    routing messages or watching reactions are marked eager since nothing
+    would load them otherwise."""
+    try:
+        with open(manifest_file, encoding='utf-8') as f:
+            old = json.load(f)
+        if old.get("version") != MANIFEST_VERSION:
+            old = {}
+    except (FileNotFoundError, ValueError):
+        old = {}
+    extensions = {}
+    for name in names:
+        path = os.path.join(folder, name + ".py")
+        st = os.stat(path)
+        stamp = [st.st_mtime_ns, st.st_size]
+        entry = old.get("extensions", {}).get(name)
+        if entry is None or entry["stamp"] != stamp:
+            with open(path, encoding='utf-8') as f:
+                entry = _describe(ast.parse(f.read(), path))
+            entry["stamp"] = stamp
+        extensions[name] = entry
+    manifest = {"version": MANIFEST_VERSION, "extensions": extensions}
+    if manifest != old:
+        tmp_file = manifest_file + ".tmp"
+        with open(tmp_file, encoding='utf-8', mode="w") as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
+        os.replace(tmp_file, manifest_file)
+    return manifest
+
+
+class LazyExtensions():
+    """Registers stub commands and listeners for the cogs in a manifest and
+    only imports a cog when one of its commands is invoked or one of its
+    events fires. The triggering command or event is then handed to the
+    real cog."""
+
+    def __init__(self, bot, package="cogs", profiler=None):
+        self.bot = bot
+        self.package = package
+        self.profiler = profiler
+        # extension -> stub commands registered for it
+        self._stubs = {}
+        # event -> (stub listener, extensions still waiting for it)
+        self._events = {}
+
+    def install(self, manifest):
+        for name, entry in manifest["extensions"].items():
+            if entry["eager"]:
+                try:
+                    self.load(name)
+                except Exception as error:
+                    logger.exception(f"Extension {name} could not be loaded. [{error}]")
+                continue
+            stubs = []
+            for command_name, aliases in entry["commands"]:
+                try:
+                    command = commands.Command(self._command_stub(name), name=command_name,
+                                               aliases=aliases, hidden=True)
+                    self.bot.add_command(command)
+                    stubs.append(command)
+                except discord.ClientException as error:
+                    logger.warning(f"No stub for {command_name} of {name}: {error}")
+            self._stubs[name] = stubs
+            for event in entry["events"]:
+                if event not in self._events:
+                    listener = self._event_stub(event)
+                    self._events[event] = (listener, [])
+                    self.bot.add_listener(listener, event)
+                self._events[event][1].append(name)
+
+    def is_pending(self, name):
+        return name in self._stubs
+
+    def load(self, name):
+        """Imports a cog for real, replacing its stubs"""
+        for command in self._stubs.pop(name, []):
+            self.bot.remove_command(command.name)
+        for event, (listener, waiting) in list(self._events.items()):
+            if name in waiting:
+                waiting.remove(name)
+            if not waiting:
+                self.bot.remove_listener(listener, event)
+                del self._events[event]
+        if self.profiler is not None:
+            self.profiler.load_extension(self.bot, self.package + '.' + name)
+        else:
+            self.bot.load_extension(self.package + '.' + name)
+        logger.debug(f'Loaded {name} cog.')
+
+    def _command_stub(self, name):
+        async def stub(ctx, *args):
+            self.load(name)
+            ctx = await self.bot.get_context(ctx.message)
+            if ctx.command is not None:
+                await self.bot.invoke(ctx)
+        return stub
+
+    def _event_stub(self, event):
+        async def stub(*args, **kwargs):
+            _, waiting = self._events.get(event, (None, []))
+            for name in list(waiting):
+                try:
+                    self.load(name)
+                except Exception as error:
+                    logger.exception(f"Extension {name} could not be loaded. [{error}]")
+                    continue
+                # The event was dispatched before the cog existed
+                module = self.package + '.' + name
+                for cog in list(self.bot.cogs.values()):
+                    if type(cog).__module__ != module:
+                        continue
+                    for listener_name, listener in cog.get_listeners():
+                        if listener_name == event:
+                            asyncio.ensure_future(listener(*args, **kwargs))
+        return stub
+
+
+def _describe(tree):
+    entry = {"commands": [], "events": [], "eager": False}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and _dotted(node.func).endswith(("get_router", "get_reactions")):
+            entry["eager"] = True
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decorator in node.decorator_list:
+            call = decorator if isinstance(decorator, ast.Call) else None
+            target = _dotted(call.func if call else decorator)
+            if target in ("commands.command", "commands.group"):
+                name = _string_arg(call, 0, "name") or node.name
+                aliases = _list_arg(call, "aliases")
+                entry["commands"].append([name, aliases])
+            elif target == "commands.Cog.listener":
+                entry["events"].append(_string_arg(call, 0, "name") or node.name)
+            elif target == "tasks.loop":
+                entry["eager"] = True
+    entry["events"] = sorted(set(entry["events"]))
+    return entry
+
+
+def _dotted(node):
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return None
+
+
+def _string_arg(call, position, keyword):
+    if call is None:
+        return None
+    for kw in call.keywords:
+        if kw.arg == keyword:
+            value = _literal(kw.value)
+            return value if isinstance(value, str) else None
+    if len(call.args) > position:
+        value = _literal(call.args[position])
+        return value if isinstance(value, str) else None
+    return None
+
+
+def _list_arg(call, keyword):
+    if call is None:
+        return []
+    for kw in call.keywords:
+        if kw.arg == keyword:
+            value = _literal(kw.value)
+            if isinstance(value, (list, tuple)):
+                return [v for v in value if isinstance(v, str)]
+    return []
@@ -0,0 +1,146 @@
+import asyncio
+import bisect
+import logging
+import re
+import sys
+import time
+import weakref
+from collections import deque
+
+from loguru import logger
+
+# Upper bounds (ms) of the lag histogram buckets, the last one is open
+BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+_TASK_NAME = re.compile(r"name='([^']+)'")
+_CORO = re.compile(r"coro=<([\w.]+)\(\)")
+# "<TimerHandle when=1234.5 Bot._ping() at bot.py:12>" -> "Bot._ping"
+_CALLBACK = re.compile(r"<(?:Timer)?Handle (?:cancelled )?(?:when=\S+ )?([^\s(]+)")
+# What changes between reprs of the same callback
+_NOISE = re.compile(r"when=\S+ ?|(?: object)? at 0x[0-9a-fA-F]+| at \S+:\d+")
+
+
+class LoopMonitor():
+    """Watches how late the event loop runs and who makes it late
+
+    A sampler task sleeps for interval and records how much later than
+    asked it woke up, that is the scheduling lag every coroutine saw.
+    The last window samples are kept for the histogram and percentiles.
+
+    With slow_callback set, asyncio's debug mode reports every callback
+    that ran longer than it. Tasks get a label through label() (the bot
+    labels command and listener tasks), so a slow step of a task is
+    blamed on the cog and command or listener it was running for. Debug
+    mode records a traceback for every handle, future and task and checks
+    the thread of every call, which costs far more CPU and memory than the
+    sampler, so it is off unless asked for while hunting a slow cog.
+
+        monitor = LoopMonitor(slow_callback=0.1)
+        monitor.install(bot.loop)
+        monitor.label(task, "starboard:Starboard.on_reaction_add")
+    """
+
+    def __init__(self, interval=0.5, window=7200, slow_callback=None, keep_events=50):
+        self.interval = interval
+        self.slow_callback = slow_callback
+        self.samples = deque(maxlen=window)
+        # label -> [count, total seconds, worst seconds]
+        self.offenders = {}
+        self.events = deque(maxlen=keep_events)
+        # task name -> label, task names are what asyncio reports
+        self._labels = {}
+        self._tasks = weakref.WeakKeyDictionary()
+        self._sampler = None
+
+    def install(self, loop):
+        if self.slow_callback:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.slow_callback
+            # Debug mode also records where every coroutine was created,
+            # which is costly and not needed to time callbacks. run_forever
+            # turns that on when it starts, so it's turned off from inside.
+            if hasattr(sys, "set_coroutine_origin_tracking_depth"):
+                loop.call_soon(sys.set_coroutine_origin_tracking_depth, 0)
+            logging.getLogger("asyncio").addHandler(_SlowCallbackHandler(self))
+        self._sampler = loop.create_task(self._sample())
+
+    def stop(self):
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+
+    def label(self, task, text):
+        """Blames slow steps of task on text from now on"""
+        if not hasattr(task, "get_name"):
+            return
+        name = task.get_name()
+        if task not in self._tasks:
+            task.add_done_callback(lambda t: self._labels.pop(name, None))
+        self._tasks[task] = name
+        self._labels[name] = text
+
+    def label_current(self, text):
+        task = asyncio.current_task() if hasattr(asyncio, "current_task") else asyncio.Task.current_task()
+        if task is not None:
+            self.label(task, text)
+
+    def slow(self, handle, duration):
+        """Records a callback that held the loop for duration seconds"""
+        name = _TASK_NAME.search(handle)
+        label = self._labels.get(name.group(1)) if name else None
+        if label is None:
+            # Not ours, the coroutine the task runs or the callback is the
+            # best guess
+            label = _callback_label(handle)
+        stats = self.offenders.setdefault(label, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] = max(stats[2], duration)
+        self.events.append((time.time(), label, duration))
+        logger.warning(f"{label} blocked the event loop for {duration * 1000:.0f} ms")
+
+    def histogram(self):
+        """(upper bound in ms or None, count) of the lag samples in the window"""
+        counts = [0] * (len(BUCKETS) + 1)
+        for lag in self.samples:
+            counts[bisect.bisect_left(BUCKETS, lag * 1000)] += 1
+        return list(zip(BUCKETS + (None,), counts))
+
+    def percentiles(self, *points):
+        """Lag in ms at each percentile of the window"""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return [0.0 for _ in points]
+        return [ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000 for p in points]
+
+    def worst(self, count=10):
+        """(label, [count, total, worst]) of the slowest callbacks, by total time"""
+        return sorted(self.offenders.items(), key=lambda item: item[1][1], reverse=True)[:count]
+
+    async def _sample(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+
+def _callback_label(handle):
+    """The same label for every repr of the same callback, so offenders
+    doesn't get a key per timer or object address"""
+    match = _CORO.search(handle) or _CALLBACK.match(handle)
+    if match:
+        return match.group(1)
+    return _NOISE.sub("", handle)[:80]
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Feeds asyncio's "Executing <handle> took X seconds" warnings to the monitor"""
+
+    def __init__(self, monitor):
+        super().__init__(logging.WARNING)
+        self.monitor = monitor
+
+    def emit(self, record):
+        if record.msg.startswith("Executing ") and len(record.args or ()) == 2:
+            handle, duration = record.args
+            self.monitor.slow(str(handle), duration)
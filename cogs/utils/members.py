@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+
+
+class MemberResolver():
+    """Finds guild members without relying on a full member cache
+
+    In low memory mode the gateway doesn't send offline members, so
+    guild.get_member misses most of them. The resolver tries the gateway
+    cache, then its own LRU cache of members it fetched, then asks the
+    API with fetch_member. Members that don't exist (left the guild) are
+    remembered for miss_ttl seconds (at most size of them) so loops over
+    stored user ids don't fetch them again on every run, and concurrent lookups of the same
+    member share one request. Entries follow member updates and leave
+    with the member.
+
+        resolver = get_resolver(self.bot)
+        member = await resolver.get(guild, user_id)
+    """
+
+    def __init__(self, bot, size=2048, miss_ttl=600):
+        self.bot = bot
+        self.size = size
+        self.miss_ttl = miss_ttl
+        # (guild id, user id) -> Member, least recently used first
+        self._cache = OrderedDict()
+        # (guild id, user id) -> time the miss expires, soonest first
+        self._misses = OrderedDict()
+        # (guild id, user id) -> future of the fetch in flight
+        self._fetching = {}
+        bot.add_listener(self.on_member_update)
+        bot.add_listener(self.on_member_remove)
+
+    async def get(self, guild, user_id):
+        """The member of guild with user_id, None if there is none"""
+        user_id = int(user_id)
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        key = (guild.id, user_id)
+        member = self._cache.get(key)
+        if member is not None:
+            self._cache.move_to_end(key)
+            return member
+        if self._misses.get(key, 0) > time.monotonic():
+            return None
+        future = self._fetching.get(key)
+        if future is None:
+            future = self._fetching[key] = asyncio.ensure_future(self._fetch(guild, user_id))
+            future.add_done_callback(lambda f: self._fetching.pop(key, None))
+        return await asyncio.shield(future)
+
+    def get_named(self, guild, name):
+        """Member of guild called name (or name#discrim) among the cached ones.
+        The gateway API of this discord.py can't search members by name
+        without loading them all."""
+        member = guild.get_member_named(name)
+        if member is not None:
+            return member
+        for (guild_id, _), cached in reversed(self._cache.items()):
+            if guild_id == guild.id and name in (str(cached), cached.name, cached.nick):
+                return cached
+        return None
+
+    def forget(self, guild_id=None):
+        """Drops what is cached, of one guild or of all of them"""
+        for index in (self._cache, self._misses):
+            for key in [key for key in index if guild_id is None or key[0] == guild_id]:
+                del index[key]
+
+    async def on_member_update(self, before, after):
+        key = (after.guild.id, after.id)
+        if key in self._cache:
+            self._cache[key] = after
+
+    async def on_member_remove(self, member):
+        self._cache.pop((member.guild.id, member.id), None)
+
+    async def _fetch(self, guild, user_id):
+        key = (guild.id, user_id)
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            self._add_miss(key)
+            return None
+        except discord.HTTPException:
+            return None
+        self._misses.pop(key, None)
+        self._cache[key] = member
+        if len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+        return member
+
+    def _add_miss(self, key):
+        now = time.monotonic()
+        self._misses.pop(key, None)
+        self._misses[key] = now + self.miss_ttl
+        # Every miss lives miss_ttl seconds, so the oldest expire first
+        while self._misses:
+            oldest, expires = next(iter(self._misses.items()))
+            if expires > now and len(self._misses) <= self.size:
+                break
+            del self._misses[oldest]
+
+
+def get_resolver(bot):
+    """The MemberResolver of bot, one is attached if it has none"""
+    resolver = getattr(bot, "members", None)
+    if resolver is None:
+        resolver = bot.members = MemberResolver(bot)
+    return resolver
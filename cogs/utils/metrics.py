@@ -0,0 +1,124 @@
+import bisect
+import functools
+import time
+
+from aiohttp import web
+from loguru import logger
+
+# Upper bounds (seconds) of the latency buckets, +Inf is implied
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram():
+    __slots__ = ("counts", "sum", "count", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds, error=False):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if error:
+            self.errors += 1
+
+
+class Metrics():
+    """Counts, errors and latency histograms of commands and listeners
+
+    Commands are timed from the bot's before_invoke to its after_invoke
+    hook, listeners by wrapping the coroutine of every event the bot
+    schedules. Series are keyed by cog and name, not by the function,
+    so they carry on across a reload. serve() exposes them in the
+    Prometheus text format on a local port.
+
+        metrics.observe_command("Starboard", "starboard setup", 0.012)
+        coro = metrics.wrap_listener(coro, "starboard", "Starboard.on_reaction_add")
+        await metrics.serve("127.0.0.1", 9184)
+    """
+
+    def __init__(self, prefix="peribot"):
+        self.prefix = prefix
+        # (cog, command) -> Histogram
+        self.commands = {}
+        # (module, listener) -> Histogram
+        self.listeners = {}
+        self._runner = None
+
+    def observe_command(self, cog, command, seconds, error=False):
+        key = (cog, command)
+        histogram = self.commands.get(key)
+        if histogram is None:
+            histogram = self.commands[key] = Histogram()
+        histogram.observe(seconds, error)
+
+    def observe_listener(self, module, listener, seconds, error=False):
+        key = (module, listener)
+        histogram = self.listeners.get(key)
+        if histogram is None:
+            histogram = self.listeners[key] = Histogram()
+        histogram.observe(seconds, error)
+
+    def wrap_listener(self, coro, module, listener):
+        """coro, timed. Exceptions are counted and raised again for on_error."""
+        @functools.wraps(coro)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            error = False
+            try:
+                return await coro(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                self.observe_listener(module, listener, time.perf_counter() - start, error)
+        return timed
+
+    def render(self):
+        lines = []
+        self._render_family(lines, "command", ("cog", "command"), self.commands)
+        self._render_family(lines, "listener", ("module", "listener"), self.listeners)
+        return "\n".join(lines) + "\n"
+
+    def _render_family(self, lines, kind, label_names, series):
+        name = f"{self.prefix}_{kind}"
+        lines.append(f"# HELP {name}_duration_seconds Time spent running each {kind}.")
+        lines.append(f"# TYPE {name}_duration_seconds histogram")
+        for key, histogram in sorted(series.items()):
+            labels = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(label_names, key))
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_duration_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"{name}_duration_seconds_count{{{labels}}} {histogram.count}")
+        lines.append(f"# HELP {name}_errors_total Runs of each {kind} that raised.")
+        lines.append(f"# TYPE {name}_errors_total counter")
+        for key, histogram in sorted(series.items()):
+            labels = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(label_names, key))
+            lines.append(f"{name}_errors_total{{{labels}}} {histogram.errors}")
+
+    async def serve(self, host, port):
+        """Serves render() at http://host:port/metrics"""
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request):
+        return web.Response(body=self.render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,134 @@
+import asyncio
+from collections.abc import Mapping
+from copy import deepcopy
+
+from . import cluster
+from .dataIO import dataIO
+
+# Dict documents carry their version under this key
+SCHEMA_KEY = "_schema"
+# Versions of documents that aren't dicts (e.g. a list of streams), one
+# file per cluster like the documents themselves
+VERSIONS_FILE = cluster.current.path("data/schema.json")
+
+# schema -> {version: migration}
+_migrations = {}
+
+
+def register(schema, version, fn):
+    """Registers fn as the step that brings documents of schema (usually
+    their filename) from version - 1 to version. fn gets the data and
+    returns the migrated data. It may be a coroutine function, those
+    steps only run from aload."""
+    if version < 1:
+        raise ValueError("Schema versions start at 1")
+    _migrations.setdefault(schema, {})[version] = fn
+
+
+def migration(schema, version):
+    """Decorator version of register
+
+        @migration("data/streams/twitch.json", 1)
+        def add_ids(streams):
+            ...
+            return streams
+    """
+    def decorator(fn):
+        register(schema, version, fn)
+        return fn
+    return decorator
+
+
+def latest(schema):
+    return max(_migrations.get(schema, {0: None}))
+
+
+def load(filename, default=None, schema=None):
+    """dataIO.load_json that runs the pending migrations of the file first
+
+    A missing file is created from default (if given) at the latest
+    version. Migrated data is saved once all steps succeeded; if one
+    fails the file is left as it was and the steps run again next load."""
+    schema = filename if schema is None else schema
+    data = _load_or_create(filename, default, schema)
+    if data is None:
+        data = dataIO.load_json(filename)
+    pending = _pending(schema, _version(filename, data))
+    for step, fn in pending:
+        if asyncio.iscoroutinefunction(fn):
+            raise RuntimeError("Migration {} of {} is a coroutine, load the "
+                               "file with aload".format(step, filename))
+        data = _run(fn, filename, step, data)
+    if pending:
+        _save(filename, data, pending[-1][0])
+    return data
+
+
+async def aload(filename, default=None, schema=None):
+    """Awaitable load, also runs coroutine migrations"""
+    schema = filename if schema is None else schema
+    data = _load_or_create(filename, default, schema)
+    if data is None:
+        data = await dataIO.aload_json(filename)
+    pending = _pending(schema, _version(filename, data))
+    for step, fn in pending:
+        if asyncio.iscoroutinefunction(fn):
+            dataIO.logger.info("Migrating {} to schema {}".format(filename, step))
+            data = await fn(data)
+        else:
+            data = _run(fn, filename, step, data)
+    if pending:
+        _save(filename, data, pending[-1][0])
+    return data
+
+
+def is_current(filename, schema=None):
+    """Whether filename exists and is at the latest version of its schema"""
+    schema = filename if schema is None else schema
+    if not dataIO.is_valid_json(filename):
+        return False
+    return _version(filename, dataIO.load_json(filename, frozen=True)) >= latest(schema)
+
+
+def _load_or_create(filename, default, schema):
+    """Returns default stamped with the latest version if filename has to
+    be created, None if it exists"""
+    if default is None or dataIO.is_valid_json(filename):
+        return None
+    data = deepcopy(default)
+    _save(filename, data, latest(schema))
+    return data
+
+
+def _pending(schema, version):
+    steps = _migrations.get(schema, {})
+    return [(v, steps[v]) for v in sorted(steps) if v > version]
+
+
+def _run(fn, filename, step, data):
+    dataIO.logger.info("Migrating {} to schema {}".format(filename, step))
+    return fn(data)
+
+
+def _save(filename, data, version):
+    if isinstance(data, dict):
+        if version:
+            data[SCHEMA_KEY] = version
+        dataIO.save_json(filename, data)
+        return
+    # Data first, a crash in between only means running the steps again
+    dataIO.save_json(filename, data)
+    if version:
+        versions = dataIO.load_json(VERSIONS_FILE) if dataIO.is_valid_json(VERSIONS_FILE) else {}
+        versions[filename] = version
+        dataIO.save_json(VERSIONS_FILE, versions)
+
+
+def _version(filename, data):
+    # A Mapping, is_current reads the frozen view
+    if isinstance(data, Mapping):
+        return data.get(SCHEMA_KEY, 0)
+    if not dataIO.is_valid_json(VERSIONS_FILE):
+        return 0
+    return dataIO.load_json(VERSIONS_FILE, frozen=True).get(filename, 0)
+
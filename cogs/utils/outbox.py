@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import itertools
+
+from loguru import logger
+
+from . import resttrace
+
+# Lower goes first
+MODERATION = 0
+ALERT = 1
+NORMAL = 2
+FUN = 3
+
+MAX_LENGTH = 2000
+
+
+class OutboxFull(Exception):
+    pass
+
+
+class _Item():
+    __slots__ = ("priority", "seq", "channel", "content", "embed", "merge", "origin",
+                 "futures", "taken")
+
+    def __init__(self, priority, seq, channel, content, embed, merge, origin, future):
+        self.priority = priority
+        self.seq = seq
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.merge = merge
+        self.origin = origin
+        self.futures = [future]
+        self.taken = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def fail(self, error):
+        for future in self.futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+
+class Outbox():
+    """Schedules the messages the cogs send
+
+    Every channel has its own queue, drained by its own worker so one
+    busy channel never holds up the others, while at most concurrency
+    sends are in flight overall. Within a channel messages go out by
+    priority, then in the order they were queued. A text message queued
+    with merge=True is appended to the previous one of the channel if
+    that one is still waiting, has merge=True and the same priority, and
+    the result fits in one message, so a burst of log lines costs a few
+    sends instead of one each. A channel holds at most max_pending
+    messages: past that the least urgent one is dropped (its future
+    raises OutboxFull), which bounds how long anything waits.
+
+        outbox = get_outbox(self.bot)
+        message = await outbox.send(channel, "Live!", embed=embed, priority=ALERT)
+        outbox.post(log_channel, line, priority=MODERATION, merge=True)
+    """
+
+    def __init__(self, concurrency=8, max_pending=50):
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._seq = itertools.count()
+        # channel id -> heap of _Item
+        self._queues = {}
+        # channel id -> last _Item queued, candidate for merging
+        self._last = {}
+        # channel id -> worker task
+        self._workers = {}
+
+    def send(self, channel, content=None, *, embed=None, priority=NORMAL, merge=False):
+        """Queues a message, returns a future of the sent discord.Message"""
+        future = asyncio.get_event_loop().create_future()
+        content = None if content is None else str(content)
+        last = self._last.get(channel.id)
+        if (merge and embed is None and content is not None and last is not None
+                and not last.taken and last.merge and last.priority == priority
+                and len(last.content) + 1 + len(content) <= MAX_LENGTH):
+            last.content += "\n" + content
+            last.futures.append(future)
+            return future
+        item = _Item(priority, next(self._seq), channel, content, embed,
+                     merge and embed is None and content is not None, resttrace.caller(), future)
+        queue = self._queues.setdefault(channel.id, [])
+        if len(queue) >= self.max_pending:
+            worst = max(queue)
+            if not item < worst:
+                item.fail(OutboxFull(f"{len(queue)} messages waiting for #{channel}"))
+                return future
+            queue.remove(worst)
+            heapq.heapify(queue)
+            worst.taken = True
+            worst.fail(OutboxFull(f"Dropped for more urgent messages to #{channel}"))
+        heapq.heappush(queue, item)
+        self._last[channel.id] = item
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.ensure_future(self._drain(channel.id))
+        return future
+
+    def post(self, channel, content=None, **kwargs):
+        """send for when nobody waits for the message, failures are only logged"""
+        future = self.send(channel, content, **kwargs)
+        future.add_done_callback(_log_failure)
+        return future
+
+    def pending(self):
+        """channel id -> number of queued messages"""
+        return {channel_id: len(queue) for channel_id, queue in self._queues.items()}
+
+    async def close(self):
+        for worker in list(self._workers.values()):
+            worker.cancel()
+
+    async def _drain(self, channel_id):
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                item = heapq.heappop(queue)
+                item.taken = True
+                async with self._semaphore:
+                    token = resttrace.origin.set(item.origin)
+                    try:
+                        message = await item.channel.send(item.content, embed=item.embed)
+                    except asyncio.CancelledError:
+                        item.cancel()
+                        raise
+                    except Exception as error:
+                        item.fail(error)
+                    else:
+                        for future in item.futures:
+                            if not future.done():
+                                future.set_result(message)
+                    finally:
+                        resttrace.origin.reset(token)
+        finally:
+            for item in queue:
+                item.cancel()
+            del self._queues[channel_id]
+            self._last.pop(channel_id, None)
+            del self._workers[channel_id]
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.debug(f"Queued message was not sent: {future.exception()}")
+
+
+def get_outbox(bot):
+    """The Outbox of bot, a default one is attached if it has none"""
+    outbox = getattr(bot, "outbox", None)
+    if outbox is None:
+        outbox = bot.outbox = Outbox()
+    return outbox
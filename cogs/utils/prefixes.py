@@ -0,0 +1,49 @@
+class PrefixResolver():
+    """Callable command_prefix for commands.Bot
+
+    Serves every guild's prefixes from memory. They come from the
+    PREFIXES of the guild in Settings, falling back to the global
+    PREFIXES and then to default. Changes go through set_prefixes, which
+    drops the cached entry.
+
+        bot = commands.Bot(command_prefix=PrefixResolver("!", Settings(parse_args=False)))
+    """
+
+    def __init__(self, default, settings=None):
+        self.default = (default,) if isinstance(default, str) else tuple(default)
+        self.settings = settings
+        # guild id (None for DMs) -> prefixes, longest first
+        self._cache = {}
+
+    def __call__(self, bot, message):
+        return self.for_guild(message.guild)
+
+    def for_guild(self, guild):
+        key = None if guild is None else guild.id
+        prefixes = self._cache.get(key)
+        if prefixes is None:
+            prefixes = self._cache[key] = self._resolve(guild)
+        return prefixes
+
+    def match(self, message):
+        """Returns the prefix message starts with, None if it has none"""
+        for prefix in self.for_guild(message.guild):
+            if message.content.startswith(prefix):
+                return prefix
+        return None
+
+    def set_prefixes(self, guild, prefixes):
+        """Sets a guild's prefixes, an empty list goes back to the global ones"""
+        self.settings.set_guild_prefixes(guild, list(prefixes))
+        self.invalidate(guild)
+
+    def invalidate(self, guild=None):
+        """Forgets the cached prefixes of guild, of every guild if None"""
+        if guild is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(guild.id, None)
+
+    def _resolve(self, guild):
+        prefixes = self.settings.get_prefixes(guild) if self.settings is not None else []
+        return tuple(sorted(prefixes or self.default, key=len, reverse=True))
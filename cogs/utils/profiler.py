@@ -0,0 +1,101 @@
+import importlib
+import sys
+import time
+import tracemalloc
+
+# Imported first thing by main.py, close enough to the process start
+STARTED = time.perf_counter()
+STARTED_AT = time.time()
+
+
+class StartupProfiler():
+    """Records what every extension costs to load
+
+    For each extension it keeps the wall time of the whole load, the part
+    spent importing the module (and whatever it drags in with it), the
+    rest being setup(), the modules it added to sys.modules and the
+    memory it allocated according to tracemalloc. Phases of the boot
+    are marked with mark(), ready() marks on_ready and stops tracemalloc
+    since tracing every allocation slows the bot down.
+
+        profiler = StartupProfiler(trace_memory=True)
+        profiler.load_extension(bot, 'cogs.streams')
+        profiler.ready()
+        dataIO.save_json("data/startup.json", profiler.report())
+    """
+
+    def __init__(self, trace_memory=True):
+        self.extensions = {}
+        self.phases = {}
+        self.ready_memory_kb = None
+        self.is_ready = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def load_extension(self, bot, name):
+        """bot.load_extension, timed. Failures are recorded and raised."""
+        entry = {"wall_ms": None, "import_ms": None, "setup_ms": None,
+                 "memory_kb": None, "peak_kb": None, "modules": 0,
+                 "after_ready": self.is_ready, "error": None}
+        self.extensions[name.rpartition('.')[2]] = entry
+        tracing = tracemalloc.is_tracing()
+        # Before 3.9 the peak can't be reset and would be the process' one
+        has_peak = hasattr(tracemalloc, "reset_peak")
+        if tracing:
+            if has_peak:
+                tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+        imported = start
+        try:
+            # discord.py imports the module the same way, it is then
+            # found in sys.modules and load_extension only runs setup()
+            importlib.import_module(name)
+            imported = time.perf_counter()
+            bot.load_extension(name)
+        except Exception as error:
+            entry["error"] = "{}: {}".format(type(error).__name__, error)
+            raise
+        finally:
+            end = time.perf_counter()
+            if imported == start:
+                imported = end
+            entry["wall_ms"] = round((end - start) * 1000, 2)
+            entry["import_ms"] = round((imported - start) * 1000, 2)
+            entry["setup_ms"] = round((end - imported) * 1000, 2)
+            entry["modules"] = len(sys.modules) - modules_before
+            if tracing and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                entry["memory_kb"] = round((current - memory_before) / 1024, 1)
+                if has_peak:
+                    entry["peak_kb"] = round((peak - memory_before) / 1024, 1)
+
+    def mark(self, phase):
+        """Records the time since the process started under phase"""
+        self.phases[phase] = round((time.perf_counter() - STARTED) * 1000, 2)
+
+    def ready(self):
+        """Marks on_ready, only the first call counts"""
+        if self.is_ready:
+            return
+        self.mark("ready")
+        self.is_ready = True
+        if tracemalloc.is_tracing():
+            self.ready_memory_kb = round(tracemalloc.get_traced_memory()[0] / 1024, 1)
+            tracemalloc.stop()
+
+    def slowest(self, count=None):
+        """(name, entry) of the extensions, slowest first"""
+        ranked = sorted(self.extensions.items(), key=lambda item: item[1]["wall_ms"] or 0,
+                        reverse=True)
+        return ranked[:count] if count else ranked
+
+    def report(self):
+        loaded = [e for e in self.extensions.values() if e["wall_ms"] is not None]
+        return {"started_at": STARTED_AT,
+                "python": sys.version.split()[0],
+                "phases_ms": dict(self.phases),
+                "ready_memory_kb": self.ready_memory_kb,
+                "extensions_ms": round(sum(e["wall_ms"] for e in loaded), 2),
+                "extensions": dict(self.slowest())}
@@ -0,0 +1,145 @@
+from loguru import logger
+
+from .members import get_resolver
+
+
+def emoji_key(emoji):
+    """How reactions are indexed: the id of a custom emoji, the character
+    of a unicode one. Takes a (Partial)Emoji or a string."""
+    if isinstance(emoji, str):
+        # "<:name:id>", ":name:id" or a unicode emoji
+        name, _, emoji_id = emoji.strip("<>").rpartition(":")
+        return emoji_id if name and emoji_id.isdigit() else emoji
+    return str(emoji.id) if emoji.id else emoji.name
+
+
+class ReactionEvent():
+    """A raw reaction add or remove, with what the handlers may need
+    looked up only when they ask for it"""
+    __slots__ = ("bot", "payload", "added", "_message")
+
+    def __init__(self, bot, payload, added):
+        self.bot = bot
+        self.payload = payload
+        self.added = added
+        self._message = None
+
+    @property
+    def message_id(self):
+        return self.payload.message_id
+
+    @property
+    def channel_id(self):
+        return self.payload.channel_id
+
+    @property
+    def guild_id(self):
+        return self.payload.guild_id
+
+    @property
+    def user_id(self):
+        return self.payload.user_id
+
+    @property
+    def emoji(self):
+        return self.payload.emoji
+
+    @property
+    def emoji_key(self):
+        return emoji_key(self.payload.emoji)
+
+    @property
+    def guild(self):
+        return self.bot.get_guild(self.payload.guild_id) if self.payload.guild_id else None
+
+    async def fetch_member(self):
+        """The member who reacted, through the MemberResolver so it's
+        found in low memory mode too. None outside guilds."""
+        guild = self.guild
+        if guild is None:
+            return None
+        return await get_resolver(self.bot).get(guild, self.payload.user_id)
+
+    async def fetch_message(self):
+        """The reacted message, fetched once per event"""
+        if self._message is None:
+            channel = self.bot.get_channel(self.payload.channel_id)
+            self._message = await channel.fetch_message(self.payload.message_id)
+        return self._message
+
+
+class ReactionPipeline():
+    """Routes raw reaction events to the cogs watching for them
+
+    Built on on_raw_reaction_add/remove, so reactions on messages that
+    left (or never were in) the message cache still arrive. Handlers are
+    found by message id (giveaways, polls) or by emoji (the starboard,
+    which can't know its candidates in advance), both dict lookups, so
+    every other reaction is dropped right away. Handlers get a
+    ReactionEvent and fetch the message only if they need its content.
+    Reactions of the bot itself are ignored.
+
+        reactions = get_reactions(self.bot)
+        reactions.watch("Giveaways", message.id, self.on_entry)
+        reactions.watch_emoji("Star", emoji_key("⭐"), self.on_star)
+        reactions.remove("Giveaways")
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        # message id -> {owner: handler}
+        self._messages = {}
+        # emoji key -> {owner: handler}
+        self._emojis = {}
+        bot.add_listener(self.on_raw_reaction_add)
+        bot.add_listener(self.on_raw_reaction_remove)
+
+    def watch(self, owner, message_id, handler):
+        self._messages.setdefault(int(message_id), {})[owner] = handler
+
+    def unwatch(self, owner, message_id):
+        handlers = self._messages.get(int(message_id), {})
+        handlers.pop(owner, None)
+        if not handlers:
+            self._messages.pop(int(message_id), None)
+
+    def watch_emoji(self, owner, key, handler):
+        self._emojis.setdefault(key, {})[owner] = handler
+
+    def watching(self, message_id):
+        return int(message_id) in self._messages
+
+    def remove(self, owner):
+        for index in (self._messages, self._emojis):
+            for key in list(index):
+                index[key].pop(owner, None)
+                if not index[key]:
+                    del index[key]
+
+    async def on_raw_reaction_add(self, payload):
+        await self._dispatch(payload, True)
+
+    async def on_raw_reaction_remove(self, payload):
+        await self._dispatch(payload, False)
+
+    async def _dispatch(self, payload, added):
+        by_message = self._messages.get(payload.message_id)
+        by_emoji = self._emojis.get(emoji_key(payload.emoji))
+        if not by_message and not by_emoji:
+            return
+        if self.bot.user is not None and payload.user_id == self.bot.user.id:
+            return
+        event = ReactionEvent(self.bot, payload, added)
+        for owner, handler in list((by_message or {}).items()) + list((by_emoji or {}).items()):
+            try:
+                await handler(event)
+            except Exception as error:
+                logger.exception(f"Reaction handler of {owner} failed: {error}")
+
+
+def get_reactions(bot):
+    """The ReactionPipeline of bot, one is attached if it has none"""
+    pipeline = getattr(bot, "reactions", None)
+    if pipeline is None:
+        pipeline = bot.reactions = ReactionPipeline(bot)
+    return pipeline
@@ -0,0 +1,133 @@
+import contextvars
+import functools
+import logging
+import os
+import sys
+import time
+
+# Trace of the REST call running in the current task, for the 429 handler
+_current = contextvars.ContextVar("rest_trace", default=None)
+# Cog to blame for the calls of the current task, for work queued by a
+# cog and run elsewhere (e.g. the Outbox)
+origin = contextvars.ContextVar("rest_origin", default=None)
+_COGS = os.sep + "cogs" + os.sep
+_UTILS = _COGS + "utils" + os.sep
+
+
+class RouteStats():
+    __slots__ = ("bucket", "calls", "errors", "retries", "latency", "worst", "wait")
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        # seconds, in total
+        self.latency = 0.0
+        self.worst = 0.0
+        self.wait = 0.0
+
+    @property
+    def cost(self):
+        return self.latency + self.wait
+
+
+class RestTracer():
+    """Traces the REST calls the bot makes to Discord
+
+    Every call is recorded per cog (the origin set by whoever runs work
+    on a cog's behalf, else the first cog module found walking up the
+    stack) and route (method and path template),
+    with its latency and the time it spent waiting on its rate limit
+    bucket: waiting for the bucket's lock while an earlier call holds it
+    or an exhausted bucket resets, plus the sleeps after a 429, which
+    discord.py reports on its http logger. The lock wait is measured by
+    taking and releasing the lock before the call, so a call that loses
+    the race for it afterwards counts the rest as latency.
+
+        tracer = RestTracer()
+        tracer.install(bot.http)
+        tracer.worst("modlog")
+    """
+
+    def __init__(self):
+        # (cog, route) -> RouteStats
+        self.routes = {}
+        self._http = None
+
+    def install(self, http):
+        self._http = http
+        http.request = self._traced(http.request)
+        logging.getLogger("discord.http").addHandler(_RateLimitHandler())
+
+    def worst(self, cog=None, count=10):
+        """((cog, route), RouteStats) by latency plus wait, worst first"""
+        items = [item for item in self.routes.items() if cog is None or item[0][0] == cog]
+        return sorted(items, key=lambda item: item[1].cost, reverse=True)[:count]
+
+    def by_cog(self):
+        """cog -> (calls, seconds spent waiting on buckets), busiest first"""
+        totals = {}
+        for (cog, _), stats in self.routes.items():
+            calls, wait = totals.get(cog, (0, 0.0))
+            totals[cog] = (calls + stats.calls, wait + stats.wait)
+        return dict(sorted(totals.items(), key=lambda item: item[1][1], reverse=True))
+
+    def _traced(self, request):
+        @functools.wraps(request)
+        async def traced(route, **kwargs):
+            key = (caller(), f"{route.method} {route.path}")
+            stats = self.routes.get(key)
+            if stats is None:
+                stats = self.routes[key] = RouteStats(route.bucket)
+            start = time.perf_counter()
+            lock = self._http._locks.get(route.bucket)
+            if lock is not None and lock.locked():
+                await lock.acquire()
+                lock.release()
+            waited = time.perf_counter() - start
+            trace = [0.0, 0]
+            token = _current.set(trace)
+            error = False
+            try:
+                return await request(route, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                _current.reset(token)
+                elapsed = time.perf_counter() - start - waited - trace[0]
+                stats.calls += 1
+                stats.errors += error
+                stats.retries += trace[1]
+                stats.wait += waited + trace[0]
+                stats.latency += elapsed
+                stats.worst = max(stats.worst, elapsed)
+        return traced
+
+
+class _RateLimitHandler(logging.Handler):
+    """Adds the retry_after of discord.py's 429 warnings to the current trace"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+
+    def emit(self, record):
+        trace = _current.get()
+        if trace is not None and record.msg.startswith("We are being rate limited"):
+            trace[0] += record.args[0]
+            trace[1] += 1
+
+
+def caller():
+    """Name of the cog module the current call comes from"""
+    cog = origin.get()
+    if cog is not None:
+        return cog
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if _COGS in filename and _UTILS not in filename:
+            return os.path.splitext(os.path.basename(filename))[0]
+        frame = frame.f_back
+    return "main"
@@ -0,0 +1,195 @@
+from collections import deque
+
+from loguru import logger
+
+
+class Routed():
+    """A message as the routes see it, normalized once
+
+    content is the raw text, text the casefolded and stripped text exact
+    and substring triggers match against, prefix the command prefix the
+    message starts with (None if it has none) and command the raw text
+    after it."""
+    __slots__ = ("message", "content", "text", "prefix", "command")
+
+    def __init__(self, message, text, prefix):
+        self.message = message
+        self.content = message.content
+        self.text = text
+        self.prefix = prefix
+        self.command = message.content[len(prefix):] if prefix else None
+
+
+class _Route():
+    __slots__ = ("owner", "handler", "bots", "guild_only")
+
+    def __init__(self, owner, handler, bots, guild_only):
+        self.owner = owner
+        self.handler = handler
+        self.bots = bots
+        self.guild_only = guild_only
+
+    def accepts(self, message):
+        if message.author.bot and not self.bots:
+            return False
+        return message.guild is not None or not self.guild_only
+
+
+class Automaton():
+    """Aho-Corasick automaton finding every pattern in a text in one pass,
+    however many patterns there are
+
+        automaton = Automaton(["doubt", "press x"])
+        automaton.search("press x to doubt")  # {"press x", "doubt"}
+    """
+
+    def __init__(self, patterns):
+        # state -> {char: state}, state 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        # state -> patterns ending there
+        self._out = [()]
+        for pattern in patterns:
+            self._add(pattern)
+        self._link()
+
+    def search(self, text):
+        """The patterns found in text"""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            following = self._goto[state].get(char)
+            if following is None:
+                following = self._goto[state][char] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = following
+        self._out[state] = self._out[state] + (pattern,)
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[following] = self._goto[fallback].get(char, 0)
+                if self._fail[following] == following:
+                    self._fail[following] = 0
+                self._out[following] = self._out[following] + self._out[self._fail[following]]
+
+
+class MessageRouter():
+    """The bot's one on_message stage
+
+    Cogs register routes instead of listening to on_message. Every
+    message is normalized once (see Routed) and handed to:
+    - every routes, which get all messages, even those without content
+    - exact routes, looked up by the whole text in a dict
+    - substring routes, all found in one pass of an Automaton, rebuilt
+      when they change
+    - prefixed routes, for every message starting with a command prefix,
+      which then do their own lookup of routed.command
+    so the cost of a message doesn't grow with the number of triggers.
+    Triggers are matched casefolded. Handlers are awaited one after
+    another with (message, routed); one failing doesn't stop the others.
+    Routes belong to an owner (the cog) and go away with remove(owner).
+
+        router = get_router(self.bot)
+        router.exact("Fun", "f", self.pay_respects, bots=True)
+        router.prefixed("CustomCommands", self.custom_command)
+        router.every("Modlog", self.snapshot, bots=True)
+        router.remove("Fun")
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        # text -> [_Route]
+        self._exact = {}
+        # pattern -> [_Route]
+        self._contains = {}
+        self._prefixed = []
+        self._every = []
+        self._automaton = None
+        bot.add_listener(self.on_message)
+
+    def exact(self, owner, trigger, handler, *, bots=False, guild_only=False):
+        """handler runs for messages that are trigger and nothing else"""
+        route = _Route(owner, handler, bots, guild_only)
+        self._exact.setdefault(trigger.strip().casefold(), []).append(route)
+
+    def contains(self, owner, pattern, handler, *, bots=False, guild_only=False):
+        """handler runs for messages containing pattern"""
+        route = _Route(owner, handler, bots, guild_only)
+        self._contains.setdefault(pattern.casefold(), []).append(route)
+        self._automaton = None
+
+    def prefixed(self, owner, handler, *, bots=False, guild_only=True):
+        """handler runs for every message starting with a command prefix"""
+        self._prefixed.append(_Route(owner, handler, bots, guild_only))
+
+    def every(self, owner, handler, *, bots=False, guild_only=True):
+        """handler runs for every message"""
+        self._every.append(_Route(owner, handler, bots, guild_only))
+
+    def remove(self, owner):
+        for table in (self._exact, self._contains):
+            for key in list(table):
+                table[key] = [route for route in table[key] if route.owner != owner]
+                if not table[key]:
+                    del table[key]
+        self._prefixed = [route for route in self._prefixed if route.owner != owner]
+        self._every = [route for route in self._every if route.owner != owner]
+        self._automaton = None
+
+    async def on_message(self, message):
+        routes = list(self._every)
+        text = message.content.strip().casefold()
+        if text:
+            self._match(text, routes)
+        prefix = None
+        if self._prefixed and message.content:
+            prefix = self.bot.command_prefix.match(message)
+            if prefix:
+                routes.extend(self._prefixed)
+        routed = None
+        for route in routes:
+            if not route.accepts(message):
+                continue
+            if routed is None:
+                routed = Routed(message, text, prefix)
+            try:
+                await route.handler(message, routed)
+            except Exception as error:
+                logger.exception(f"Route of {route.owner} failed: {error}")
+
+    def _match(self, text, routes):
+        """Adds the exact and substring routes text triggers to routes"""
+        routes.extend(self._exact.get(text, ()))
+        if self._contains:
+            if self._automaton is None:
+                self._automaton = Automaton(self._contains)
+            for pattern in self._automaton.search(text):
+                routes.extend(self._contains[pattern])
+
+
+def get_router(bot):
+    """The MessageRouter of bot, one is attached if it has none"""
+    router = getattr(bot, "router", None)
+    if router is None:
+        router = bot.router = MessageRouter(bot)
+    return router
@@ -1,14 +1,49 @@
 import argparse
 import os
 from copy import deepcopy
+from types import MappingProxyType
 
 import discord
 
+from . import migrations
 from .dataIO import dataIO
 
 default_path = "data/settings/settings.json"
 
 
+@migrations.migration("settings", 1)
+def update_old_settings_v1(settings):
+    # This converts the old settings format
+    if "default" in settings:
+        return settings
+    mod = settings.pop("MOD_ROLE", "Process")
+    admin = settings.pop("ADMIN_ROLE", "Transistor")
+    settings["default"] = {"MOD_ROLE": mod,
+                           "ADMIN_ROLE": admin,
+                           "PREFIXES": []
+                           }
+    return settings
+
+
+@migrations.migration("settings", 2)
+def update_old_settings_v2(settings):
+    # The joys of backwards compatibility
+    if "LOGIN_TYPE" not in settings:
+        return settings
+    if settings.get("EMAIL") == "EmailHere":
+        settings["EMAIL"] = None
+    if settings.get("PASSWORD") == "":
+        settings["PASSWORD"] = None
+    if settings["LOGIN_TYPE"] == "token":
+        settings["TOKEN"] = settings.get("EMAIL")
+        settings["EMAIL"] = None
+        settings["PASSWORD"] = None
+    else:
+        settings["TOKEN"] = None
+    del settings["LOGIN_TYPE"]
+    return settings
+
+
 class Settings:
 
     def __init__(self, path=default_path, parse_args=True):
@@ -26,25 +61,20 @@ class Settings:
                         }
         self._memory_only = False
 
-        if not dataIO.is_valid_json(self.path):
-            self.bot_settings = deepcopy(self.default_settings)
+        self.bot_settings = migrations.load(self.path, default=self.default_settings,
+                                            schema="settings")
+        missing = [key for key in self.default_settings
+                   if key not in self.bot_settings]
+        for key in missing:
+            self.bot_settings[key] = deepcopy(self.default_settings[key])
+            print("Adding " + str(key) + " field to red settings.json")
+        if missing:
             self.save_settings()
-        else:
-            current = dataIO.load_json(self.path)
-            if current.keys() != self.default_settings.keys():
-                for key in self.default_settings.keys():
-                    if key not in current.keys():
-                        current[key] = self.default_settings[key]
-                        print("Adding " + str(key) +
-                              " field to red settings.json")
-                dataIO.save_json(self.path, current)
-            self.bot_settings = dataIO.load_json(self.path)
-
-        if "default" not in self.bot_settings:
-            self.update_old_settings_v1()
-
-        if "LOGIN_TYPE" in self.bot_settings:
-            self.update_old_settings_v2()
+        # guild id (as str, like it comes back from json) -> guild dict,
+        # the same dicts that live in bot_settings
+        self._guilds = {str(k): v for k, v in self.bot_settings.items()
+                        if str(k).isdigit()}
+
         if parse_args:
             self.parse_cmd_arguments()
 
@@ -111,43 +141,14 @@ class Settings:
         self.save_settings()
 
     def check_folders(self):
-        folders = ("data", os.path.dirname(self.path), "cogs", "cogs/utils")
-        for folder in folders:
-            if not os.path.exists(folder):
-                print("Creating " + folder + " folder...")
-                os.makedirs(folder)
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            print("Creating " + folder + " folder...")
+            os.makedirs(folder)
 
-    def save_settings(self):
+    def save_settings(self, defer=False):
         if not self._memory_only:
-            dataIO.save_json(self.path, self.bot_settings)
-
-    def update_old_settings_v1(self):
-        # This converts the old settings format
-        mod = self.bot_settings["MOD_ROLE"]
-        admin = self.bot_settings["ADMIN_ROLE"]
-        del self.bot_settings["MOD_ROLE"]
-        del self.bot_settings["ADMIN_ROLE"]
-        self.bot_settings["default"] = {"MOD_ROLE": mod,
-                                        "ADMIN_ROLE": admin,
-                                        "PREFIXES": []
-                                        }
-        self.save_settings()
-
-    def update_old_settings_v2(self):
-        # The joys of backwards compatibility
-        settings = self.bot_settings
-        if settings["EMAIL"] == "EmailHere":
-            settings["EMAIL"] = None
-        if settings["PASSWORD"] == "":
-            settings["PASSWORD"] = None
-        if settings["LOGIN_TYPE"] == "token":
-            settings["TOKEN"] = settings["EMAIL"]
-            settings["EMAIL"] = None
-            settings["PASSWORD"] = None
-        else:
-            settings["TOKEN"] = None
-        del settings["LOGIN_TYPE"]
-        self.save_settings()
+            dataIO.save_json(self.path, self.bot_settings, defer=defer)
 
     @property
     def owner(self):
@@ -204,90 +205,70 @@ class Settings:
 
     @property
     def default_admin(self):
-        if "default" not in self.bot_settings:
-            self.update_old_settings()
         return self.bot_settings["default"].get("ADMIN_ROLE", "")
 
     @default_admin.setter
     def default_admin(self, value):
-        if "default" not in self.bot_settings:
-            self.update_old_settings()
         self.bot_settings["default"]["ADMIN_ROLE"] = value
 
     @property
     def default_mod(self):
-        if "default" not in self.bot_settings:
-            self.update_old_settings_v1()
         return self.bot_settings["default"].get("MOD_ROLE", "")
 
     @default_mod.setter
     def default_mod(self, value):
-        if "default" not in self.bot_settings:
-            self.update_old_settings_v1()
         self.bot_settings["default"]["MOD_ROLE"] = value
 
     @property
     def guilds(self):
-        ret = {}
-        guild_ids = list(
-            filter(lambda x: str(x).isdigit(), self.bot_settings))
-        for guild in guild_ids:
-            ret.update({guild: self.bot_settings[guild]})
-        return ret
+        """Read-only view of guild id -> guild settings"""
+        return MappingProxyType(self._guilds)
 
     def get_guild(self, guild):
+        """Read-only view of the guild's settings, the defaults if it has none"""
         if guild is None:
-            return self.bot_settings["default"].copy()
+            return MappingProxyType(self.bot_settings["default"])
         assert isinstance(guild, discord.Guild)
-        return self.bot_settings.get(guild.id,
-                                     self.bot_settings["default"]).copy()
+        return MappingProxyType(self._guilds.get(str(guild.id),
+                                                 self.bot_settings["default"]))
 
     def get_guild_admin(self, guild):
-        if guild is None:
-            return self.default_admin
-        assert isinstance(guild, discord.Guild)
-        if guild.id not in self.bot_settings:
+        settings = None if guild is None else self._guilds.get(str(guild.id))
+        if settings is None:
             return self.default_admin
-        return self.bot_settings[guild.id].get("ADMIN_ROLE", "")
+        return settings.get("ADMIN_ROLE", "")
 
     def set_guild_admin(self, guild, value):
         if guild is None:
             return
         assert isinstance(guild, discord.Guild)
-        if guild.id not in self.bot_settings:
-            self.add_guild(guild.id)
-        self.bot_settings[guild.id]["ADMIN_ROLE"] = value
+        self._guild_settings(guild)["ADMIN_ROLE"] = value
         self.save_settings()
 
     def get_guild_mod(self, guild):
-        if guild is None:
+        settings = None if guild is None else self._guilds.get(str(guild.id))
+        if settings is None:
             return self.default_mod
-        assert isinstance(guild, discord.Guild)
-        if guild.id not in self.bot_settings:
-            return self.default_mod
-        return self.bot_settings[guild.id].get("MOD_ROLE", "")
+        return settings.get("MOD_ROLE", "")
 
     def set_guild_mod(self, guild, value):
         if guild is None:
             return
         assert isinstance(guild, discord.Guild)
-        if guild.id not in self.bot_settings:
-            self.add_guild(guild.id)
-        self.bot_settings[guild.id]["MOD_ROLE"] = value
+        self._guild_settings(guild)["MOD_ROLE"] = value
         self.save_settings()
 
     def get_guild_prefixes(self, guild):
-        if guild is None or guild.id not in self.bot_settings:
+        settings = None if guild is None else self._guilds.get(str(guild.id))
+        if settings is None:
             return self.prefixes
-        return self.bot_settings[guild.id].get("PREFIXES", [])
+        return settings.get("PREFIXES", [])
 
     def set_guild_prefixes(self, guild, prefixes):
         if guild is None:
             return
         assert isinstance(guild, discord.Guild)
-        if guild.id not in self.bot_settings:
-            self.add_guild(guild.id)
-        self.bot_settings[guild.id]["PREFIXES"] = prefixes
+        self._guild_settings(guild)["PREFIXES"] = prefixes
         self.save_settings()
 
     def get_prefixes(self, guild):
@@ -296,5 +277,14 @@ class Settings:
         return p if p else self.prefixes
 
     def add_guild(self, sid):
-        self.bot_settings[sid] = self.bot_settings["default"].copy()
-        self.save_settings()
+        """Adds a guild with the default settings. The save is deferred so
+        guilds joined in a burst end up in a single write."""
+        sid = str(sid)
+        self._guilds[sid] = self.bot_settings[sid] = deepcopy(self.bot_settings["default"])
+        self.save_settings(defer=True)
+
+    def _guild_settings(self, guild):
+        sid = str(guild.id)
+        if sid not in self._guilds:
+            self.add_guild(sid)
+        return self._guilds[sid]
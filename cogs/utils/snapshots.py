@@ -0,0 +1,184 @@
+import heapq
+import itertools
+import sys
+from collections import OrderedDict
+
+# What a Snapshot costs besides its strings: the object, its slot
+# references and its entry in the guild's OrderedDict
+_OVERHEAD = 200
+# No guild to keep, guild ids themselves can be None
+_NO_GUILD = object()
+
+
+class Snapshot():
+    """What the logs need of a message, nothing else"""
+    __slots__ = ("id", "author_id", "channel_id", "guild_id", "content", "attachments", "size")
+
+    def __init__(self, message_id, author_id, channel_id, guild_id, content, attachments=()):
+        self.id = message_id
+        self.author_id = author_id
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.content = content
+        self.attachments = tuple(attachments)
+        self.size = (_OVERHEAD + sys.getsizeof(content)
+                     + sum(sys.getsizeof(url) for url in self.attachments))
+
+    @classmethod
+    def of(cls, message):
+        return cls(message.id, message.author.id, message.channel.id,
+                   message.guild.id if message.guild else None, message.content,
+                   [attachment.url for attachment in message.attachments])
+
+
+class MessageCache():
+    """Snapshots of recent guild messages within a memory budget
+
+    Keeps a Snapshot (ids, content and attachment urls) per message
+    instead of the whole discord.Message, so far more messages fit in
+    the memory discord.py's message deque would use. Every guild has its
+    own LRU order and keeps at most guild_budget bytes; past budget bytes
+    overall the guild using the most loses its oldest messages first, so
+    one busy guild can't push everyone else's out. That guild is found
+    through a heap of sizes, and the message being added is never the one
+    evicted. Sizes are estimates (see Snapshot.size).
+
+        cache = get_snapshots(bot)
+        cache.add(message)
+        before, content = cache.edited(payload.message_id, payload.data)
+        snapshot = cache.pop(payload.message_id)
+    """
+
+    def __init__(self, budget=32 * 1024 * 1024, guild_budget=4 * 1024 * 1024):
+        self.budget = budget
+        self.guild_budget = guild_budget
+        self.used = 0
+        # guild id -> OrderedDict of message id -> Snapshot, oldest first
+        self._guilds = {}
+        # guild id -> bytes
+        self._sizes = {}
+        # message id -> guild id
+        self._index = {}
+        # (-bytes, tiebreak, guild id), lazily updated: a guild may have
+        # stale entries, but always one claiming at least its bytes
+        self._heap = []
+        self._tiebreak = itertools.count()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, message_id):
+        return message_id in self._index
+
+    def add(self, message):
+        """Snapshots message, returns the Snapshot"""
+        snapshot = Snapshot.of(message)
+        self.put(snapshot)
+        return snapshot
+
+    def put(self, snapshot):
+        self.pop(snapshot.id)
+        guild = self._guilds.setdefault(snapshot.guild_id, OrderedDict())
+        guild[snapshot.id] = snapshot
+        self._index[snapshot.id] = snapshot.guild_id
+        self._sizes[snapshot.guild_id] = self._sizes.get(snapshot.guild_id, 0) + snapshot.size
+        self.used += snapshot.size
+        # The new snapshot is the newest of its guild, evicting the oldest
+        # only reaches it once it's the only one left
+        while self._sizes[snapshot.guild_id] > self.guild_budget and len(guild) > 1:
+            self._evict(snapshot.guild_id)
+        self._push(snapshot.guild_id)
+        while self.used > self.budget:
+            victim = self._largest(keep=snapshot.guild_id if len(guild) == 1 else _NO_GUILD)
+            if victim is _NO_GUILD:
+                break
+            self._evict(victim)
+
+    def get(self, message_id):
+        if message_id not in self._index:
+            return None
+        guild = self._guilds[self._index[message_id]]
+        guild.move_to_end(message_id)
+        return guild[message_id]
+
+    def pop(self, message_id):
+        """Removes the snapshot of message_id and returns it, None if there is none"""
+        if message_id not in self._index:
+            return None
+        guild_id = self._index.pop(message_id)
+        guild = self._guilds[guild_id]
+        snapshot = guild.pop(message_id)
+        self._release(guild_id, snapshot.size)
+        return snapshot
+
+    def edited(self, message_id, data):
+        """Applies a raw message update, returns (snapshot before, new
+        content). The new content is None when the update didn't change
+        it (e.g. an embed was added), the snapshot None when the message
+        isn't cached, which is then left alone."""
+        before = self.get(message_id)
+        content = data.get("content")
+        if before is None or content is None or content == before.content:
+            return before, None
+        attachments = before.attachments
+        if "attachments" in data:
+            attachments = [attachment["url"] for attachment in data["attachments"]]
+        self.put(Snapshot(message_id, before.author_id, before.channel_id, before.guild_id,
+                          content, attachments))
+        return before, content
+
+    def forget(self, guild_id):
+        """Drops the snapshots of a guild"""
+        for message_id in self._guilds.pop(guild_id, {}):
+            del self._index[message_id]
+        self.used -= self._sizes.pop(guild_id, 0)
+
+    def _evict(self, guild_id):
+        message_id, snapshot = self._guilds[guild_id].popitem(last=False)
+        del self._index[message_id]
+        self._release(guild_id, snapshot.size)
+
+    def _push(self, guild_id):
+        if len(self._heap) > 2 * len(self._sizes) + 64:
+            # Mostly stale entries, start over from the actual sizes
+            self._heap = [(-size, next(self._tiebreak), gid) for gid, size in self._sizes.items()]
+            heapq.heapify(self._heap)
+        else:
+            heapq.heappush(self._heap, (-self._sizes[guild_id], next(self._tiebreak), guild_id))
+
+    def _largest(self, keep=_NO_GUILD):
+        """The guild using the most bytes other than keep, _NO_GUILD if there is none"""
+        skipped = []
+        found = _NO_GUILD
+        while self._heap:
+            claimed, _, guild_id = self._heap[0]
+            size = self._sizes.get(guild_id)
+            if size != -claimed:
+                heapq.heappop(self._heap)
+                if size is not None and size < -claimed:
+                    # Shrank since, it must keep an entry
+                    self._push(guild_id)
+                continue
+            if guild_id == keep:
+                skipped.append(heapq.heappop(self._heap))
+                continue
+            found = guild_id
+            break
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return found
+
+    def _release(self, guild_id, size):
+        self.used -= size
+        self._sizes[guild_id] -= size
+        if not self._guilds[guild_id]:
+            del self._guilds[guild_id]
+            del self._sizes[guild_id]
+
+
+def get_snapshots(bot):
+    """The MessageCache of bot, a default one is attached if it has none"""
+    cache = getattr(bot, "snapshots", None)
+    if cache is None:
+        cache = bot.snapshots = MessageCache()
+    return cache
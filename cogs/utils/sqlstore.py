@@ -0,0 +1,187 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+
+from .dataIO import _freeze
+
+# Lists and dicts with more items than this get a row per item, so that
+# adding to a long one (e.g. the messages of the starboard) writes one row
+# instead of the whole collection
+SPLIT_SIZE = 32
+# Separates the key of a split collection from the item in a row's key
+_SEP = "\0"
+
+
+class SQLiteBackend():
+    """Storage backend for DataIO that keeps every json file as rows of
+    one SQLite database.
+
+    The top level keys of a dict are stored as separate rows so saving a
+    file only writes the keys that changed. Anything else is stored whole
+    under an empty key. A value that is a collection of more than
+    SPLIT_SIZE items is stored as an empty one with a row per item
+    beside it, keyed "<key>\\0<index or item key>"."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS files ("
+                           "path TEXT PRIMARY KEY, "
+                           "is_dict INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS documents ("
+                           "path TEXT NOT NULL, "
+                           "key TEXT NOT NULL, "
+                           "value TEXT NOT NULL, "
+                           "PRIMARY KEY (path, key)) WITHOUT ROWID")
+        # Saves come from the event loop and from the DataIO thread pool
+        self._lock = threading.Lock()
+        # path -> {key: encoded value} exactly as stored
+        self._rows = {}
+        self._is_dict = {}
+        self._frozen = {}
+
+    def exists(self, filename):
+        filename = os.path.normpath(filename)
+        with self._lock:
+            return self._fetch(filename) is not None
+
+    def load(self, filename, frozen=False):
+        filename = os.path.normpath(filename)
+        with self._lock:
+            if frozen and filename in self._frozen:
+                return self._frozen[filename]
+            rows = self._fetch(filename)
+            if rows is None:
+                raise FileNotFoundError(filename)
+            data = _decode_rows(rows)
+            if not self._is_dict[filename]:
+                data = data[""]
+            if frozen:
+                data = self._frozen[filename] = _freeze(data)
+            return data
+
+    def save(self, filename, data):
+        filename = os.path.normpath(filename)
+        is_dict = isinstance(data, dict)
+        new = {}
+        if is_dict:
+            for k, v in data.items():
+                _encode_rows(_key(k), v, new)
+        else:
+            _encode_rows("", data, new)
+        with self._lock:
+            old = self._fetch(filename)
+            changed = [(filename, k, v) for k, v in new.items()
+                       if old is None or old.get(k) != v]
+            removed = [(filename, k) for k in (old or {}) if k not in new]
+            if old is not None and not changed and not removed \
+                    and self._is_dict[filename] == is_dict:
+                return True
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO files (path, is_dict) "
+                                   "VALUES (?, ?)", (filename, int(is_dict)))
+                self._conn.executemany("INSERT OR REPLACE INTO documents "
+                                       "(path, key, value) VALUES (?, ?, ?)",
+                                       changed)
+                self._conn.executemany("DELETE FROM documents "
+                                       "WHERE path = ? AND key = ?", removed)
+            self._rows[filename] = new
+            self._is_dict[filename] = is_dict
+            self._frozen.pop(filename, None)
+        return True
+
+    def remove(self, filename):
+        filename = os.path.normpath(filename)
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM files WHERE path = ?", (filename,))
+                self._conn.execute("DELETE FROM documents WHERE path = ?", (filename,))
+            self._rows.pop(filename, None)
+            self._is_dict.pop(filename, None)
+            self._frozen.pop(filename, None)
+        return True
+
+    def list(self, folder):
+        """Names of the files stored directly inside folder"""
+        folder = os.path.normpath(folder)
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM files WHERE path LIKE ?",
+                                      (folder + os.sep + "%",)).fetchall()
+        return [os.path.basename(path) for path, in rows
+                if os.path.dirname(path) == folder]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _fetch(self, filename):
+        """Returns the stored rows of a file, None if it doesn't exist"""
+        if filename in self._rows:
+            return self._rows[filename]
+        row = self._conn.execute("SELECT is_dict FROM files WHERE path = ?",
+                                 (filename,)).fetchone()
+        if row is None:
+            return None
+        rows = dict(self._conn.execute("SELECT key, value FROM documents "
+                                       "WHERE path = ?", (filename,)))
+        self._rows[filename] = rows
+        self._is_dict[filename] = bool(row[0])
+        return rows
+
+
+def import_json_files(backend, root="data"):
+    """One-shot import of every json file under root into the backend.
+    Files the backend already knows are skipped. Returns the imported paths."""
+    imported = []
+    pattern = os.path.join(root, "**", "*.json")
+    for filename in sorted(glob.glob(pattern, recursive=True)):
+        if backend.exists(filename):
+            continue
+        with open(filename, encoding='utf-8', mode="r") as f:
+            data = json.load(f)
+        backend.save(filename, data)
+        imported.append(filename)
+    return imported
+
+
+def _encode_rows(key, value, rows):
+    """Adds the rows storing value under key to rows"""
+    if not isinstance(value, (list, dict)) or len(value) <= SPLIT_SIZE:
+        rows[key] = json.dumps(value, sort_keys=True)
+        return
+    if isinstance(value, list):
+        rows[key] = "[]"
+        items = ((str(index), item) for index, item in enumerate(value))
+    else:
+        rows[key] = "{}"
+        items = ((_key(k), item) for k, item in value.items())
+    for item_key, item in items:
+        rows[key + _SEP + item_key] = json.dumps(item, sort_keys=True)
+
+
+def _decode_rows(rows):
+    """The dict of top level keys stored in rows"""
+    data, items = {}, {}
+    for key, value in rows.items():
+        parent, split, item_key = key.partition(_SEP)
+        if split:
+            items.setdefault(parent, []).append((item_key, value))
+        else:
+            data[key] = json.loads(value)
+    for parent, stored in items.items():
+        if isinstance(data[parent], list):
+            stored.sort(key=lambda row: int(row[0]))
+            data[parent] = [json.loads(value) for _, value in stored]
+        else:
+            data[parent] = {item_key: json.loads(value) for item_key, value in stored}
+    return data
+
+
+def _key(key):
+    # Same conversion json.dumps applies to dict keys
+    return key if isinstance(key, str) else json.dumps(key)
@@ -0,0 +1,91 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+
+class WebClient():
+    """Bot-wide HTTP client
+
+    Owns one aiohttp session whose connector caps the number of open
+    sockets (in total and per host), caches DNS lookups and keeps
+    connections alive between requests, so polling an API doesn't set up
+    TCP and TLS again every time. Every request gets the default timeout
+    unless it passes its own. The session is created on first use, from
+    within the event loop.
+
+    Libraries that only have a blocking client go through run_sync,
+    which runs them on a small thread pool of their own so they can
+    neither stall the event loop nor starve dataIO's threads.
+
+        web = get_client(self.bot)
+        async with web.session.get(url, headers=header) as r:
+            data = await r.json()
+        season = await web.run_sync(Season().details, show_id, 1)
+    """
+
+    def __init__(self, limit=100, limit_per_host=10, dns_ttl=300, keepalive=30, timeout=15,
+                 sync_threads=4):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.sync_threads = sync_threads
+        self._session = None
+        self._executor = None
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                                             limit_per_host=self.limit_per_host,
+                                             use_dns_cache=True,
+                                             ttl_dns_cache=self.dns_ttl,
+                                             keepalive_timeout=self.keepalive)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def get_json(self, url, **kwargs):
+        """GETs url, returns the status and the decoded json body
+
+        The body is None when an error response isn't json (like the html
+        page of a 404), so callers can check the status either way."""
+        async with self.session.get(url, **kwargs) as r:
+            try:
+                return r.status, await r.json(content_type=None)
+            except ValueError:
+                if r.status == 200:
+                    raise
+                return r.status, None
+
+    async def get_text(self, url, **kwargs):
+        """GETs url, returns the status and the body"""
+        async with self.session.get(url, **kwargs) as r:
+            return r.status, await r.text()
+
+    async def run_sync(self, func, *args, **kwargs):
+        """Awaits func(*args, **kwargs) run on the client's thread pool"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.sync_threads,
+                                                thread_name_prefix="webclient")
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def get_client(bot):
+    """The WebClient of bot, a default one is attached if it has none"""
+    client = getattr(bot, "web", None)
+    if client is None:
+        client = bot.web = WebClient()
+    return client
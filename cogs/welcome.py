@@ -1,12 +1,13 @@
 from discord.ext import commands
 from loguru import logger
 
-from .utils.dataIO import dataIO
+from .utils.dataIO import GuildStore
 
 
 class Welcome(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.settings = GuildStore("data/welcome/guilds", legacy_file="data/welcome/info.json")
 
     @commands.group()
     async def welcome(self, ctx):
@@ -24,11 +25,8 @@ class Welcome(commands.Cog):
         if channel is None:
             await ctx.send("Please specify a channel!\nEx: !welcome enable {0} Hey [user]! welcome to our guild!\n\n Note: [user] will mention the user".format(ctx.channel.mention))
         try:
-            guild_id = str(ctx.guild.id)
             channel_id = channel.replace("#", "").replace("<", "").replace(">", "")
-            config = dataIO.load_json('data/welcome/info.json')
-            config[guild_id] = {"channel": channel_id, "message": message}
-            dataIO.save_json('data/welcome/info.json', config)
+            self.settings.save(ctx.guild.id, {"channel": channel_id, "message": message})
             await ctx.send("Welcome channel set!")
         except Exception as e:
             logger.error(e)
@@ -39,12 +37,10 @@ class Welcome(commands.Cog):
     async def disable(self, ctx):
         try:
             guild_id = ctx.guild.id
-            data = dataIO.load_json('data/welcome/info.json')
-            if guild_id not in data.keys():
+            if guild_id not in self.settings:
                 await ctx.channel.send("Welcome message was never enabled! You can set it up using !welcome enable #channel")
                 return
-            data[guild_id] = {"channel": "", "message": data[guild_id]['message']}
-            dataIO.save_json('data/welcome/info.json', data)
+            self.settings.save(guild_id, {"channel": "", "message": self.settings[guild_id]['message']})
             await ctx.channel.send("Welcome message feature disabled!")
         except Exception as e:
             logger.error(e)
@@ -52,14 +48,13 @@ class Welcome(commands.Cog):
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
-        guild_id = str(member.guild.id)
-        data = dataIO.load_json('data/welcome/info.json')
-        if guild_id not in data.keys():
+        data = self.settings.get(member.guild.id)
+        if data is None:
             return
-        channel = data[guild_id]['channel']
+        channel = data['channel']
         if channel == "":
             return
-        message = data[guild_id]['message'].replace('[user]', member.mention)
+        message = data['message'].replace('[user]', member.mention)
         try:
             send_to_channel = self.bot.get_channel(int(channel))
             if send_to_channel is not None:
@@ -67,6 +62,9 @@ class Welcome(commands.Cog):
         except Exception as e:
             await member.guild.owner.send("There is an error with a newcomer, please report this to the creator.\n {}".format(e))
 
+    def cog_unload(self):
+        self.settings.flush()
+
 
 def setup(bot):
     bot.add_cog(Welcome(bot))
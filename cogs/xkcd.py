@@ -1,9 +1,11 @@
-import json
-import urllib.request
+import asyncio
 
+import aiohttp
 import discord
 from discord.ext import commands
 
+from .utils.webclient import get_client
+
 
 class XKCD(commands.Cog):
     def __init__(self, bot):
@@ -18,24 +20,21 @@ class XKCD(commands.Cog):
         :param number: Comic number
         :return: The comic you requested
         """
-        if number is None:
-            with urllib.request.urlopen(self.current) as url:
-                data = json.loads(url.read().decode())
-                embed = discord.Embed(title=data["title"], description=f"Alt: {data['alt']}")
-                embed.set_image(url=data["img"])
-                embed.set_footer(text=f"XKCD nr.{data['num']}")
-                await ctx.send(embed=embed)
-        else:
-            try:
-                with urllib.request.urlopen(self.apiurl.format(x=number)) as url:
-                    data = json.loads(url.read().decode())
-                    em = discord.Embed(title=data["title"],
-                                       description=f"Alt: {data['alt']}")
-                    em.set_image(url=data["img"])
-                    em.set_footer(text=f"XKCD nr.{data['num']}")
-                    await ctx.send(embed=em)
-            except:
-                await ctx.send("Could not find an XKCD with this ID!")
+        url = self.current if number is None else self.apiurl.format(x=number)
+        try:
+            status, data = await get_client(self.bot).get_json(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            status = None
+        if status == 404 and number is not None:
+            await ctx.send("Could not find an XKCD with this ID!")
+            return
+        if status != 200:
+            await ctx.send("Couldn't reach XKCD right now, try again later.")
+            return
+        embed = discord.Embed(title=data["title"], description=f"Alt: {data['alt']}")
+        embed.set_image(url=data["img"])
+        embed.set_footer(text=f"XKCD nr.{data['num']}")
+        await ctx.send(embed=embed)
 
     # @xkcd.command()
     # async def id(self, ctx, number: int):
@@ -1,28 +1,19 @@
-import os
 import re
 
 import discord
 from discord.ext import commands
-from loguru import logger
 
-from .utils.dataIO import dataIO, fileIO
+from .utils.dataIO import GuildStore
 
 
 class Youtube(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # guild id -> {user id: [links]}
+        self.playlists = GuildStore("data/youtube/guilds", legacy_file="data/youtube/playlist.json")
 
-    async def get_config(self):
-        return dataIO.load_json('data/youtube/playlist.json')
-
-    async def save_config(self, data):
-        return dataIO.save_json('data/youtube/playlist.json', data)
-
-    async def server_in_config(self, servers, id):
-        if id in servers.keys():
-            return True
-        else:
-            return False
+    def cog_unload(self):
+        self.playlists.flush()
 
     @commands.group('youtube', pass_context=True)
     async def youtube(self, ctx):
@@ -35,33 +26,29 @@ class Youtube(commands.Cog):
         youtube_url_regex = "(http(?:s?):\/\/(?:www\.)?youtu(?:be\.com\/watch\?v=|\.be\/)([\w\-\_]*)(&(amp;)?‌​[\w\?‌​=]*)?)"
         regex = re.findall(youtube_url_regex, link)
         if len(regex) > 0 and "youtube.com" in regex[0][0] or "youtu.be" in regex[0][0]:
-            servers = await self.get_config()
-            if await self.server_in_config(servers, ctx.message.guild.id):
-                if ctx.message.author.id not in servers[ctx.message.guild.id]:
-                    servers[ctx.message.guild.id][ctx.message.author.id] = []
-                if len(servers[ctx.message.guild.id][ctx.message.author.id]) < 3 and regex[0][0] not in servers[ctx.message.guild.id][ctx.message.author.id]:
-                    servers[ctx.message.guild.id][ctx.message.author.id].append(regex[0][0])
-                    await ctx.send("Added!")
-                else:
-                    await ctx.send("Sorry! Either you already added that link or you've hit your max of 3 links!")
-            else:
-                servers[ctx.message.guild.id] = {ctx.message.author.id: [regex[0][0]]}
-                await ctx.send("Added!")
-
-            await self.save_config(servers)
+            guild_id, author_id = ctx.message.guild.id, str(ctx.message.author.id)
+            if guild_id not in self.playlists:
+                self.playlists.save(guild_id, {author_id: [regex[0][0]]})
+                return await ctx.send("Added!")
+            links = self.playlists[guild_id].setdefault(author_id, [])
+            if len(links) < 3 and regex[0][0] not in links:
+                links.append(regex[0][0])
+                self.playlists.save(guild_id)
+                return await ctx.send("Added!")
+            await ctx.send("Sorry! Either you already added that link or you've hit your max of 3 links!")
         else:
             await ctx.send("Sorry that doesn't seem to be a valid Youtube link!")
 
     @youtube.group(pass_context=True)
     async def list(self, ctx):
         server_object = ctx.message.guild
-        server = await self.get_config()
         e = discord.Embed(title=f'{server_object.name}\'s Member Playlist', color=discord.Color.red())
         e.set_thumbnail(url="https://seeklogo.net/wp-content/uploads/2016/06/YouTube-icon.png")
-        for user in list(server[server_object.id].keys()):
-            user = await self.bot.get_user_info(user_id=user)
-            if len(server[server_object.id][user.id]) != 0:
-                songs = '\n'.join(server[server_object.id][user.id])
+        playlists = self.playlists[server_object.id]
+        for user_id in list(playlists.keys()):
+            user = await self.bot.fetch_user(int(user_id))
+            if len(playlists[user_id]) != 0:
+                songs = '\n'.join(playlists[user_id])
             else:
                 songs = "None"
             e.add_field(name=f"{user}'s songs:", value=songs)
@@ -69,31 +56,18 @@ class Youtube(commands.Cog):
 
     @youtube.group(pass_context=True)
     async def delete(self,ctx,  link):
-        config = await self.get_config()
-        server_config = config[ctx.message.guild.id]
-        if ctx.message.author.id in server_config.keys():
-            if link in server_config[ctx.message.author.id]:
-                server_config[ctx.message.author.id].remove(link)
-                await self.save_config(config)
+        server_config = self.playlists[ctx.message.guild.id]
+        author_id = str(ctx.message.author.id)
+        if author_id in server_config.keys():
+            if link in server_config[author_id]:
+                server_config[author_id].remove(link)
+                self.playlists.save(ctx.message.guild.id)
                 await ctx.send("Removed!")
             else:
                 await ctx.send("Hm I don't think that link was in there to begin with... try adding it?")
         else:
             await ctx.send("Doesn't look like you've added any youtube links.. try adding one!")
 
-def check_folders():
-    if not os.path.exists("data/youtube"):
-        logger.info("Creating data/youtube folder...")
-        os.makedirs("data/youtube")
-
-def check_files():
-    f = "data/youtube/playlist.json"
-    if not fileIO(f, "check"):
-        logger.info("Creating empty youtube.json...")
-        fileIO(f, "save", {})
-
 def setup(bot):
-    check_folders()
-    check_files()
     n = Youtube(bot)
     bot.add_cog(n)
@@ -0,0 +1,243 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import deque
+from configparser import ConfigParser
+
+from loguru import logger
+
+from cogs.utils import cluster
+
+# main.py works from inside cogs/, the status files are in its data folder
+STATUS_FOLDER = os.path.join("cogs", "data", "cluster")
+GATEWAY_URL = "https://discordapp.com/api/v7/gateway/bot"
+
+
+def recommended_shards(token):
+    """How many shards Discord wants the bot to run"""
+    request = urllib.request.Request(GATEWAY_URL, headers={"Authorization": f"Bot {token}",
+                                                           "User-Agent": "Peribot launcher"})
+    with urllib.request.urlopen(request, timeout=15) as response:
+        return json.load(response)["shards"]
+
+
+class Worker():
+    """One main.py process running a range of shards"""
+
+    def __init__(self, index, count, shard_ids=None, shard_count=None):
+        self.index = index
+        self.count = count
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.status_file = os.path.abspath(os.path.join(STATUS_FOLDER, f"{index}.json"))
+        self.process = None
+        self.started = None
+        # When set, the worker is down and starts again at that time
+        self.restart_at = None
+        self.restarts = 0
+        # When it failed within the restart window
+        self.failures = deque()
+
+    @property
+    def shards(self):
+        return "all" if self.shard_ids is None else cluster.format_shards(self.shard_ids)
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        if os.path.exists(self.status_file):
+            os.remove(self.status_file)
+        env = dict(os.environ)
+        env.update({cluster.ENV_CLUSTER: str(self.index), cluster.ENV_CLUSTERS: str(self.count),
+                    cluster.ENV_STATUS: self.status_file})
+        if self.shard_ids is not None:
+            env[cluster.ENV_SHARDS] = cluster.format_shards(self.shard_ids)
+            env[cluster.ENV_SHARD_COUNT] = str(self.shard_count)
+        self.process = subprocess.Popen([sys.executable, "main.py"], env=env)
+        self.started = time.time()
+        self.restart_at = None
+        logger.info(f"Started cluster {self.index} (shards {self.shards}) as pid {self.process.pid}")
+
+    def status(self):
+        """The last heartbeat of the worker, None before the first one"""
+        return cluster.read_status(self.status_file) if self.running else None
+
+    def stop(self, timeout=30):
+        if not self.running:
+            return
+        # main.py closes the bot and flushes dataIO on SIGTERM
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            logger.error(f"Cluster {self.index} didn't stop in {timeout}s, killing it")
+            self.process.kill()
+            self.process.wait()
+
+
+class Supervisor():
+    """Runs the workers of the bot and keeps them running
+
+    Replaces the run.sh crash loop. Workers are started one after
+    another, each once the ones before it are ready (or had start_timeout
+    seconds to get there), so only one process identifies with Discord
+    at a time and the primary has split the legacy data files before the
+    others look for them. A worker that exits, or whose heartbeat (see
+    report_status in main.py) is older than heartbeat_timeout seconds, is
+    stopped and started again restart_delay seconds later. A worker
+    failing more than max_restarts times within restart_window seconds
+    takes the whole cluster down, like run.sh gave up after 10 failures.
+    What every worker reports is gathered in health.json for the owner's
+    cluster command.
+
+        Supervisor([Worker(0, 2, (0, 1), 4), Worker(1, 2, (2, 3), 4)]).run()
+    """
+
+    def __init__(self, workers, heartbeat_timeout=60, start_timeout=300, restart_delay=5,
+                 max_restarts=10, restart_window=3600):
+        self.workers = workers
+        self.heartbeat_timeout = heartbeat_timeout
+        self.start_timeout = start_timeout
+        self.restart_delay = restart_delay
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.health_file = os.path.join(STATUS_FOLDER, "health.json")
+        self.stopping = False
+        self.exit_code = 0
+
+    def run(self):
+        """Supervises until stopped by a signal or too many failures, returns the exit code"""
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        os.makedirs(STATUS_FOLDER, exist_ok=True)
+        try:
+            while not self.stopping:
+                waiting = [worker for worker in self.workers if worker.process is None]
+                if waiting and self._settled():
+                    waiting[0].start()
+                for worker in self.workers:
+                    if worker.process is not None:
+                        self.check(worker)
+                self.write_health()
+                time.sleep(1)
+        finally:
+            for worker in self.workers:
+                worker.stop()
+            self.write_health()
+        return self.exit_code
+
+    def check(self, worker):
+        now = time.time()
+        if worker.restart_at is not None:
+            if now >= worker.restart_at and not self.stopping:
+                worker.start()
+            return
+        code = worker.process.poll()
+        if code is None:
+            status = worker.status()
+            last_sign = status["time"] if status else worker.started
+            limit = self.heartbeat_timeout if status else self.start_timeout
+            if now - last_sign <= limit:
+                return
+            logger.error(f"Cluster {worker.index} sent no heartbeat for {now - last_sign:.0f}s, stopping it")
+            worker.stop(timeout=10)
+        else:
+            logger.error(f"Cluster {worker.index} exited with code {code}")
+        self._failed(worker, now)
+
+    def write_health(self):
+        clusters = []
+        for worker in self.workers:
+            status = worker.status()
+            if worker.process is None:
+                state = "waiting"
+            elif worker.restart_at is not None:
+                state = "restarting"
+            elif not worker.running:
+                state = "down"
+            else:
+                state = "ready" if status and status["ready"] else "starting"
+            latencies = [ms for ms in (status or {}).get("latency_ms", {}).values() if ms is not None]
+            clusters.append({"cluster": worker.index, "shards": worker.shards, "state": state,
+                             "pid": worker.process.pid if worker.running else None,
+                             "guilds": status["guilds"] if status else 0,
+                             "latency_ms": max(latencies) if latencies else None,
+                             "lag_p95_ms": status["lag_p95_ms"] if status else None,
+                             "heartbeat_age": round(time.time() - status["time"], 1) if status else None,
+                             "restarts": worker.restarts})
+        shard_count = self.workers[0].shard_count or "auto"
+        cluster.write_status(self.health_file, {
+            "time": time.time(), "shard_count": shard_count,
+            "ready": sum(entry["state"] == "ready" for entry in clusters),
+            "guilds": sum(entry["guilds"] for entry in clusters), "clusters": clusters})
+
+    def _settled(self):
+        """Whether every started worker is ready or had its time to get there"""
+        for worker in self.workers:
+            if worker.process is None or worker.restart_at is not None:
+                continue
+            status = worker.status()
+            if not (status and status["ready"]) and time.time() - worker.started < self.start_timeout:
+                return False
+        return True
+
+    def _failed(self, worker, now):
+        worker.failures.append(now)
+        while worker.failures[0] < now - self.restart_window:
+            worker.failures.popleft()
+        if len(worker.failures) > self.max_restarts:
+            logger.error(f"Cluster {worker.index} failed {len(worker.failures)} times in "
+                         f"{self.restart_window}s. aborting ...")
+            self.stopping = True
+            self.exit_code = 1
+            return
+        worker.restarts += 1
+        worker.restart_at = now + self.restart_delay
+        logger.info(f"Restarting cluster {worker.index} in {self.restart_delay}s ...")
+
+    def _stop(self, signum, frame):
+        logger.info(f"Got signal {signum}, stopping the clusters")
+        self.stopping = True
+
+
+def plan(auth):
+    """The Workers [cluster] in auth.ini asks for"""
+    shard_count = auth.getint('cluster', 'SHARDS', fallback=0)
+    ranges = auth.get('cluster', 'RANGES', fallback='').strip()
+    if ranges:
+        if not shard_count:
+            raise SystemExit("[cluster] RANGES needs SHARDS, the total number of shards")
+        shard_ranges = [cluster.parse_shards(text) for text in ranges.split(';')]
+        assigned = [shard_id for shard_ids in shard_ranges for shard_id in shard_ids]
+        if len(assigned) != len(set(assigned)) or max(assigned) >= shard_count:
+            raise SystemExit(f"[cluster] RANGES {ranges} overlap or go past shard {shard_count - 1}")
+        if len(assigned) < shard_count:
+            logger.warning(f"Shards {cluster.format_shards(set(range(shard_count)) - set(assigned))} "
+                           f"are in no cluster, their guilds stay offline")
+    else:
+        clusters = auth.getint('cluster', 'CLUSTERS', fallback=1)
+        if clusters <= 1:
+            # One worker, main.py shards it by itself
+            return [Worker(0, 1)]
+        shard_count = shard_count or recommended_shards(auth.get('discord', 'TOKEN'))
+        shard_ranges = cluster.split_shards(shard_count, clusters)
+    return [Worker(index, len(shard_ranges), shard_ids, shard_count)
+            for index, shard_ids in enumerate(shard_ranges)]
+
+
+if __name__ == "__main__":
+    auth = ConfigParser()
+    auth.read('auth.ini')
+    supervisor = Supervisor(plan(auth),
+                            heartbeat_timeout=auth.getint('cluster', 'HEARTBEAT_TIMEOUT', fallback=60),
+                            start_timeout=auth.getint('cluster', 'START_TIMEOUT', fallback=300),
+                            restart_delay=auth.getfloat('cluster', 'RESTART_DELAY', fallback=5),
+                            max_restarts=auth.getint('cluster', 'MAX_RESTARTS', fallback=10),
+                            restart_window=auth.getint('cluster', 'RESTART_WINDOW', fallback=3600))
+    sys.exit(supervisor.run())
@@ -1,5 +1,10 @@
+# First, so the profiler's clock starts before the heavy imports
+from cogs.utils.profiler import StartupProfiler
+
+import asyncio
 import glob
 import json
+import math
 import os
 import re
 import time
@@ -8,13 +13,36 @@ from configparser import *
 from discord.ext import commands
 from loguru import logger
 
+from cogs.utils import cluster
+from cogs.utils.chat_formatting import box, pagify
 from cogs.utils.checks import is_bot_owner_check
+from cogs.utils.dataIO import dataIO
+from cogs.utils.lazyload import LazyExtensions, build_manifest
+from cogs.utils.loopmonitor import BUCKETS, LoopMonitor
+from cogs.utils.members import MemberResolver
+from cogs.utils.metrics import Metrics
+from cogs.utils.outbox import Outbox
+from cogs.utils.prefixes import PrefixResolver
+from cogs.utils.resttrace import RestTracer
+from cogs.utils.settings import Settings, default_path as settings_path
+from cogs.utils.snapshots import MessageCache
+from cogs.utils.sqlstore import SQLiteBackend
+from cogs.utils.webclient import WebClient
 
 #initiate logger test
-logger.add(f"file_{str(time.strftime('%Y%m%d-%H%M%S'))}.log", rotation="500 MB")
+log_name = f"cluster{cluster.current.index}_" if cluster.current.clustered else ""
+logger.add(f"file_{log_name}{str(time.strftime('%Y%m%d-%H%M%S'))}.log", rotation="500 MB")
 
 auth = ConfigParser()
 auth.read('auth.ini')  # All my usernames and passwords for the api
+dataIO.flush_interval = auth.getfloat('dataio', 'FLUSH_INTERVAL', fallback=dataIO.flush_interval)
+dataIO.max_workers = auth.getint('dataio', 'IO_THREADS', fallback=dataIO.max_workers)
+dataIO.set_codec(auth.get('dataio', 'CODEC', fallback='') or dataIO.codec)
+for pretty_file in auth.get('dataio', 'PRETTY_FILES', fallback='').split(','):
+    if pretty_file.strip():
+        dataIO.set_codec('pretty', pretty_file.strip())
+profiler = StartupProfiler(trace_memory=auth.getboolean('profiler', 'TRACEMALLOC', fallback=True))
+profiler.mark('imports')
 
 def load_cogs(folder):
     os.chdir(folder)
@@ -29,8 +57,72 @@ def config():
     with open('config.json', 'r') as f:
         config = json.load(f)
         return config
+
+
+class Peribot(commands.AutoShardedBot):
+    """commands.AutoShardedBot that owns the HTTP client and message
+    outbox shared by the cogs, times every listener and tells the loop
+    monitor which listener every event task runs"""
+
+    def __init__(self, *args, web, monitor, metrics, outbox, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.web = web
+        self.monitor = monitor
+        self.metrics = metrics
+        self.outbox = outbox
+
+    def _schedule_event(self, coro, event_name, *args, **kwargs):
+        module = (getattr(coro, '__module__', '') or '').replace('cogs.', '')
+        listener = getattr(coro, '__qualname__', event_name)
+        coro = self.metrics.wrap_listener(coro, module, listener)
+        task = super()._schedule_event(coro, event_name, *args, **kwargs)
+        self.monitor.label(task, f"{module}:{listener}")
+        return task
+
+    async def close(self):
+        self.monitor.stop()
+        await self.outbox.close()
+        await self.metrics.stop()
+        await self.web.close()
+        await super().close()
+
+
 # bot_config = config()
-bot = commands.Bot(command_prefix=auth.get('discord', 'PREFIX'))
+# Shards of this process: the range launcher.py gave it, else all of them
+# ([cluster] SHARDS of them, 0 for as many as Discord recommends)
+shards = {}
+if cluster.current.shard_ids is not None:
+    shards = {'shard_ids': list(cluster.current.shard_ids), 'shard_count': cluster.current.shard_count}
+elif auth.getint('cluster', 'SHARDS', fallback=0):
+    shards = {'shard_count': auth.getint('cluster', 'SHARDS')}
+# Low memory mode: the gateway doesn't send offline members (the cogs get
+# them through the MemberResolver) and fewer messages are cached
+gateway = {}
+if auth.getboolean('gateway', 'LOW_MEMORY', fallback=False):
+    gateway = {'fetch_offline_members': False,
+               'max_messages': auth.getint('gateway', 'MAX_MESSAGES', fallback=100)}
+# Per guild prefixes, Settings is attached once we are in the cogs folder
+bot = Peribot(command_prefix=PrefixResolver(auth.get('discord', 'PREFIX')),
+              web=WebClient(limit=auth.getint('http', 'LIMIT', fallback=100),
+                            limit_per_host=auth.getint('http', 'LIMIT_PER_HOST', fallback=10),
+                            dns_ttl=auth.getint('http', 'DNS_TTL', fallback=300),
+                            keepalive=auth.getint('http', 'KEEPALIVE', fallback=30),
+                            timeout=auth.getint('http', 'TIMEOUT', fallback=15),
+                            sync_threads=auth.getint('http', 'SYNC_THREADS', fallback=4)),
+              monitor=LoopMonitor(interval=auth.getfloat('monitor', 'INTERVAL', fallback=0.5),
+                                  window=auth.getint('monitor', 'WINDOW', fallback=7200),
+                                  slow_callback=auth.getfloat('monitor', 'SLOW_CALLBACK_MS', fallback=0) / 1000),
+              metrics=Metrics(),
+              outbox=Outbox(concurrency=auth.getint('outbox', 'CONCURRENCY', fallback=8),
+                            max_pending=auth.getint('outbox', 'MAX_PENDING', fallback=50)),
+              **gateway, **shards)
+bot.members = MemberResolver(bot, size=auth.getint('gateway', 'MEMBER_CACHE', fallback=2048),
+                             miss_ttl=auth.getint('gateway', 'MISS_TTL', fallback=600))
+# Messages modlog logs edits and deletes of, see MessageCache
+bot.snapshots = MessageCache(budget=auth.getint('modlog', 'MESSAGE_CACHE_MB', fallback=32) * 1024 * 1024,
+                             guild_budget=auth.getint('modlog', 'GUILD_MESSAGE_CACHE_MB', fallback=4) * 1024 * 1024)
+lazy = LazyExtensions(bot, profiler=profiler)
+tracer = RestTracer()
 
 @bot.event
 async def on_ready():
@@ -38,14 +130,45 @@ async def on_ready():
     When bot is ready and online it prints that its online
     :return:
     """
-    logger.debug("Bot is ready!")
+    if not profiler.is_ready:
+        profiler.ready()
+        dataIO.save_json(cluster.current.path('data/startup.json'), profiler.report())
+        logger.debug(f"Ready {profiler.phases['ready']:.0f} ms after start")
+    logger.debug(f"Bot is ready! ({cluster.current})")
+
+
+async def report_status(filename, interval):
+    """Tells launcher.py how this worker is doing, see Supervisor"""
+    while True:
+        latencies = {shard_id: None if math.isnan(latency) else round(latency * 1000)
+                     for shard_id, latency in bot.latencies}
+        cluster.write_status(filename, {'cluster': cluster.current.index, 'pid': os.getpid(),
+                                        'time': time.time(), 'ready': bot.is_ready(),
+                                        'guilds': len(bot.guilds), 'latency_ms': latencies,
+                                        'lag_p95_ms': round(bot.monitor.percentiles(95)[0], 1)})
+        await asyncio.sleep(interval)
+
+
+@bot.before_invoke
+async def before_command(ctx):
+    # Slow steps of this task are now the command's fault
+    cog = ctx.cog.qualified_name if ctx.cog else 'main'
+    bot.monitor.label_current(f"{cog}:{ctx.command.qualified_name}")
+    ctx.invoked_at = time.perf_counter()
+
+
+@bot.after_invoke
+async def after_command(ctx):
+    cog = ctx.cog.qualified_name if ctx.cog else 'main'
+    bot.metrics.observe_command(cog, ctx.command.qualified_name,
+                                time.perf_counter() - ctx.invoked_at, ctx.command_failed)
 
 
 @bot.command()
 @is_bot_owner_check()
 async def load(ctx, extension):
     try:
-        bot.load_extension('cogs.' + extension)
+        lazy.load(extension)
         logger.debug(f'Loaded {extension}')
         await ctx.send(f'Loaded {extension}')
     except Exception as error:
@@ -56,8 +179,9 @@ async def load(ctx, extension):
 @is_bot_owner_check()
 async def reload(ctx, extension):
     try:
-        bot.unload_extension('cogs.' + extension)
-        bot.load_extension('cogs.' + extension)
+        if not lazy.is_pending(extension):
+            bot.unload_extension('cogs.' + extension)
+        lazy.load(extension)
         logger.debug(f'Reloaded {extension}')
         await ctx.send(f'Reloaded {extension}')
     except Exception as error:
@@ -75,14 +199,119 @@ async def unload(ctx, extension):
         logger.exception(f"Extension {extension} could not be unloaded. [{error}]")
 
 
+@bot.command()
+@is_bot_owner_check()
+async def startup(ctx, count: int = 10):
+    """Shows what the extensions cost to load, slowest first"""
+    phases = ", ".join(f"{phase} {ms:.0f}" for phase, ms in profiler.phases.items())
+    lines = [f"Since start (ms): {phases}", "",
+             f"{'extension':<16}{'wall':>9}{'import':>9}{'setup':>9}{'KB':>9}{'mods':>6}"]
+    for name, entry in profiler.slowest(count):
+        if entry['error']:
+            lines.append(f"{name:<16} failed: {entry['error']}")
+            continue
+        memory = "-" if entry['memory_kb'] is None else f"{entry['memory_kb']:.0f}"
+        lines.append(f"{name:<16}{entry['wall_ms']:>9.1f}{entry['import_ms']:>9.1f}"
+                     f"{entry['setup_ms']:>9.1f}{memory:>9}{entry['modules']:>6}")
+    await ctx.send(box("\n".join(lines)))
+
+
+@bot.command()
+@is_bot_owner_check()
+async def looplag(ctx):
+    """Shows the event loop lag histogram and what blocked the loop"""
+    monitor = bot.monitor
+    p50, p95, p99 = monitor.percentiles(50, 95, 99)
+    lines = [f"Lag over {len(monitor.samples)} samples: p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms", ""]
+    for bound, count in monitor.histogram():
+        label = f"<= {bound} ms" if bound is not None else f"> {BUCKETS[-1]} ms"
+        lines.append(f"{label:>12} {count:>6}")
+    if not monitor.slow_callback:
+        lines += ["", "Slow callbacks aren't reported, see SLOW_CALLBACK_MS in auth.ini"]
+        await ctx.send(box("\n".join(lines)))
+        return
+    lines += ["", f"{'slow callbacks':<40}{'count':>6}{'total':>9}{'worst':>8}"]
+    for label, (count, total, worst) in monitor.worst():
+        lines.append(f"{label[:39]:<40}{count:>6}{total * 1000:>9.0f}{worst * 1000:>8.0f}")
+    await ctx.send(box("\n".join(lines)))
+
+
+@bot.command()
+@is_bot_owner_check()
+async def resttrace(ctx, cog=None):
+    """Shows the Discord API routes that cost the most, per cog"""
+    lines = [f"{'cog':<14}{'calls':>7}{'bucket wait s':>15}"]
+    for name, (calls, wait) in list(tracer.by_cog().items())[:10]:
+        lines.append(f"{name:<14}{calls:>7}{wait:>15.1f}")
+    lines += ["", f"{'cog':<14}{'route':<44}{'calls':>7}{'429s':>6}{'avg ms':>8}{'wait s':>8}"]
+    for (name, route), stats in tracer.worst(cog):
+        lines.append(f"{name:<14}{route[:43]:<44}{stats.calls:>7}{stats.retries:>6}"
+                     f"{stats.latency / stats.calls * 1000:>8.0f}{stats.wait:>8.1f}")
+    for page in pagify("\n".join(lines)):
+        await ctx.send(box(page))
+
+
+@bot.command(name='cluster')
+@is_bot_owner_check()
+async def cluster_health(ctx):
+    """Shows the health of every cluster, as launcher.py last saw it"""
+    health = cluster.read_status('data/cluster/health.json')
+    if health is None:
+        return await ctx.send(f"Not running under the launcher, {cluster.current}")
+    lines = [f"{health['shard_count']} shards in {len(health['clusters'])} clusters, "
+             f"{health['guilds']} guilds", "",
+             f"{'cluster':<8}{'shards':<12}{'state':<12}{'pid':>8}{'guilds':>8}{'ms':>6}{'lag p95':>9}{'restarts':>10}"]
+    for entry in health['clusters']:
+        latency = "-" if entry['latency_ms'] is None else entry['latency_ms']
+        lag = "-" if entry['lag_p95_ms'] is None else entry['lag_p95_ms']
+        lines.append(f"{entry['cluster']:<8}{entry['shards']:<12}{entry['state']:<12}{entry['pid'] or '-':>8}"
+                     f"{entry['guilds']:>8}{latency:>6}{lag:>9}{entry['restarts']:>10}")
+    await ctx.send(box("\n".join(lines)))
+
+
+@bot.command()
+@commands.guild_only()
+@commands.has_permissions(administrator=True)
+async def prefix(ctx, *prefixes):
+    """Sets the command prefixes of this server, none resets them to the default"""
+    bot.command_prefix.set_prefixes(ctx.guild, prefixes)
+    current = " ".join(bot.command_prefix.for_guild(ctx.guild))
+    await ctx.send(f'Prefixes for this server: {current}')
+
+
 if __name__ == "__main__":
     bot.remove_command('help')
     extensions = load_cogs('cogs')
-    for extension in extensions:
-        try:
-            bot.load_extension('cogs.'+extension)
-            logger.debug(f'Loaded {extension} cog.')
-        except Exception as error:
-            logger.exception(f"Extension {extension} could not be loaded. [{error}]")
+    if auth.get('dataio', 'BACKEND', fallback='json') == 'sqlite':
+        dataIO.use_backend(SQLiteBackend(auth.get('dataio', 'DATABASE', fallback='data/peribot.db')))
+    # Every cluster keeps its own settings, starting from the primary's
+    own_settings = cluster.current.path(settings_path)
+    if own_settings != settings_path and not dataIO.is_valid_json(own_settings) \
+            and dataIO.is_valid_json(settings_path):
+        dataIO.save_json(own_settings, dataIO.load_json(settings_path))
+    bot.command_prefix.settings = Settings(path=own_settings, parse_args=False)
+    if auth.getboolean('cogs', 'LAZY', fallback=False):
+        # Only stubs for now, a cog is imported when it is first needed
+        lazy.install(build_manifest('.', extensions, cluster.current.path('manifest.json')))
+    else:
+        for extension in extensions:
+            try:
+                profiler.load_extension(bot, 'cogs.'+extension)
+                logger.debug(f'Loaded {extension} cog.')
+            except Exception as error:
+                logger.exception(f"Extension {extension} could not be loaded. [{error}]")
+    profiler.mark('extensions')
     logger.info(str(bot.guilds) + "Peribot is apart of")
-    bot.run(auth.get('discord', 'TOKEN'))
+    bot.monitor.install(bot.loop)
+    tracer.install(bot.http)
+    if auth.getint('metrics', 'PORT', fallback=0):
+        # One port per cluster, counting up from PORT
+        bot.loop.create_task(bot.metrics.serve(auth.get('metrics', 'HOST', fallback='127.0.0.1'),
+                                               auth.getint('metrics', 'PORT') + cluster.current.index))
+    if os.environ.get(cluster.ENV_STATUS):
+        bot.loop.create_task(report_status(os.environ[cluster.ENV_STATUS],
+                                           auth.getfloat('cluster', 'HEARTBEAT_INTERVAL', fallback=5)))
+    try:
+        bot.run(auth.get('discord', 'TOKEN'))
+    finally:
+        dataIO.flush()
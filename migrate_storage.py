@@ -0,0 +1,15 @@
+import os
+from configparser import ConfigParser
+
+from cogs.utils.sqlstore import SQLiteBackend, import_json_files
+
+# One-shot import of every cog json file into the SQLite storage backend.
+# Afterwards set BACKEND=sqlite in the [dataio] section of auth.ini.
+if __name__ == '__main__':
+    auth = ConfigParser()
+    auth.read('auth.ini')
+    os.chdir('cogs')  # data paths are relative to the cogs folder, like in main.py
+    backend = SQLiteBackend(auth.get('dataio', 'DATABASE', fallback='data/peribot.db'))
+    for filename in import_json_files(backend):
+        print("Imported " + filename)
+    backend.close()
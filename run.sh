@@ -8,21 +8,5 @@
 #  | $$     |  $$$$$$$| $$      | $$| $$$$$$$/|  $$$$$$/  |  $$$$/
 #  |__/      \_______/|__/      |__/|_______/  \______/    \___/
 
-FAILS=0
-
-while true
-do
-  sleep 0.5
-  python3 main.py # your program
-  EXIT=$?
-  ((FAILS++))
-
-  if [[ $FAILS -gt 10 ]]
-  then
-    echo "[$(date)] failed to many times. aborting ..."
-    exit 1
-  fi
-
-  echo "[$(date)] bot exited with code $EXIT. restarting ..."
-
-done
\ No newline at end of file
+# launcher.py restarts the bot when it crashes or hangs, see Supervisor
+python3 launcher.py
@@ -1,8 +1,3 @@
 # /bin/sh
-while true
-do
 echo Starting Bot
-python3 main.py
-echo Restarting Bot in 5 Seconds...
-sleep 5
-done
+python3 launcher.py
@@ -0,0 +1,20 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# The cogs are imported the way main.py does, as the cogs package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    # Back to a policy that makes a new loop for whoever asks next
+    asyncio.set_event_loop_policy(None)
@@ -0,0 +1,58 @@
+import json
+import os
+
+import pytest
+
+from cogs.utils.corpus import Corpus, InvalidCorpus
+
+
+def test_empty_file_is_an_empty_corpus(tmp_path):
+    filename = tmp_path / "quotes.json"
+    filename.write_bytes(b"")
+    corpus = Corpus(str(filename))
+    assert len(corpus) == 0
+    with pytest.raises(IndexError):
+        corpus.choice()
+
+    filename.write_text('["Clod!"]')
+    assert list(corpus) == ["Clod!"]
+
+
+def test_entries_are_read_by_offset(tmp_path):
+    filename = tmp_path / "compliments.json"
+    filename.write_text(json.dumps({"other": [1, {"a": "]"}], "compliments": ["You're \"smart\"", "Nice ✦"]},
+                                   indent=4, ensure_ascii=False), encoding="utf-8")
+    corpus = Corpus(str(filename), key="compliments")
+    assert len(corpus) == 2
+    assert corpus[0] == 'You\'re "smart"' and corpus[-1] == "Nice ✦"
+    assert corpus.choice() in list(corpus)
+    with pytest.raises(IndexError):
+        corpus[2]
+
+
+def test_index_is_cached_and_rebuilt_when_the_file_changes(tmp_path, monkeypatch):
+    filename = tmp_path / "quotes.json"
+    filename.write_text('["Clod!", "Pebble"]')
+    builds = []
+    build_index = Corpus._build_index
+    monkeypatch.setattr(Corpus, "_build_index", lambda self: builds.append(1) or build_index(self))
+
+    assert list(Corpus(str(filename))) == ["Clod!", "Pebble"]
+    # A new Corpus (a reloaded cog) reads the .idx instead
+    corpus = Corpus(str(filename))
+    assert len(corpus) == 2 and len(builds) == 1
+
+    filename.write_text('["Clod!", "Pebble", "Nyeh"]')
+    stat = os.stat(str(filename))
+    os.utime(str(filename), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert corpus[2] == "Nyeh" and len(builds) == 2
+    assert len(Corpus(str(filename))) == 3 and len(builds) == 2
+
+
+def test_invalid_corpus_is_refused(tmp_path):
+    filename = tmp_path / "quotes.json"
+    filename.write_text('["Clod!", 5]')
+    with pytest.raises(InvalidCorpus):
+        len(Corpus(str(filename)))
+    with pytest.raises(InvalidCorpus):
+        len(Corpus(str(filename), key="quotes"))
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from cogs.utils import dataIO
+from cogs.utils.dataIO import CODECS, Codec, DataIO
+
+
+def test_asave_json_encodes_in_the_pool(loop, tmp_path, monkeypatch):
+    threads = []
+
+    def encode(data):
+        threads.append(threading.current_thread())
+        return CODECS["compact"].encode(data)
+
+    monkeypatch.setitem(CODECS, "recording", Codec(encode, True))
+    io = DataIO()
+    io.set_codec("recording")
+    filename = str(tmp_path / "settings.json")
+
+    assert loop.run_until_complete(io.asave_json(filename, {"guild": {"channel": 42}}))
+    assert threads and threading.main_thread() not in threads
+    assert io.load_json(filename) == {"guild": {"channel": 42}}
+
+
+def test_deferred_save_during_update_is_not_lost(loop, tmp_path):
+    io = DataIO()
+    io.flush_interval = 0
+    filename = str(tmp_path / "settings.json")
+    io.save_json(filename, {"users": [1]})
+
+    async def run():
+        update = asyncio.ensure_future(io.update(filename, lambda data: data["users"].append(3)))
+        # update holds the lock and is reading the file
+        await asyncio.sleep(0)
+        io.save_json(filename, {"users": [1, 2]}, defer=True)
+        await update
+        await asyncio.sleep(0.05)
+
+    loop.run_until_complete(run())
+    assert io.load_json(filename) == {"users": [1, 2, 3]}
+
+
+def test_save_during_update_is_written_after_it(loop, tmp_path):
+    io = DataIO()
+    filename = str(tmp_path / "settings.json")
+    io.save_json(filename, {"users": [1]})
+
+    def change(data):
+        data["users"].append(3)
+        # A plain save from a callback while the update holds the lock
+        io.save_json(filename, {"users": [4]})
+
+    async def run():
+        await io.update(filename, change)
+        await asyncio.sleep(0.05)
+
+    loop.run_until_complete(run())
+    assert io.load_json(filename) == {"users": [4]}
+    assert not io._dirty
+
+
+def test_deferred_saves_are_coalesced(loop, tmp_path, monkeypatch):
+    io = DataIO()
+    io.flush_interval = 0.01
+    filename = str(tmp_path / "settings.json")
+    writes = []
+    write_atomic = io._write_atomic
+    monkeypatch.setattr(io, "_write_atomic",
+                        lambda *args: writes.append(args[0]) or write_atomic(*args))
+
+    async def run():
+        for count in range(10):
+            io.save_json(filename, {"count": count}, defer=True)
+        assert writes == []
+        # Readers see the pending data
+        assert io.is_valid_json(filename) and writes == [filename]
+        io.save_json(filename, {"count": 10}, defer=True)
+        await asyncio.sleep(0.05)
+
+    loop.run_until_complete(run())
+    assert writes == [filename, filename]
+    assert io.load_json(filename) == {"count": 10}
+
+
+def test_flush_writes_pending_saves_and_remove_drops_them(loop, tmp_path):
+    io = DataIO()
+    kept, removed = str(tmp_path / "kept.json"), str(tmp_path / "removed.json")
+    io.save_json(kept, {"kept": True}, defer=True)
+    io.save_json(removed, {"kept": False}, defer=True)
+    io.remove_json(removed)
+    assert io.flush()
+    assert io.load_json(kept) == {"kept": True}
+    assert not io.is_valid_json(removed)
+
+
+def test_loads_are_cached_until_the_file_changes(tmp_path, monkeypatch):
+    io = DataIO()
+    filename = str(tmp_path / "settings.json")
+    io.save_json(filename, {"users": [1]})
+    reads = []
+    monkeypatch.setattr(dataIO, "open", lambda *args, **kwargs: reads.append(args[0]) or open(*args, **kwargs),
+                        raising=False)
+
+    copy = io.load_json(filename)
+    copy["users"].append(2)
+    assert io.load_json(filename) == {"users": [1]}
+    frozen = io.load_json(filename, frozen=True)
+    assert io.load_json(filename, frozen=True) is frozen
+    with pytest.raises(TypeError):
+        frozen["users"] = []
+    assert frozen["users"] == (1,)
+
+    # Changed behind DataIO's back
+    with open(filename, "w") as f:
+        json.dump({"users": [1, 2, 3]}, f)
+    assert io.load_json(filename) == {"users": [1, 2, 3]}
+    assert io.load_json(filename, frozen=True)["users"] == (1, 2, 3)
+    # What save_json wrote was cached, only the outside change was read
+    assert reads == [filename]
+
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+def test_codecs_write_json_every_codec_reads(tmp_path, codec):
+    io = DataIO()
+    io.set_codec(codec)
+    filename = str(tmp_path / "settings.json")
+    data = {"guild": {"name": "Homeworld ✦", "users": [1, 2], "active": True, "ratio": 0.5}}
+    io.save_json(filename, data)
+    with open(filename, encoding="utf-8") as f:
+        assert json.load(f) == data
+    assert DataIO().load_json(filename) == data
+
+
+def test_codec_per_folder_and_unknown_codec(tmp_path):
+    io = DataIO()
+    io.set_codec("pretty", str(tmp_path))
+    filename = str(tmp_path / "settings.json")
+    io.save_json(filename, {"channel": 42})
+    with open(filename, encoding="utf-8") as f:
+        assert f.read().startswith("{\n    ")
+    with pytest.raises(dataIO.InvalidFileIO):
+        io.set_codec("yaml")
+
+
+def test_unchanged_data_is_not_written_again(tmp_path, monkeypatch):
+    io = DataIO()
+    filename = str(tmp_path / "settings.json")
+    writes = []
+    mkstemp = dataIO.tempfile.mkstemp
+    monkeypatch.setattr(dataIO.tempfile, "mkstemp", lambda **kwargs: writes.append(1) or mkstemp(**kwargs))
+
+    assert io.save_json(filename, {"channel": 42})
+    assert io.save_json(filename, {"channel": 42})
+    assert len(writes) == 1
+    assert io.save_json(filename, {"channel": 43})
+    assert len(writes) == 2
+    assert io.load_json(filename) == {"channel": 43}
+
+
+def test_concurrent_updates_are_all_applied(loop, tmp_path):
+    io = DataIO()
+    filename = str(tmp_path / "counter.json")
+
+    def increment(data):
+        data["count"] += 1
+        return data["count"]
+
+    async def run():
+        with pytest.raises(FileNotFoundError):
+            await io.update(filename, increment)
+        results = await asyncio.gather(*(io.update(filename, increment, default={"count": 0})
+                                         for _ in range(20)))
+        assert sorted(results) == list(range(1, 21))
+
+    loop.run_until_complete(run())
+    assert io.load_json(filename) == {"count": 20}
+
+
+def test_awaitable_saves_land_in_order(loop, tmp_path):
+    io = DataIO()
+    filename = str(tmp_path / "settings.json")
+
+    async def run():
+        await asyncio.gather(*(io.asave_json(filename, {"count": count}) for count in range(20)))
+
+    loop.run_until_complete(run())
+    assert io.load_json(filename) == {"count": 19}
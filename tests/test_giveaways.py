@@ -0,0 +1,31 @@
+import os
+import time
+
+from cogs import giveaways
+from cogs.utils.dataIO import GuildStore
+
+
+def log_size(store, guild_id):
+    log_file = store.path(guild_id) + ".log"
+    return os.path.getsize(log_file) if os.path.exists(log_file) else 0
+
+
+def test_countdown_only_writes_when_a_giveaway_ends(loop, tmp_path):
+    cog = giveaways.Giveaways.__new__(giveaways.Giveaways)
+    cog.settings = GuildStore(str(tmp_path / "guilds"), journal=True)
+    journal = cog.settings.journal("1")
+    running = {"name": "Gem", "length": 3600, "entries": 0, "users": [], "started": True,
+               "ends_at": time.time() + 3600}
+    journal.set(["10"], running)
+    journal.set(["11"], dict(running, name="Pearl", ends_at=time.time() - 1))
+    journal.compact()
+
+    loop.run_until_complete(cog.countdown.coro(cog))
+    written = log_size(cog.settings, "1")
+    assert written > 0
+    assert not cog.settings["1"]["11"]["started"]
+    for _ in range(3):
+        loop.run_until_complete(cog.countdown.coro(cog))
+    # Running giveaways don't touch the journal
+    assert log_size(cog.settings, "1") == written
+    assert 3590 < cog.time_left(cog.settings["1"]["10"]) <= 3600
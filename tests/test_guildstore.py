@@ -0,0 +1,49 @@
+import json
+import os
+
+from cogs.utils.dataIO import GuildStore, dataIO
+
+
+def test_legacy_file_is_split_per_guild(tmp_path):
+    legacy = str(tmp_path / "settings.json")
+    with open(legacy, "w") as f:
+        json.dump({"1": {"channel": 10}, "2": {"channel": 20}}, f)
+    folder = str(tmp_path / "guilds")
+
+    store = GuildStore(folder, legacy)
+    assert sorted(store) == ["1", "2"] and 1 in store and 3 not in store
+    assert store[1] == {"channel": 10}
+    assert sorted(os.listdir(folder)) == ["1.json", "2.json"]
+    assert not os.path.exists(legacy) and os.path.exists(legacy + ".sharded")
+
+    # Only the guild that is used is read
+    store = GuildStore(folder, legacy)
+    assert store.get(2) == {"channel": 20}
+    assert list(store._loaded) == ["2"]
+
+
+def test_guild_documents_are_saved_and_deleted(tmp_path):
+    folder = str(tmp_path / "guilds")
+    store = GuildStore(folder)
+    store.save(1, {"channel": 10})
+    store[1]["channel"] = 11
+    store.save(1)
+    store.save(2, {"channel": 20})
+    store.delete(2)
+
+    store = GuildStore(folder)
+    assert list(store) == ["1"] and store[1] == {"channel": 11}
+    assert store.get(2) is None
+    assert not dataIO.is_valid_json(store.path(2))
+
+
+def test_journal_mode_keeps_a_journal_per_guild(tmp_path):
+    folder = str(tmp_path / "guilds")
+    store = GuildStore(folder, journal=True)
+    store.journal(1).set(["channel"], 10)
+    store.journal(2).add(["users"], 5)
+    assert os.path.exists(store.path(1) + ".log")
+
+    store = GuildStore(folder, journal=True)
+    assert sorted(store) == ["1", "2"]
+    assert store[1] == {"channel": 10} and store[2] == {"users": [5]}
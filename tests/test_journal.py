@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from cogs.utils.dataIO import Journal
+
+
+def write_log(filename, text):
+    with open(filename + ".log", "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_torn_first_record_does_not_swallow_later_ones(tmp_path):
+    filename = str(tmp_path / "settings.json")
+    Journal(filename, {"guild": {}})
+    # A crash tore the first record of the log, the snapshot is fine
+    write_log(filename, '{"op": "set", "path": ["gui')
+
+    journal = Journal(filename)
+    journal.set(["guild", "channel"], 42)
+
+    assert Journal(filename).data == {"guild": {"channel": 42}}
+
+
+def test_record_glued_to_a_torn_one_is_replayed(tmp_path):
+    filename = str(tmp_path / "settings.json")
+    Journal(filename, {"guild": {}})
+    # What an append after an unrepaired torn record left behind
+    records = [{"op": "set", "path": ["guild", "channel"], "value": 42},
+               {"op": "add", "path": ["guild", "users"], "value": 1}]
+    write_log(filename, '{"op": "set", "pa' + "".join(json.dumps(record) + "\n" for record in records))
+
+    assert Journal(filename).data == {"guild": {"channel": 42, "users": [1]}}
+    # Compacted on load, the torn record is gone for good
+    assert not os.path.exists(filename + ".log")
+
+
+def test_journal_holds_no_file_open(tmp_path):
+    filename = str(tmp_path / "settings.json")
+    journal = Journal(filename, max_log_size=200)
+    for value in range(20):
+        journal.set(["guild", "value"], value)
+    assert not [f for f in os.listdir("/proc/self/fd")
+                if os.path.realpath(os.path.join("/proc/self/fd", f)).startswith(str(tmp_path))]
+    assert Journal(filename).data == {"guild": {"value": 19}}
+
+
+def test_log_replayed_twice_gives_the_same_data(tmp_path):
+    filename = str(tmp_path / "settings.json")
+    journal = Journal(filename, {"messages": [], "users": {}})
+    journal.set(["messages", {"id": 1}], {"id": 1, "count": 1})
+    journal.set(["messages", {"id": 2}], {"id": 2, "count": 5})
+    journal.set(["messages", {"id": 3}], {"id": 3, "count": 2})
+    journal.delete(["messages", {"id": 1}])
+    journal.add(["users", "1"], 7)
+    journal.discard(["users", "1"], 7)
+    journal.add(["users", "1"], 8)
+    journal.set(["users", "2"], [1])
+    journal.delete(["users", "2"])
+    once = json.loads(json.dumps(journal.data))
+    with open(filename + ".log", encoding="utf-8") as f:
+        log = f.read()
+
+    # A crash after the snapshot was written, before the log was dropped
+    journal.compact()
+    write_log(filename, log)
+    assert Journal(filename).data == once
+    write_log(filename, log + log)
+    assert Journal(filename).data == once
+
+
+def test_delete_by_list_index_is_refused(tmp_path):
+    journal = Journal(str(tmp_path / "settings.json"), {"messages": [1, 2, 3]})
+    with pytest.raises(ValueError):
+        journal.delete(["messages", 0])
+    assert journal.data == {"messages": [1, 2, 3]}
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+import sys
+import textwrap
+from types import SimpleNamespace
+
+import pytest
+from discord.ext import commands
+
+from cogs.utils import lazyload
+from cogs.utils.lazyload import LazyExtensions, build_manifest
+
+COG = textwrap.dedent('''
+    from discord.ext import commands
+
+    SEEN = []
+
+
+    class Greeter(commands.Cog):
+        @commands.command(name="hello", aliases=["hi"])
+        async def hello_command(self, ctx):
+            SEEN.append("hello")
+
+        @commands.Cog.listener()
+        async def on_member_join(self, member):
+            SEEN.append(member)
+
+
+    def setup(bot):
+        bot.add_cog(Greeter())
+''')
+
+TASK_COG = textwrap.dedent('''
+    from discord.ext import commands, tasks
+
+
+    class Ticker(commands.Cog):
+        @tasks.loop(seconds=60)
+        async def tick(self):
+            pass
+
+
+    def setup(bot):
+        bot.add_cog(Ticker())
+''')
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    folder = tmp_path / "lazycogs"
+    folder.mkdir()
+    (folder / "__init__.py").write_text("")
+    (folder / "greeter.py").write_text(COG)
+    (folder / "ticker.py").write_text(TASK_COG)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield folder
+    for name in [name for name in sys.modules if name.startswith("lazycogs")]:
+        del sys.modules[name]
+
+
+def test_manifest_describes_cogs_without_importing_them(package, monkeypatch):
+    manifest_file = str(package / "manifest.json")
+    manifest = build_manifest(str(package), ["greeter", "ticker"], manifest_file)
+    greeter, ticker = manifest["extensions"]["greeter"], manifest["extensions"]["ticker"]
+    assert greeter["commands"] == [["hello", ["hi"]]]
+    assert greeter["events"] == ["on_member_join"] and not greeter["eager"]
+    assert ticker["eager"]
+    assert "lazycogs.greeter" not in sys.modules
+    with open(manifest_file) as f:
+        assert json.load(f) == manifest
+
+    # Unchanged files aren't parsed again
+    parsed = []
+    parse = lazyload.ast.parse
+    monkeypatch.setattr(lazyload.ast, "parse", lambda *args: parsed.append(args[1]) or parse(*args))
+    (package / "greeter.py").write_text(COG.replace('"hello"', '"howdy"'))
+    stat = os.stat(str(package / "greeter.py"))
+    os.utime(str(package / "greeter.py"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    manifest = build_manifest(str(package), ["greeter", "ticker"], manifest_file)
+    assert parsed == [str(package / "greeter.py")]
+    assert manifest["extensions"]["greeter"]["commands"] == [["howdy", ["hi"]]]
+
+
+def test_cog_is_loaded_by_its_first_command_or_event(loop, package):
+    bot = commands.Bot(command_prefix="!", loop=loop)
+    lazy = LazyExtensions(bot, package="lazycogs")
+    lazy.install(build_manifest(str(package), ["greeter"], str(package / "manifest.json")))
+    assert lazy.is_pending("greeter") and "lazycogs.greeter" not in sys.modules
+    stub = bot.get_command("hi")
+    assert stub.name == "hello" and stub.hidden
+
+    invoked = []
+
+    async def get_context(message):
+        return SimpleNamespace(message=message, command=bot.get_command("hello"))
+
+    async def invoke(ctx):
+        invoked.append(ctx.command)
+
+    bot.get_context, bot.invoke = get_context, invoke
+    loop.run_until_complete(stub.callback(SimpleNamespace(message="!hi")))
+    assert not lazy.is_pending("greeter")
+    assert invoked == [bot.get_command("hello")] and invoked[0] is not stub
+
+    # The event stub went away with the commands, the cog's listener is live
+    bot.dispatch("member_join", "Connie")
+    loop.run_until_complete(asyncio.sleep(0.01))
+    assert sys.modules["lazycogs.greeter"].SEEN == ["Connie"]
+
+
+def test_event_hands_itself_to_the_cog_it_loaded(loop, package):
+    bot = commands.Bot(command_prefix="!", loop=loop)
+    lazy = LazyExtensions(bot, package="lazycogs")
+    lazy.install(build_manifest(str(package), ["greeter", "ticker"], str(package / "manifest.json")))
+    # Eager cogs are loaded right away
+    assert "lazycogs.ticker" in sys.modules and lazy.is_pending("greeter")
+
+    bot.dispatch("member_join", "Steven")
+    loop.run_until_complete(asyncio.sleep(0.01))
+    assert not lazy.is_pending("greeter")
+    assert sys.modules["lazycogs.greeter"].SEEN == ["Steven"]
+    assert "on_member_join" not in lazy._events
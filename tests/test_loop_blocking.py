@@ -0,0 +1,188 @@
+"""The content commands must not block the event loop on the network
+
+Every remote call is stubbed to take DELAY seconds: the aiohttp session
+of the bot's WebClient answers after an asyncio.sleep, while the blocking
+clients the cogs used to call (requests, urllib, tmdbv3api) time.sleep.
+A handler that does its I/O the async way, or through WebClient.run_sync,
+keeps the loop's scheduling lag under THRESHOLD; one that goes back to a
+blocking call stalls the loop for DELAY and fails.
+"""
+import asyncio
+import json
+import time
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+from discord.ext import commands
+
+from cogs import cursedpearl, fun, hiatus, kindness, urban, xkcd
+from cogs.utils.webclient import WebClient
+
+DELAY = 0.3
+THRESHOLD = 0.1
+
+RESPONSES = {
+    "xkcd.com": {"title": "Compiling", "alt": "alt", "img": "https://imgs.xkcd.com/c.png", "num": 303},
+    "urbandictionary.com": {"list": [{"definition": "a word", "example": "like this"}]},
+    "giphy.com": {"meta": {"status": 200},
+                  "data": [{"images": {"fixed_height_downsampled": {"url": "https://giphy.com/g.gif"}}}]},
+    "conversationstarters.com": '<div id="random">What is your favourite gem?</div>',
+}
+
+
+class FakeResponse():
+    def __init__(self, body, status=200):
+        self.status = status
+        self.body = body
+
+    async def __aenter__(self):
+        await asyncio.sleep(DELAY)
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self, content_type=None):
+        if isinstance(self.body, str):
+            return json.loads(self.body)
+        return self.body
+
+    async def text(self):
+        return self.body
+
+
+class FakeSession():
+    closed = False
+    # Set to answer every request with an error page instead
+    error = None
+
+    def get(self, url, **kwargs):
+        if self.error is not None:
+            return FakeResponse("<html>Not Found</html>", self.error)
+        for host, body in RESPONSES.items():
+            if host in url:
+                return FakeResponse(body)
+        raise AssertionError(f"Unexpected request to {url}")
+
+    async def close(self):
+        pass
+
+
+class FakeSeason():
+    """tmdbv3api's Season, with three seasons and a blocking round trip"""
+
+    def details(self, show_id, season_number):
+        time.sleep(DELAY / 2)
+        if season_number > 3:
+            return SimpleNamespace(entries={"status_code": 34})
+        episode = {"air_date": "2019-03-29", "season_number": season_number, "name": "Change Your Mind"}
+        return SimpleNamespace(entries={"episodes": [episode]})
+
+
+def blocking_call(*args, **kwargs):
+    time.sleep(DELAY)
+    raise AssertionError("Blocking network call from a command handler")
+
+
+class FakeContext():
+    def __init__(self, guild_id=0):
+        self.author = SimpleNamespace(name="Steven", id=1)
+        self.guild = SimpleNamespace(id=guild_id)
+        self.sent = []
+        self.channel = SimpleNamespace(send=self.send)
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content or kwargs)
+
+
+@pytest.fixture
+def bot(loop, monkeypatch):
+    bot = commands.Bot(command_prefix="!", loop=loop)
+    bot.web = WebClient()
+    bot.web._session = FakeSession()
+    monkeypatch.setattr(urllib.request, "urlopen", blocking_call)
+    try:
+        import requests
+    except ImportError:
+        pass
+    else:
+        monkeypatch.setattr(requests, "get", blocking_call)
+    monkeypatch.setattr(hiatus, "Season", FakeSeason)
+    yield bot
+    loop.run_until_complete(bot.web.close())
+
+
+def max_lag(loop, coro, interval=0.005):
+    """Runs coro, returns the longest the loop was late for a callback meanwhile"""
+    lags = []
+    done = asyncio.Event()
+
+    async def sample():
+        while not done.is_set():
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lags.append(loop.time() - start - interval)
+
+    async def run():
+        sampler = loop.create_task(sample())
+        await asyncio.sleep(0)
+        try:
+            await coro
+        finally:
+            done.set()
+            await sampler
+
+    loop.run_until_complete(run())
+    return max(lags)
+
+
+def handlers(bot):
+    kindness_cog = kindness.Kindness(bot)
+    kindness_cog.kisses = SimpleNamespace(choice=lambda: "{kisser} kisses {victim}")
+    hiatus_cog = hiatus.Hiatus.__new__(hiatus.Hiatus)
+    hiatus_cog.bot = bot
+    xkcd_cog, urban_cog, fun_cog = xkcd.XKCD(bot), urban.Urban(bot), fun.Fun(bot)
+    pearl_cog = cursedpearl.CursedPearl(bot)
+    # command -> (guild the command is made for, handler)
+    return {
+        "xkcd": (0, lambda ctx: xkcd_cog.xkcd.callback(xkcd_cog, ctx)),
+        "xkcd number": (0, lambda ctx: xkcd_cog.xkcd.callback(xkcd_cog, ctx, 303)),
+        "urban": (0, lambda ctx: urban_cog.urban.callback(urban_cog, ctx, search_terms="gem")),
+        "topic": (0, lambda ctx: fun_cog.topic.callback(fun_cog, ctx)),
+        "kiss": (0, lambda ctx: kindness_cog.kiss.callback(kindness_cog, ctx, SimpleNamespace(name="Connie"))),
+        "peridot": (515370084538253333, lambda ctx: pearl_cog.peridot.callback(pearl_cog, ctx)),
+        "hiatus": (593887030216228973, lambda ctx: hiatus_cog.hiatus.callback(hiatus_cog, ctx)),
+    }
+
+
+@pytest.mark.parametrize("command", ["xkcd", "xkcd number", "urban", "topic", "kiss", "peridot", "hiatus"])
+def test_handler_does_not_block_the_loop(loop, bot, command):
+    guild_id, handler = handlers(bot)[command]
+    ctx = FakeContext(guild_id)
+    lag = max_lag(loop, handler(ctx))
+    assert lag < THRESHOLD, f"{command} blocked the event loop for {lag * 1000:.0f} ms"
+    # The handler got through its remote calls and answered
+    assert len(ctx.sent) == 1 and ctx.sent[0] != "Error."
+
+
+def test_blocking_handler_is_caught(loop, bot):
+    async def blocking(ctx):
+        await asyncio.sleep(0)
+        time.sleep(DELAY)
+
+    assert max_lag(loop, blocking(FakeContext())) >= THRESHOLD
+
+
+@pytest.mark.parametrize("command, status, answer", [
+    ("xkcd number", 404, "Could not find an XKCD with this ID!"),
+    ("xkcd", 503, "Couldn't reach XKCD right now, try again later."),
+    ("urban", 503, "Urban Dictionary isn't answering right now, try again later."),
+    ("topic", 503, "Couldn't get a topic right now, try again later."),
+])
+def test_handler_reports_an_error_response(loop, bot, command, status, answer):
+    bot.web._session.error = status
+    guild_id, handler = handlers(bot)[command]
+    ctx = FakeContext(guild_id)
+    loop.run_until_complete(handler(ctx))
+    assert ctx.sent == [answer]
@@ -0,0 +1,35 @@
+import sys
+
+from cogs.utils.loopmonitor import LoopMonitor
+
+
+def test_origin_tracking_stays_off_while_running(loop):
+    monitor = LoopMonitor(interval=0.01, slow_callback=0.1)
+    monitor.install(loop)
+
+    async def depth():
+        return sys.get_coroutine_origin_tracking_depth()
+
+    try:
+        assert loop.run_until_complete(depth()) == 0
+    finally:
+        monitor.stop()
+
+
+def test_debug_mode_is_opt_in(loop):
+    monitor = LoopMonitor(interval=0.01)
+    monitor.install(loop)
+    try:
+        assert not loop.get_debug()
+    finally:
+        monitor.stop()
+
+
+def test_offenders_are_keyed_by_callback():
+    monitor = LoopMonitor()
+    monitor.slow("<TimerHandle when=1234.5 Bot._ping() at bot.py:12>", 0.2)
+    monitor.slow("<TimerHandle when=1299.1 Bot._ping() at bot.py:12>", 0.3)
+    monitor.slow("<Handle <Callback object at 0x7f3a2c>() at x.py:3>", 0.2)
+    monitor.slow("<Handle <Callback object at 0x7f9b11>() at x.py:3>", 0.2)
+    assert monitor.offenders["Bot._ping"][0] == 2
+    assert len(monitor.offenders) == 2
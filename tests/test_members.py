@@ -0,0 +1,158 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+from discord.ext import commands
+
+from cogs.utils import members
+from cogs.utils.converters import GlobalUser
+from cogs.utils.members import MemberResolver
+
+
+class FakeBot():
+    def add_listener(self, listener):
+        pass
+
+
+class FakeMember():
+    def __init__(self, guild, user_id, name="Steven", nick=None):
+        self.guild = guild
+        self.id = user_id
+        self.name = name
+        self.nick = nick
+
+    def __str__(self):
+        return self.name + "#0001"
+
+
+class FakeResponse():
+    status = 404
+    reason = "Not Found"
+
+
+class FakeGuild():
+    def __init__(self, members=(), guild_id=1):
+        self.id = guild_id
+        self.members = set(members)
+        self.fetches = []
+        self.down = False
+
+    def get_member(self, user_id):
+        return None
+
+    def get_member_named(self, name):
+        return None
+
+    async def fetch_member(self, user_id):
+        self.fetches.append(user_id)
+        await asyncio.sleep(0)
+        if self.down:
+            raise discord.HTTPException(FakeResponse(), "Service Unavailable")
+        if user_id not in self.members:
+            raise discord.NotFound(FakeResponse(), "Unknown Member")
+        return FakeMember(self, user_id)
+
+
+def test_members_are_fetched_once_and_cached(loop):
+    guild = FakeGuild([1, 2, 3])
+    resolver = MemberResolver(FakeBot(), size=2)
+
+    async def run():
+        found = [await resolver.get(guild, user_id) for user_id in (1, 2, 1, 3, 1)]
+        assert [member.id for member in found] == [1, 2, 1, 3, 1]
+
+    loop.run_until_complete(run())
+    # 2 was the least recently used member when 3 came in
+    assert guild.fetches == [1, 2, 3]
+    assert list(resolver._cache) == [(1, 3), (1, 1)]
+
+
+def test_misses_expire_and_stay_bounded(loop, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(members.time, "monotonic", lambda: now[0])
+    guild = FakeGuild()
+    resolver = MemberResolver(FakeBot(), size=3, miss_ttl=60)
+
+    async def run():
+        for user_id in range(10):
+            assert await resolver.get(guild, user_id) is None
+        assert list(resolver._misses) == [(1, 7), (1, 8), (1, 9)]
+        # Still remembered, no new request
+        assert await resolver.get(guild, 9) is None
+        assert guild.fetches == list(range(10))
+
+        now[0] += 61
+        assert await resolver.get(guild, 20) is None
+        assert list(resolver._misses) == [(1, 20)]
+
+    loop.run_until_complete(run())
+
+
+def test_concurrent_lookups_share_one_request(loop):
+    guild = FakeGuild([1])
+    resolver = MemberResolver(FakeBot())
+
+    async def run():
+        return await asyncio.gather(*(resolver.get(guild, "1") for _ in range(5)))
+
+    found = loop.run_until_complete(run())
+    assert guild.fetches == [1] and len({id(member) for member in found}) == 1
+
+
+def test_cached_members_follow_updates_and_leave(loop):
+    guild, other = FakeGuild([1, 2]), FakeGuild([1], guild_id=2)
+    resolver = MemberResolver(FakeBot())
+
+    async def run():
+        member = await resolver.get(guild, 1)
+        await resolver.get(guild, 2)
+        await resolver.get(other, 1)
+        renamed = FakeMember(guild, 1, nick="Universe")
+        await resolver.on_member_update(member, renamed)
+        assert await resolver.get(guild, 1) is renamed
+        assert resolver.get_named(guild, "Universe") is renamed
+        assert resolver.get_named(guild, "Steven#0001").guild is guild
+
+        await resolver.on_member_remove(renamed)
+        assert resolver.get_named(guild, "Universe") is None
+        resolver.forget(guild.id)
+        assert list(resolver._cache) == [(2, 1)]
+
+    loop.run_until_complete(run())
+
+
+def test_failed_requests_are_not_remembered(loop):
+    guild = FakeGuild([1])
+    guild.down = True
+    resolver = MemberResolver(FakeBot())
+
+    async def run():
+        assert await resolver.get(guild, 1) is None
+        guild.down = False
+        assert (await resolver.get(guild, 1)).id == 1
+
+    loop.run_until_complete(run())
+    assert guild.fetches == [1, 1] and not resolver._misses
+
+
+def test_global_user_falls_back_to_the_resolver_and_the_api(loop):
+    guild = FakeGuild([1])
+    bot = FakeBot()
+    bot.members = MemberResolver(bot)
+    bot.guilds = []
+    bot.get_user = lambda user_id: None
+
+    async def fetch_user(user_id):
+        if user_id != 80351110224678912:
+            raise discord.NotFound(FakeResponse(), "Unknown User")
+        return "Connie"
+
+    bot.fetch_user = fetch_user
+    ctx = SimpleNamespace(bot=bot, guild=guild)
+    convert = GlobalUser().convert
+
+    assert loop.run_until_complete(convert(ctx, "<@!1>")).id == 1
+    assert loop.run_until_complete(convert(ctx, "80351110224678912")) == "Connie"
+    with pytest.raises(commands.BadArgument):
+        loop.run_until_complete(convert(ctx, "<@8>"))
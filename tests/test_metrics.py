@@ -0,0 +1,54 @@
+import pytest
+
+from cogs.utils.metrics import BUCKETS, Metrics
+
+
+def test_observations_land_in_cumulative_buckets():
+    metrics = Metrics()
+    for seconds in (0.003, 0.005, 0.2, 30):
+        metrics.observe_command("Starboard", "starboard setup", seconds)
+    metrics.observe_command("Starboard", "starboard setup", 0.01, error=True)
+    text = metrics.render()
+
+    series = 'peribot_command_duration_seconds_bucket{cog="Starboard",command="starboard setup",le="%s"}'
+    assert series % 0.005 + " 2" in text
+    assert series % 0.01 + " 3" in text
+    assert series % 0.25 + " 4" in text
+    assert series % 10.0 + " 4" in text
+    assert series % "+Inf" + " 5" in text
+    assert 'peribot_command_duration_seconds_count{cog="Starboard",command="starboard setup"} 5' in text
+    assert 'peribot_command_duration_seconds_sum{cog="Starboard",command="starboard setup"} 30.218000' in text
+    assert 'peribot_command_errors_total{cog="Starboard",command="starboard setup"} 1' in text
+    assert len(metrics.commands[("Starboard", "starboard setup")].counts) == len(BUCKETS) + 1
+
+
+def test_labels_are_escaped():
+    metrics = Metrics(prefix="gem")
+    metrics.observe_listener('cogs."odd"\\', "On\nready", 0.1)
+    assert 'gem_listener_errors_total{module="cogs.\\"odd\\"\\\\",listener="On\\nready"} 0' in metrics.render()
+
+
+def test_wrapped_listeners_are_timed_and_errors_raised(loop):
+    metrics = Metrics()
+
+    async def on_message(message):
+        if message == "boom":
+            raise RuntimeError(message)
+        return message
+
+    timed = metrics.wrap_listener(on_message, "starboard", "Starboard.on_message")
+    assert timed.__name__ == "on_message"
+    assert loop.run_until_complete(timed("hi")) == "hi"
+    with pytest.raises(RuntimeError):
+        loop.run_until_complete(timed("boom"))
+    histogram = metrics.listeners[("starboard", "Starboard.on_message")]
+    assert histogram.count == 2 and histogram.errors == 1
+
+
+def test_metrics_are_served_as_prometheus_text(loop):
+    metrics = Metrics()
+    metrics.observe_command(None, "ping", 0.001)
+    response = loop.run_until_complete(metrics._handle(None))
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert response.body.decode("utf-8") == metrics.render()
+    assert 'cog="None"' in metrics.render()
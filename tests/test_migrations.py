@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from cogs.utils import migrations
+from cogs.utils.dataIO import dataIO
+
+
+@pytest.fixture(autouse=True)
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, "_migrations", {})
+    monkeypatch.setattr(migrations, "VERSIONS_FILE", str(tmp_path / "schema.json"))
+
+
+def write(filename, data):
+    with open(filename, "w") as f:
+        json.dump(data, f)
+
+
+def test_pending_steps_run_once_in_order(tmp_path):
+    filename = str(tmp_path / "settings.json")
+    write(filename, {"prefix": "!"})
+    runs = []
+
+    @migrations.migration(filename, 2)
+    def rename(data):
+        runs.append(2)
+        data["prefixes"] = data.pop("prefixes_v1")
+        return data
+
+    @migrations.migration(filename, 1)
+    def listify(data):
+        runs.append(1)
+        data["prefixes_v1"] = [data.pop("prefix")]
+        return data
+
+    assert migrations.load(filename) == {"prefixes": ["!"], "_schema": 2}
+    assert migrations.load(filename) == {"prefixes": ["!"], "_schema": 2}
+    assert runs == [1, 2]
+
+    # A later version bump only runs the new step
+    migrations.register(filename, 3, lambda data: dict(data, owner=None))
+    assert not migrations.is_current(filename)
+    assert migrations.load(filename) == {"prefixes": ["!"], "owner": None, "_schema": 3}
+    assert migrations.is_current(filename)
+    assert runs == [1, 2]
+
+
+def test_failed_step_leaves_the_file_alone(tmp_path):
+    filename = str(tmp_path / "settings.json")
+    write(filename, {"prefix": "!"})
+    migrations.register(filename, 1, lambda data: dict(data, owner=None))
+    migrations.register(filename, 2, lambda data: data["missing"])
+
+    with pytest.raises(KeyError):
+        migrations.load(filename)
+    assert dataIO.load_json(filename) == {"prefix": "!"}
+
+    migrations.register(filename, 2, lambda data: data)
+    assert migrations.load(filename) == {"prefix": "!", "owner": None, "_schema": 2}
+
+
+def test_list_documents_keep_their_version_aside(loop, tmp_path):
+    filename = str(tmp_path / "twitch.json")
+    write(filename, [{"NAME": "peridot"}])
+
+    @migrations.migration(filename, 1)
+    async def add_ids(streams):
+        return [dict(stream, ID="1") for stream in streams]
+
+    with pytest.raises(RuntimeError):
+        migrations.load(filename)
+    assert loop.run_until_complete(migrations.aload(filename)) == [{"NAME": "peridot", "ID": "1"}]
+    assert dataIO.load_json(migrations.VERSIONS_FILE) == {filename: 1}
+    assert migrations.is_current(filename)
+
+
+def test_missing_file_starts_at_the_latest_version(tmp_path):
+    filename = str(tmp_path / "settings.json")
+    migrations.register(filename, 1, lambda data: pytest.fail("nothing to migrate"))
+    assert migrations.load(filename, default={"prefixes": []}) == {"prefixes": [], "_schema": 1}
+    assert dataIO.load_json(filename) == {"prefixes": [], "_schema": 1}
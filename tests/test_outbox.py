@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from cogs.utils import resttrace
+from cogs.utils.outbox import ALERT, FUN, MAX_LENGTH, MODERATION, NORMAL, Outbox, OutboxFull
+
+
+class FakeChannel():
+    def __init__(self, channel_id, delay=0):
+        self.id = channel_id
+        self.delay = delay
+        self.sent = []
+
+    async def send(self, content=None, embed=None):
+        await asyncio.sleep(self.delay)
+        if content == "fail":
+            raise RuntimeError("Missing Permissions")
+        self.sent.append((content, embed, resttrace.origin.get()))
+        return len(self.sent)
+
+    def __str__(self):
+        return f"channel-{self.id}"
+
+
+def test_messages_go_out_by_priority_then_in_order(loop):
+    outbox = Outbox()
+    channel = FakeChannel(1)
+
+    async def run():
+        futures = [outbox.send(channel, text, priority=priority)
+                   for text, priority in [("fun 1", FUN), ("normal", NORMAL), ("ban", MODERATION),
+                                          ("fun 2", FUN), ("live", ALERT)]]
+        assert outbox.pending() == {1: 5}
+        return await asyncio.gather(*futures)
+
+    assert loop.run_until_complete(run()) == [4, 3, 1, 5, 2]
+    assert [content for content, _, _ in channel.sent] == ["ban", "live", "normal", "fun 1", "fun 2"]
+    assert outbox.pending() == {}
+
+
+def test_waiting_log_lines_are_merged(loop):
+    outbox = Outbox()
+    channel = FakeChannel(1)
+    long_line = "x" * (MAX_LENGTH - 5)
+
+    async def run():
+        futures = [outbox.send(channel, "joined", priority=MODERATION, merge=True),
+                   outbox.send(channel, "left", priority=MODERATION, merge=True),
+                   # Another priority, an embed or no room left start a new message
+                   outbox.send(channel, "banned", priority=NORMAL, merge=True),
+                   outbox.send(channel, "kicked", priority=MODERATION, merge=True, embed="card"),
+                   outbox.send(channel, "warned", priority=MODERATION, merge=True),
+                   outbox.send(channel, long_line, priority=MODERATION, merge=True)]
+        results = await asyncio.gather(*futures)
+        # Once a message is being sent nothing joins it any more
+        late = outbox.send(channel, "muted", priority=MODERATION, merge=True)
+        return results + [await late]
+
+    results = loop.run_until_complete(run())
+    assert [content for content, _, _ in channel.sent] == [
+        "joined\nleft", "kicked", "warned", long_line, "banned", "muted"]
+    assert results == [1, 1, 5, 2, 3, 4, 6]
+
+
+def test_least_urgent_message_is_dropped_when_full(loop):
+    outbox = Outbox(max_pending=3)
+    channel = FakeChannel(1)
+
+    async def run():
+        first = outbox.send(channel, "fun 1", priority=FUN)
+        second = outbox.send(channel, "fun 2", priority=FUN)
+        normal = outbox.send(channel, "normal", priority=NORMAL)
+        alert = outbox.send(channel, "live", priority=ALERT)
+        refused = outbox.send(channel, "fun 3", priority=FUN)
+        with pytest.raises(OutboxFull):
+            await second
+        with pytest.raises(OutboxFull):
+            await refused
+        await asyncio.gather(first, normal, alert)
+
+    loop.run_until_complete(run())
+    assert [content for content, _, _ in channel.sent] == ["live", "normal", "fun 1"]
+
+
+def test_channels_drain_independently_and_failures_reach_the_sender(loop):
+    outbox = Outbox(concurrency=2)
+    slow, fast = FakeChannel(1, delay=0.2), FakeChannel(2)
+
+    async def run():
+        token = resttrace.origin.set("streams")
+        try:
+            slow_sent = outbox.send(slow, "live")
+        finally:
+            resttrace.origin.reset(token)
+        failed = outbox.send(fast, "fail")
+        fast_sent = outbox.send(fast, "ok")
+        with pytest.raises(RuntimeError):
+            await failed
+        assert await fast_sent == 1 and not slow_sent.done()
+        await slow_sent
+
+    loop.run_until_complete(run())
+    # Each send is blamed on the cog that queued it
+    assert slow.sent == [("live", None, "streams")]
+    assert fast.sent == [("ok", None, "main")]
+
+
+def test_close_cancels_what_is_waiting(loop):
+    outbox = Outbox()
+    channel = FakeChannel(1, delay=1)
+
+    async def run():
+        futures = [outbox.send(channel, "one"), outbox.send(channel, "two")]
+        await asyncio.sleep(0.01)
+        await outbox.close()
+        await asyncio.sleep(0)
+        return futures
+
+    futures = loop.run_until_complete(run())
+    assert all(future.cancelled() for future in futures)
+    assert outbox.pending() == {}
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import discord
+
+from cogs.utils.prefixes import PrefixResolver
+from cogs.utils.settings import Settings
+
+
+def guild(guild_id):
+    guild = discord.Guild.__new__(discord.Guild)
+    guild.id = guild_id
+    return guild
+
+
+def message(guild, content=""):
+    return SimpleNamespace(guild=guild, content=content)
+
+
+def test_prefixes_are_cached_until_invalidated(tmp_path, monkeypatch):
+    settings = Settings(str(tmp_path / "settings.json"), parse_args=False)
+    resolver = PrefixResolver("!", settings)
+    lookups = []
+    get_prefixes = settings.get_prefixes
+    monkeypatch.setattr(settings, "get_prefixes", lambda g: lookups.append(g) or get_prefixes(g))
+    home = guild(1)
+
+    assert resolver(None, message(home)) == ("!",)
+    assert resolver(None, message(home)) == ("!",)
+    assert len(lookups) == 1
+
+    resolver.set_prefixes(home, ["p!", "?"])
+    assert resolver.for_guild(home) == ("p!", "?")
+    assert settings.get_guild_prefixes(home) == ["p!", "?"]
+    # Other guilds and DMs keep the default
+    assert resolver.for_guild(guild(2)) == ("!",) and resolver.for_guild(None) == ("!",)
+
+    # Global prefixes changed in Settings only show up after invalidate()
+    settings.prefixes = ["$"]
+    assert resolver.for_guild(guild(2)) == ("!",)
+    resolver.invalidate()
+    assert resolver.for_guild(guild(2)) == ("$",)
+    assert resolver.for_guild(home) == ("p!", "?")
+
+    resolver.set_prefixes(home, [])
+    assert resolver.for_guild(home) == ("$",)
+
+
+def test_longest_prefix_matches_first():
+    resolver = PrefixResolver(["!", "!!"])
+    assert resolver.match(message(None, "!!help")) == "!!"
+    assert resolver.match(message(None, "!help")) == "!"
+    assert resolver.match(message(None, "help")) is None
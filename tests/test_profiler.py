@@ -0,0 +1,62 @@
+import sys
+import tracemalloc
+
+import pytest
+from discord.ext import commands
+
+from cogs.utils.profiler import StartupProfiler
+
+SLOW = '''
+import time
+
+time.sleep(0.05)
+BLOCK = bytearray(512 * 1024)
+
+
+def setup(bot):
+    time.sleep(0.02)
+'''
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    folder = tmp_path / "profiledcogs"
+    folder.mkdir()
+    (folder / "__init__.py").write_text("")
+    (folder / "slow.py").write_text(SLOW)
+    (folder / "fast.py").write_text("def setup(bot):\n    pass\n")
+    (folder / "broken.py").write_text("def setup(bot):\n    raise RuntimeError('no gems')\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield folder
+    for name in [name for name in sys.modules if name.startswith("profiledcogs")]:
+        del sys.modules[name]
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def test_extension_loads_are_profiled(loop, package):
+    bot = commands.Bot(command_prefix="!", loop=loop)
+    profiler = StartupProfiler(trace_memory=True)
+    profiler.load_extension(bot, "profiledcogs.fast")
+    profiler.load_extension(bot, "profiledcogs.slow")
+    with pytest.raises(commands.ExtensionFailed):
+        profiler.load_extension(bot, "profiledcogs.broken")
+    profiler.ready()
+
+    slow = profiler.extensions["slow"]
+    assert slow["import_ms"] >= 50 and slow["setup_ms"] >= 20
+    assert slow["wall_ms"] == pytest.approx(slow["import_ms"] + slow["setup_ms"], abs=0.1)
+    assert slow["modules"] >= 1 and slow["memory_kb"] >= 512
+    assert "no gems" in profiler.extensions["broken"]["error"]
+    assert [name for name, _ in profiler.slowest(1)] == ["slow"]
+
+    # Tracing stops on ready, later loads are flagged as such
+    assert not tracemalloc.is_tracing() and profiler.ready_memory_kb > 0
+    bot.unload_extension("profiledcogs.fast")
+    profiler.load_extension(bot, "profiledcogs.fast")
+    assert profiler.extensions["fast"]["after_ready"]
+    assert profiler.extensions["fast"]["memory_kb"] is None
+
+    report = profiler.report()
+    assert list(report["phases_ms"]) == ["ready"]
+    assert report["extensions_ms"] == pytest.approx(sum(e["wall_ms"] for e in profiler.extensions.values()))
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import os
+
+import pytest
+from discord.http import Route
+
+from cogs.utils import resttrace
+from cogs.utils.resttrace import RestTracer, caller
+
+
+class FakeHTTP():
+    """discord.py's HTTPClient as far as the tracer is concerned"""
+
+    def __init__(self):
+        self._locks = {}
+
+    async def request(self, route, **kwargs):
+        if kwargs.get("rate_limited"):
+            logging.getLogger("discord.http").warning(
+                'We are being rate limited. Retrying in %.2f seconds. Handled under the bucket "%s"',
+                0.25, route.bucket)
+        await asyncio.sleep(kwargs.get("delay", 0))
+        if kwargs.get("fail"):
+            raise RuntimeError("500")
+        return route.path
+
+
+@pytest.fixture
+def http():
+    http = FakeHTTP()
+    yield http
+    logger = logging.getLogger("discord.http")
+    for handler in [h for h in logger.handlers if isinstance(h, resttrace._RateLimitHandler)]:
+        logger.removeHandler(handler)
+
+
+def test_calls_are_traced_per_cog_and_route(loop, http):
+    tracer = RestTracer()
+    tracer.install(http)
+    messages = Route("POST", "/channels/{channel_id}/messages", channel_id=1)
+
+    async def run():
+        token = resttrace.origin.set("modlog")
+        try:
+            assert await http.request(messages) == "/channels/{channel_id}/messages"
+            with pytest.raises(RuntimeError):
+                await http.request(messages, fail=True)
+            await http.request(messages, rate_limited=True)
+        finally:
+            resttrace.origin.reset(token)
+        await http.request(Route("GET", "/gateway"))
+
+    loop.run_until_complete(run())
+    stats = tracer.routes[("modlog", "POST /channels/{channel_id}/messages")]
+    assert stats.calls == 3 and stats.errors == 1 and stats.retries == 1
+    assert stats.wait == pytest.approx(0.25, abs=0.01)
+    assert ("main", "GET /gateway") in tracer.routes
+    assert list(tracer.by_cog()) == ["modlog", "main"]
+    assert tracer.worst("modlog")[0][0] == ("modlog", "POST /channels/{channel_id}/messages")
+
+
+def test_waiting_on_a_held_bucket_counts_as_wait(loop, http):
+    tracer = RestTracer()
+    tracer.install(http)
+    route = Route("PUT", "/channels/{channel_id}/pins/{message_id}", channel_id=1, message_id=2)
+    lock = http._locks[route.bucket] = asyncio.Lock()
+
+    async def run():
+        await lock.acquire()
+        loop.call_later(0.1, lock.release)
+        await http.request(route, delay=0.05)
+
+    loop.run_until_complete(run())
+    stats = tracer.routes[("main", "PUT /channels/{channel_id}/pins/{message_id}")]
+    assert stats.wait >= 0.09
+    assert 0.04 <= stats.latency < 0.09 and stats.worst == stats.latency
+
+
+def test_caller_is_the_nearest_cog_module():
+    def call_from(path):
+        namespace = {"caller": caller}
+        exec(compile("def run(inner):\n    return inner()\n", path, "exec"), namespace)
+        return namespace["run"]
+
+    modlog = call_from(os.path.join("bot", "cogs", "modlog.py"))
+    outbox = call_from(os.path.join("bot", "cogs", "utils", "outbox.py"))
+    assert modlog(lambda: outbox(caller)) == "modlog"
+    assert outbox(caller) == "main"
@@ -0,0 +1,33 @@
+import re
+from types import SimpleNamespace
+
+from cogs.utils.router import MessageRouter
+
+
+class FakeBot():
+    command_prefix = re.compile(r"!")
+
+    def add_listener(self, func):
+        pass
+
+
+def message(content, bot=False, guild=True):
+    return SimpleNamespace(content=content, author=SimpleNamespace(bot=bot),
+                           guild=SimpleNamespace(id=1) if guild else None)
+
+
+def test_every_route_gets_all_guild_messages(loop):
+    router = MessageRouter(FakeBot())
+    seen = []
+
+    async def snapshot(message, routed):
+        seen.append(message.content)
+
+    router.every("Modlog", snapshot, bots=True)
+    for sent in (message("hi"), message(""), message("!help", bot=True), message("dm", guild=False)):
+        loop.run_until_complete(router.on_message(sent))
+    assert seen == ["hi", "", "!help"]
+
+    router.remove("Modlog")
+    loop.run_until_complete(router.on_message(message("hi")))
+    assert seen == ["hi", "", "!help"]
@@ -0,0 +1,52 @@
+import discord
+import pytest
+
+from cogs.utils.settings import Settings
+
+
+def guild(guild_id):
+    guild = discord.Guild.__new__(discord.Guild)
+    guild.id = guild_id
+    return guild
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return Settings(str(tmp_path / "settings.json"), parse_args=False)
+
+
+def test_guild_settings_are_read_only_views(settings):
+    settings.set_guild_mod(guild(1), "Gem")
+    view = settings.get_guild(guild(1))
+    assert view["MOD_ROLE"] == "Gem"
+    with pytest.raises(TypeError):
+        view["MOD_ROLE"] = "Clod"
+    with pytest.raises(TypeError):
+        settings.guilds["2"] = {}
+    # Views follow later changes
+    settings.set_guild_mod(guild(1), "Crystal Gem")
+    assert view["MOD_ROLE"] == "Crystal Gem"
+
+
+def test_guilds_without_settings_get_the_defaults(settings):
+    settings.prefixes = ["!"]
+    settings.default_admin = "Diamond"
+    assert settings.get_guild(guild(3))["ADMIN_ROLE"] == "Diamond"
+    assert settings.get_guild_admin(guild(3)) == "Diamond"
+    assert settings.get_prefixes(guild(3)) == ["!"]
+    assert "3" not in settings.guilds
+
+    settings.set_guild_prefixes(guild(3), ["?"])
+    assert settings.get_prefixes(guild(3)) == ["?"]
+    assert settings.get_guild_admin(guild(3)) == "Diamond"
+
+
+def test_guild_index_survives_a_reload(tmp_path, settings):
+    settings.set_guild_admin(guild(1), "Homeworld")
+    settings.add_guild(2)
+    settings.save_settings()
+
+    settings = Settings(str(tmp_path / "settings.json"), parse_args=False)
+    assert sorted(settings.guilds) == ["1", "2"]
+    assert settings.get_guild_admin(guild(1)) == "Homeworld"
+    assert settings.get_guild_admin(guild(2)) == "Transistor"
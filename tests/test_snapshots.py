@@ -0,0 +1,41 @@
+import random
+
+from cogs.utils.snapshots import MessageCache, Snapshot
+
+
+def snapshot(message_id, guild_id, length):
+    return Snapshot(message_id, 1, 2, guild_id, "x" * length)
+
+
+def test_put_never_evicts_the_new_snapshot():
+    cache = MessageCache(budget=1000, guild_budget=1000)
+    cache.put(snapshot(1, 10, 300))
+    cache.put(snapshot(2, 10, 300))
+    # Bigger than everything else together, the others make room
+    cache.put(snapshot(3, 20, 700))
+    assert 3 in cache and 1 not in cache and 2 not in cache
+
+
+def test_busiest_guild_is_evicted_first():
+    rng = random.Random(4)
+    cache = MessageCache(budget=20000, guild_budget=6000)
+    evictions = []
+    evict = cache._evict
+
+    def recording_evict(guild_id):
+        evictions.append((guild_id, dict(cache._sizes)))
+        evict(guild_id)
+
+    cache._evict = recording_evict
+    for message_id in range(3000):
+        guild_id = rng.choice([1, 2, 3, 4, None]) if message_id % 7 else 5
+        if message_id % 97 == 0:
+            cache.forget(rng.choice([1, 2, 3]))
+        evictions.clear()
+        cache.put(snapshot(message_id, guild_id, rng.randrange(10, 400)))
+        assert message_id in cache
+        assert cache.used == sum(cache._sizes.values())
+        assert cache.used <= cache.budget
+        for victim, sizes in evictions:
+            # Over its own budget, or the busiest guild overall
+            assert victim == guild_id or sizes[victim] == max(sizes.values())
@@ -0,0 +1,56 @@
+from cogs.utils.dataIO import Journal, dataIO
+from cogs.utils.sqlstore import SPLIT_SIZE, SQLiteBackend
+
+
+class CountingBackend(SQLiteBackend):
+    """Counts the rows written by save"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.written = 0
+        self._conn.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        if statement.startswith("INSERT OR REPLACE INTO documents"):
+            self.written += 1
+
+
+def test_long_list_gets_a_row_per_item(tmp_path):
+    backend = CountingBackend(str(tmp_path / "peribot.db"))
+    messages = [{"original_message": i, "count": 3} for i in range(SPLIT_SIZE * 2)]
+    data = {"emoji": "⭐", "messages": messages}
+    backend.save("data/starboard/guilds/1.json", data)
+
+    backend.written = 0
+    messages.append({"original_message": 1000, "count": 3})
+    messages[0]["count"] = 4
+    backend.save("data/starboard/guilds/1.json", data)
+    assert backend.written == 2
+
+    reopened = SQLiteBackend(str(tmp_path / "peribot.db"))
+    assert reopened.load("data/starboard/guilds/1.json") == data
+
+
+def test_collections_shrink_back_into_one_row(tmp_path):
+    path = str(tmp_path / "peribot.db")
+    backend = SQLiteBackend(path)
+    data = {str(i): i for i in range(SPLIT_SIZE + 1)}
+    backend.save("data/polls.json", [data, 1])
+    backend.save("data/polls.json", list(range(SPLIT_SIZE + 5)))
+    backend.save("data/polls.json", list(range(3)))
+    assert SQLiteBackend(path).load("data/polls.json") == [0, 1, 2]
+    backend.save("data/settings.json", {"users": data})
+    assert SQLiteBackend(path).load("data/settings.json") == {"users": data}
+
+
+def test_journal_over_the_backend_does_not_compact_on_load(tmp_path, monkeypatch):
+    backend = SQLiteBackend(str(tmp_path / "peribot.db"))
+    monkeypatch.setattr(dataIO, "backend", backend)
+    filename = str(tmp_path / "guilds" / "1.json")
+    Journal(filename, {"emoji": "⭐"}).set(["threshold"], 3)
+    Journal(filename)
+
+    saves = []
+    monkeypatch.setattr(backend, "save", lambda *args: saves.append(args) or True)
+    assert Journal(filename).data == {"emoji": "⭐", "threshold": 3}
+    assert saves == []
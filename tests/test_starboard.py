@@ -0,0 +1,33 @@
+import json
+import os
+
+from cogs import starboard
+from cogs.utils.reactions import emoji_key
+
+
+class FakeBot():
+    user = None
+
+    def add_listener(self, func):
+        pass
+
+
+def test_emojis_are_watched_without_opening_the_guilds(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data/star/guilds")
+    for guild_id, emoji in (("1", "⭐"), ("2", ":pearl:1234")):
+        with open(f"data/star/guilds/{guild_id}.json", "w", encoding="utf-8") as f:
+            json.dump({"emoji": emoji, "channel": "5", "role": [], "threshold": 0,
+                       "messages": [], "ignore": []}, f)
+    starboard.Star(FakeBot())
+
+    bot = FakeBot()
+    star = starboard.Star(bot)
+    assert not star.settings._loaded
+    assert set(bot.reactions._emojis) == {emoji_key("⭐"), "1234"}
+
+    star.watch_emoji("1", "🌟")
+    assert star.emoji_guilds == {"1234": ["2"], "🌟": ["1"]}
+    star.cog_unload()
+    with open(starboard.EMOJI_INDEX, encoding="utf-8") as f:
+        assert json.load(f)["emojis"] == star.emoji_guilds
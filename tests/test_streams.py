@@ -0,0 +1,75 @@
+import json
+import os
+
+from cogs import streams
+from cogs.utils import cluster
+
+SHARD_0_GUILD = 0
+SHARD_1_GUILD = 1 << 22
+
+
+def write(folder, name, data):
+    with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def stream(name, *channels):
+    return {"NAME": name, "ID": name + "-id", "CHANNELS": list(channels), "ALREADY_ONLINE": False}
+
+
+def test_clusters_share_the_single_process_alerts(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    monkeypatch.setattr(streams, "STREAMS_FOLDER", folder)
+    # Alerts from when the bot ran as one process: channel 10 is in a
+    # guild of shard 0, channel 20 in one of shard 1
+    write(folder, "twitch.json", [stream("pearl", 10, 20), stream("garnet", 20)])
+    write(folder, "beam.json", [])
+    write(folder, "settings.json", {"TWITCH_TOKEN": "token", str(SHARD_0_GUILD): {"MENTION": "@here"},
+                                    str(SHARD_1_GUILD): {"MENTION": ""}})
+    # Cluster 0 took its share and then stopped the pearl alert of channel 10
+    layout = streams._layout(cluster.Cluster(0, 2, (0,), 2))
+    write(folder, "twitch.cluster0.json", [])
+    write(folder, "layout.cluster0.json", {"layout": layout, "time": 100})
+    guilds = {10: SHARD_0_GUILD, 20: SHARD_1_GUILD}
+
+    cluster1 = cluster.Cluster(1, 2, (1,), 2)
+    owned = {channel: guild for channel, guild in guilds.items() if cluster1.owns(guild)}
+    twitch, mixer, settings = streams._share(streams._load_copies(), owned, cluster1.owns)
+    assert twitch == [stream("pearl", 20), stream("garnet", 20)]
+    assert settings == {"TWITCH_TOKEN": "token", str(SHARD_1_GUILD): {"MENTION": ""}}
+
+    # Back to one process: cluster 0's copy is newer for shard 0's guilds
+    owned = dict(guilds)
+    twitch, _, settings = streams._share(streams._load_copies(), owned, lambda guild_id: True)
+    assert twitch == [stream("pearl", 20), stream("garnet", 20)]
+    assert str(SHARD_0_GUILD) not in settings
+
+
+def test_twitch_migration_is_retried_and_merged(loop, tmp_path, monkeypatch):
+    filename = str(tmp_path / "twitch.json")
+    monkeypatch.setattr(streams, "TWITCH_FILE", filename)
+    monkeypatch.setattr(streams.migrations, "VERSIONS_FILE", str(tmp_path / "schema.json"))
+    write(str(tmp_path), "twitch.json", [{"NAME": "Pearl", "CHANNELS": [10], "ALREADY_ONLINE": False}])
+    cog = streams.Streams.__new__(streams.Streams)
+    cog.twitch_streams = streams.dataIO.load_json(filename)
+    cog._migration_error = None
+    answers = [streams.InvalidCredentials(), [{"name": "pearl", "_id": "pearl-id"}]]
+
+    async def fetch_twitch_ids(*names, raise_if_none=False):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    cog.fetch_twitch_ids = fetch_twitch_ids
+    streams.migrations.register(filename, 1, cog._migration_twitch_v5)
+
+    loop.run_until_complete(cog.migrate_twitch())
+    assert not streams.migrations.is_current(filename)
+    # Added while the token was missing, must survive the migration
+    cog.twitch_streams.append(stream("garnet", 20))
+    loop.run_until_complete(cog.migrate_twitch())
+    assert streams.migrations.is_current(filename)
+    assert cog.twitch_streams == [{"NAME": "Pearl", "ID": "pearl-id", "CHANNELS": [10], "ALREADY_ONLINE": False},
+                                  stream("garnet", 20)]
+    assert streams.dataIO.load_json(filename) == cog.twitch_streams
@@ -0,0 +1,80 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from cogs.utils.webclient import WebClient, get_client
+
+
+# path -> (status, content type, body)
+PAGES = {
+    "/comic": (200, "application/json", b'{"num": 303}'),
+    "/missing": (404, "text/html", b"<html>Not Found</html>"),
+    "/broken": (200, "text/html", b"<html>"),
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, content_type, body = PAGES[self.path]
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    # A thread of its own, the client is what runs on the loop
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(httpd.server_port)
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_requests_share_one_pooled_session(loop, server):
+    client = WebClient(limit=5, limit_per_host=2, timeout=3)
+
+    async def run():
+        session = client.session
+        assert session.connector.limit == 5 and session.connector.limit_per_host == 2
+        assert await client.get_json(server + "/comic") == (200, {"num": 303})
+        assert await client.get_json(server + "/missing") == (404, None)
+        with pytest.raises(ValueError):
+            await client.get_json(server + "/broken")
+        assert await client.get_text(server + "/missing") == (404, "<html>Not Found</html>")
+        assert client.session is session
+
+        await client.close()
+        assert session.closed
+        # A new session is made on the next use
+        assert await client.get_json(server + "/comic") == (200, {"num": 303})
+        assert client.session is not session
+        await client.close()
+
+    loop.run_until_complete(run())
+
+
+def test_blocking_calls_run_on_the_clients_threads(loop):
+    client = WebClient(sync_threads=1)
+
+    def blocking(value, suffix=""):
+        return threading.current_thread().name, value + suffix
+
+    name, value = loop.run_until_complete(client.run_sync(blocking, "gem", suffix="!"))
+    assert value == "gem!" and name.startswith("webclient")
+    loop.run_until_complete(client.close())
+
+
+def test_get_client_attaches_one_client():
+    bot = SimpleNamespace()
+    assert get_client(bot) is get_client(bot) is bot.web